@@ -0,0 +1,113 @@
+"""partition cloud metric by month
+
+Revision ID: 5f2c8e9d4a61
+Revises: d3e1f0a7b2c4
+Create Date: 2022-06-14 21:03:52.664120
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "5f2c8e9d4a61"
+down_revision = "d3e1f0a7b2c4"
+branch_labels = None
+depends_on = None
+
+
+def move_aside():
+    # Index backed constraints are named per schema, get the old ones
+    # out of the way of the new table's
+    op.rename_table("cloud_metric", "cloud_metric_old")
+    op.execute(
+        "ALTER TABLE cloud_metric_old "
+        "RENAME CONSTRAINT cloud_metric_pkey TO cloud_metric_old_pkey"
+    )
+    op.execute(
+        "ALTER TABLE cloud_metric_old RENAME CONSTRAINT "
+        "cloud_metric_account_id_time_key TO cloud_metric_old_account_id_time_key"
+    )
+    op.execute("ALTER INDEX idx_cloud_metric_time RENAME TO idx_cloud_metric_old_time")
+
+
+def copy_and_drop_old():
+    # The id sequence would be dropped along with the old table
+    op.execute("ALTER SEQUENCE cloud_metric_id_seq OWNED BY cloud_metric.id")
+    op.execute(
+        "INSERT INTO cloud_metric (id, account_id, time, instances) "
+        "SELECT id, account_id, time, instances FROM cloud_metric_old"
+    )
+    op.drop_table("cloud_metric_old")
+
+
+def upgrade():
+    move_aside()
+    op.execute(
+        """
+        CREATE TABLE cloud_metric (
+            id integer NOT NULL DEFAULT nextval('cloud_metric_id_seq'),
+            account_id integer NOT NULL
+                REFERENCES account(id) ON DELETE CASCADE,
+            time timestamp without time zone NOT NULL,
+            instances integer NOT NULL,
+            PRIMARY KEY (id, time),
+            UNIQUE (account_id, time)
+        ) PARTITION BY RANGE (time)
+        """
+    )
+    op.create_index(
+        "idx_cloud_metric_time", "cloud_metric", ["time"], postgresql_using="brin"
+    )
+    # Anything outside the monthly partitions, old backfills and the like
+    op.execute("CREATE TABLE cloud_metric_default PARTITION OF cloud_metric DEFAULT")
+    # One partition per month from the oldest sample to a couple of months out,
+    # after that the maintain_metric_partitions task keeps them coming
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce(
+                        (SELECT min(time) FROM cloud_metric_old), now()
+                    )),
+                    date_trunc('month', now()) + interval '2 months',
+                    interval '1 month'
+                )
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF cloud_metric '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'cloud_metric_' || to_char(month, 'YYYY_MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+    copy_and_drop_old()
+
+
+def downgrade():
+    move_aside()
+    op.execute(
+        """
+        CREATE TABLE cloud_metric (
+            id integer NOT NULL DEFAULT nextval('cloud_metric_id_seq')
+                PRIMARY KEY,
+            account_id integer NOT NULL
+                REFERENCES account(id) ON DELETE CASCADE,
+            time timestamp without time zone NOT NULL,
+            instances integer NOT NULL,
+            UNIQUE (account_id, time)
+        )
+        """
+    )
+    op.create_index(
+        "idx_cloud_metric_time", "cloud_metric", ["time"], postgresql_using="brin"
+    )
+    copy_and_drop_old()
@@ -0,0 +1,33 @@
+"""add finalized invoice table
+
+Revision ID: a3c7e1b94f20
+Revises: 5f2c8e9d4a61
+Create Date: 2022-06-20 16:42:11.508372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a3c7e1b94f20"
+down_revision = "5f2c8e9d4a61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "finalized_invoice",
+        sa.Column("provider", sa.String, primary_key=True),
+        sa.Column("account", sa.String, primary_key=True),
+        sa.Column("invoice_id", sa.String, primary_key=True),
+        sa.Column("data", sa.JSON, nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime, nullable=False, server_default=sa.func.now()
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("finalized_invoice")
@@ -0,0 +1,83 @@
+"""add hourly and daily cloud metric rollups
+
+Revision ID: d3e1f0a7b2c4
+Revises: 8a101c6501f3
+Create Date: 2022-06-07 18:42:10.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d3e1f0a7b2c4"
+down_revision = "8a101c6501f3"
+branch_labels = None
+depends_on = None
+
+
+def create_rollup(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column(
+            "account_id",
+            sa.Integer,
+            sa.ForeignKey("account.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("time", sa.DateTime, primary_key=True),
+        sa.Column("samples", sa.Integer, nullable=False),
+        sa.Column("total", sa.Integer, nullable=False),
+        sa.Column("min", sa.Integer, nullable=False),
+        sa.Column("max", sa.Integer, nullable=False),
+        sa.Column("avg", sa.Float, nullable=False),
+        sa.Column("last", sa.Integer, nullable=False),
+        sa.Column("last_time", sa.DateTime, nullable=False),
+        sa.Index(f"idx_{name}_time", "time", postgresql_using="brin"),
+    )
+
+
+def upgrade():
+    create_rollup("cloud_metric_hourly")
+    create_rollup("cloud_metric_daily")
+
+    # Backfill from the samples we already have
+    op.execute(
+        """
+        INSERT INTO cloud_metric_hourly
+        SELECT
+            account_id,
+            date_trunc('hour', time),
+            count(*),
+            sum(instances),
+            min(instances),
+            max(instances),
+            avg(instances),
+            (array_agg(instances ORDER BY time DESC))[1],
+            max(time)
+        FROM cloud_metric
+        GROUP BY account_id, date_trunc('hour', time)
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO cloud_metric_daily
+        SELECT
+            account_id,
+            date_trunc('day', time),
+            sum(samples),
+            sum(total),
+            min(min),
+            max(max),
+            sum(total)::float / sum(samples),
+            (array_agg(last ORDER BY last_time DESC))[1],
+            max(last_time)
+        FROM cloud_metric_hourly
+        GROUP BY account_id, date_trunc('day', time)
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("cloud_metric_daily")
+    op.drop_table("cloud_metric_hourly")
@@ -1,22 +1,36 @@
-from io import BytesIO
-from typing import Optional, List
+from typing import Any, Optional, List
 
 from fastapi import APIRouter, Request, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from openpyxl import Workbook
 
 from app import database, model
 from app.api import core
-from app.core import utils
+from app.core import spreadsheet, utils
 
 router = APIRouter()
 
+HEADER = ["Provider", "Account", "Billing Start", "Billing End", "Cost", "Balance"]
+# Rows fetched from the database and handed to the spreadsheet at a time
+EXPORT_CHUNK_ROWS = 500
+
+
+def export_row(row: Any) -> List[Any]:
+    return [
+        f"{row.iaas} ({row.endpoint})" if row.endpoint is not None else row.iaas,
+        row.account,
+        row.start_date.strftime("%Y-%m-%d"),
+        row.end_date.strftime("%Y-%m-%d"),
+        row.total,
+        row.balance,
+    ]
+
 
 @router.get(
     "",
     response_model=model.BillingSearchResponse,
     responses={
+        400: {"model": model.FailedResponse},
         401: {"model": model.FailedResponse},
     },
 )
@@ -32,106 +46,99 @@ async def get_billing(
     """
 
     filter = model.BillingPeriodFilter.parse_obj(query)
-    billing, total = await database.billing.filter(
-        db,
-        filter=filter,
-        offset=query.per_page * query.page,
-        limit=query.per_page,
-        sort=query.sort,
-        order=query.order,
-    )
     search = model.common.SearchQueryBase.parse_obj(query)
-    resp = model.BillingSearchResponse(
-        **(search.dict(exclude_unset=False)), results=billing, total=total  # type: ignore
+    cursor = None
+    try:
+        if search.cursor is not None:
+            billing, total, cursor = await database.billing.seek(
+                db,
+                filter=filter,
+                cursor=search.cursor,
+                limit=search.per_page,
+                sort=search.sort,
+                order=search.order,
+                with_total=search.total_mode,
+            )
+        else:
+            billing, total = await database.billing.filter(
+                db,
+                filter=filter,
+                offset=search.per_page * search.page,
+                limit=search.per_page,
+                sort=search.sort,
+                order=search.order,
+                with_total=search.total_mode,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model.BillingSearchResponse.from_results(
+        pagination=search,
+        results=billing,
+        total=total,
+        request=request,
+        cursor=cursor,
     )
-    params = search.dict(exclude_unset=False)
-    if total > query.per_page * (query.page + 1):
-        params["page"] = search.page + 1
-        resp.next = str(request.url.replace_query_params(**params))
-    if query.page > 0:
-        params["page"] = search.page - 1
-        resp.prev = str(request.url.replace_query_params(**params))
-
-    return resp
 
 
 @router.get(
     "/export",
     responses={
-        200: {
-            "content": {
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": {}
-            }
-        },
+        200: {"content": {spreadsheet.MEDIA_TYPE: {}}},
         401: {"model": model.FailedResponse},
+        404: {"model": model.FailedResponse},
     },
 )
 async def export_billing(
-    template: str = "default",
-    period: Optional[str] = Query(
-        None, description="Billing period, defaults to current"
+    template: List[str] = Query(["default"], description="Templates, a sheet each"),
+    period: Optional[List[str]] = Query(
+        None, description="Billing periods, a sheet each, defaults to current"
     ),
     *,
     db: Session = Depends(core.get_db),
     _: database.User = Depends(core.get_current_user),
 ):
     """
-    Export billing periods as a spreadsheet.
+    Export billing periods as a spreadsheet, one sheet per period and template.
     """
-    wb = Workbook()
-    ws = wb.active
-    reports = await database.billing.get_billing_period(
-        db,
-        period=period or utils.current_period(),
-    )
-    if not reports:
-        raise HTTPException(
-            status_code=404,
-            detail="No billing reports found for period {}".format(period),
-        )
-
-    templateDb = await database.template.get_by_name(db, name=template)
-
-    account_ids = {report.account_id: report for report in reports}
-
-    ws.append(
-        ["Provider", "Account", "Billing Start", "Billing End", "Cost", "Balance"]
-    )
-
-    if not templateDb:
-        raise HTTPException(
-            status_code=404,
-            detail="Template does not exist",
-        )
-
-    for account_id in [order.account_id for order in templateDb.orders]:
-        if account_id not in account_ids:
-            continue
-        report = account_ids[account_id]
-        iaas = (
-            f'{report.account.iaas.name} ({report.account.data["endpoint"]})'
-            if "endpoint" in report.account.data
-            else report.account.iaas.name
-        )
-        ws.append(
-            [
-                iaas,
-                report.account.name,
-                report.start_date.strftime("%Y-%m-%d"),
-                report.end_date.strftime("%Y-%m-%d"),
-                report.total,
-                report.balance,
-            ]
-        )
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+    periods = period or [utils.current_period()]
+    for name in periods:
+        if not await database.billing.get_period(db, period=name):
+            raise HTTPException(
+                status_code=404,
+                detail="No billing reports found for period {}".format(name),
+            )
+
+    templates = []
+    for name in template:
+        templateDb = await database.template.get_by_name(db, name=name)
+        if not templateDb:
+            raise HTTPException(
+                status_code=404,
+                detail="Template does not exist",
+            )
+        templates.append(templateDb)
+
+    workbook = spreadsheet.Spreadsheet()
+    for templateDb in templates:
+        for name in periods:
+            sheet = await workbook.add_sheet(f"{name} {templateDb.name}", HEADER)
+            result = await db.stream(
+                database.billing.export_query(template_id=templateDb.id, period=name)
+            )
+            try:
+                async for rows in result.partitions(EXPORT_CHUNK_ROWS):
+                    await workbook.append(sheet, map(export_row, rows))
+            finally:
+                await result.close()
+
+    # The response only starts once the workbook is saved, an xlsx is a zip
+    # whose directory can't be written until every sheet is done
+    output = await workbook.save()
     headers = {"Content-Disposition": 'attachment; filename="filename.xlsx"'}
     return StreamingResponse(
-        output,
+        spreadsheet.iter_file(output),
         headers=headers,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=spreadsheet.MEDIA_TYPE,
     )
 
 
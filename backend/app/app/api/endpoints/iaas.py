@@ -13,6 +13,7 @@ router = APIRouter()
     "",
     response_model=model.IaasSearchResponse,
     responses={
+        400: {"model": model.FailedResponse},
         401: {"model": model.FailedResponse},
         403: {"model": model.FailedResponse},
     },
@@ -26,28 +27,37 @@ async def get_providers(
 ) -> Any:
     filter = model.IaasFilter.parse_obj(query)
     search = model.common.SearchQueryBase.parse_obj(query)
-
-    providers, total = await database.iaas.filter(
-        db,
-        filter=filter,
-        offset=search.per_page * search.page,
-        limit=search.per_page,
-        sort=search.sort,
-        order=search.order,
-    )
-    resp = model.IaasSearchResponse(
-        **(search.dict(exclude_unset=False)), results=providers, total=total  # type: ignore
+    cursor = None
+    try:
+        if search.cursor is not None:
+            providers, total, cursor = await database.iaas.seek(
+                db,
+                filter=filter,
+                cursor=search.cursor,
+                limit=search.per_page,
+                sort=search.sort,
+                order=search.order,
+                with_total=search.total_mode,
+            )
+        else:
+            providers, total = await database.iaas.filter(
+                db,
+                filter=filter,
+                offset=search.per_page * search.page,
+                limit=search.per_page,
+                sort=search.sort,
+                order=search.order,
+                with_total=search.total_mode,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model.IaasSearchResponse.from_results(
+        pagination=search,
+        results=providers,
+        total=total,
+        request=request,
+        cursor=cursor,
     )
-    if total > search.per_page * (search.page + 1):
-        params = search.dict(exclude_unset=False)
-        params["page"] = search.page + 1
-        resp.next = str(request.url.replace_query_params(**params))
-    if search.page > 0:
-        params = search.dict(exclude_unset=False)
-        params["page"] = search.page - 1
-        resp.prev = str(request.url.replace_query_params(**params))
-
-    return resp
 
 
 @router.get(
@@ -90,4 +100,4 @@ async def get_provider_accounts(
     iaas = await database.iaas.get(db, provider_id)
     if not iaas:
         raise HTTPException(status_code=404, detail="Provider not found")
-    return iaas.accounts
+    return await database.account.get_by_iaas(db, iaas_id=iaas.id)
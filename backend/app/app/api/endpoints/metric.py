@@ -1,8 +1,10 @@
-from typing import Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
 from datetime import datetime
+import json
 
 from dateutil.relativedelta import relativedelta
-from fastapi import APIRouter, Request, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 
 from app import database, model
@@ -11,6 +13,44 @@ from app.api import core
 router = APIRouter()
 
 
+# Rows buffered before a chunk of the response is sent
+CHUNK_ROWS = 1000
+
+
+def encode_point(row: Dict[str, Any]) -> str:
+    return json.dumps({"type": row["type"], "x": row["x"].isoformat(), "y": row["y"]})
+
+
+async def stream_dataset(
+    label: str, rows: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[str]:
+    """
+    Writes {"label": label, "data": [...]} out as rows come from the database.
+    """
+    yield f'{{"label": {json.dumps(label)}, "data": ['
+    chunk: List[str] = []
+    sep = ""
+    async for row in rows:
+        chunk.append(sep + encode_point(row))
+        sep = ", "
+        if len(chunk) >= CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk) + "]}"
+
+
+async def stream_datasets(
+    datasets: List[Tuple[str, AsyncIterator[Dict[str, Any]]]]
+) -> AsyncIterator[str]:
+    yield "["
+    for i, (label, rows) in enumerate(datasets):
+        if i:
+            yield ", "
+        async for chunk in stream_dataset(label, rows):
+            yield chunk
+    yield "]"
+
+
 @router.get(
     "/",
 )
@@ -24,27 +64,28 @@ async def get_all_metrics(
 ):
     end = end or datetime.utcnow()
     start = start or (end - relativedelta(days=1))
-    data = await database.metric.filter(
-        db,
-        start=start,
-        end=end,
-        period=(period or "5min"),
-    )
+    try:
+        iaas, paas = (
+            database.metric.series_query(
+                start=start,
+                end=end,
+                period=(period or "5min"),
+                type=iaas_type,
+            )
+            for iaas_type in (model.IaasType.IAAS, model.IaasType.PAAS)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return [
-        {
-            "label": "IaaS Instances",
-            "data": data.query(f"type == '{model.IaasType.IAAS.value}'").to_dict(
-                orient="records"
-            ),
-        },
-        {
-            "label": "PaaS Instances",
-            "data": data.query(f"type == '{model.IaasType.PAAS.value}'").to_dict(
-                orient="records"
-            ),
-        },
-    ]
+    return StreamingResponse(
+        stream_datasets(
+            [
+                ("IaaS Instances", database.metric.stream(db, iaas)),
+                ("PaaS Instances", database.metric.stream(db, paas)),
+            ]
+        ),
+        media_type="application/json",
+    )
 
 
 @router.get(
@@ -65,10 +106,12 @@ async def get_billing(
         hour=0, minute=0, second=0, microsecond=0
     )
     end = end or start + relativedelta(months=1)
-    df = await database.metric.filter(
-        db, account=acct, start=start, end=end, period="5min"
+    query = database.metric.series_query(
+        account=acct, start=start, end=end, period="5min"
+    )
+    return StreamingResponse(
+        stream_dataset(
+            f"{acct.name} ({acct.iaas.name})", database.metric.stream(db, query)
+        ),
+        media_type="application/json",
     )
-    return {
-        "label": f"{acct.name} ({acct.iaas.name})",
-        "data": df.to_dict(orient="records"),
-    }
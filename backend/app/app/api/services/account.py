@@ -1,12 +1,12 @@
-from typing import List, Union, Dict, Any, Optional, Tuple
+from typing import List, Union, Dict, Any, Optional
 
 from sqlalchemy import select
 from sqlalchemy.sql import Select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import contains_eager
 
 from app.api.core import exception
 from app.database import Account, Iaas, Group
-from app.model import CreateAccount, UpdateAccount, AccountFilter, SearchQueryBase
+from app.model import CreateAccount, UpdateAccount, AccountFilter
 from .base import CrudBase
 
 from pycloud import CloudFactory
@@ -15,8 +15,10 @@ from pycloud import CloudFactory
 class AccountService(CrudBase[Account, CreateAccount, UpdateAccount, AccountFilter]):
     @property
     def query(self) -> Select:
-        return select(self.model).options(
-            selectinload(Account.iaas), selectinload(Account.group)
+        # The provider is part of every account response, and the join is
+        # needed anyway to filter on it
+        return (
+            select(self.model).join(Account.iaas).options(contains_eager(Account.iaas))
         )
 
     async def create(self, *, data: CreateAccount) -> Account:
@@ -64,17 +66,16 @@ class AccountService(CrudBase[Account, CreateAccount, UpdateAccount, AccountFilt
 
         return await super().update(obj=obj, data=data)
 
-    async def search(
+    def search_query(
         self,
-        *,
         query: Optional[Select] = None,
         filter: Optional[Union[AccountFilter, Dict[str, Any]]] = None,
-        exclude: Optional[List[int]] = [],
-        pagination: SearchQueryBase = SearchQueryBase(),
-    ) -> Tuple[List[Account], int]:
+        exclude: Optional[List[int]] = None,
+    ) -> Select:
         filter = filter if isinstance(filter, dict) else filter.dict(exclude_unset=True)
         query = query if query is not None else self.query
         if filter:
+            filter = dict(filter)
             if filter["iaas"]:
                 query = query.where(Iaas.name == filter["iaas"])
                 del filter["iaas"]
@@ -82,11 +83,6 @@ class AccountService(CrudBase[Account, CreateAccount, UpdateAccount, AccountFilt
                 query = query.where(Iaas.type == filter["type"])
                 del filter["type"]
             if filter["group"]:
-                query = query.where(Group.name == filter["group"])
+                query = query.join(Account.group).where(Group.name == filter["group"])
                 del filter["group"]
-        return await super().search(
-            query=query,
-            filter=filter,
-            exclude=exclude,
-            pagination=pagination,
-        )
+        return super().search_query(query, filter, exclude)
@@ -14,12 +14,13 @@ from typing import (
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.sql import Select
 from sqlalchemy.orm import with_polymorphic
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 
 from app.database.base import Base
+from app.database.pagination import count_rows, seek_page, sort_column
 from app.database.user import User
 from app.model.common import SearchQueryBase
 from app.api.core import get_db, get_current_user, exception
@@ -116,27 +117,27 @@ class CrudBase(
         *,
         query: Select,
         pagination: SearchQueryBase,
-    ) -> Tuple[List[ModelType], int]:
+    ) -> Tuple[List[ModelType], Optional[int]]:
         offset = (pagination.page - 1) * pagination.per_page if pagination.page else 0
-        total = await self.db.scalar(
-            select([func.count()]).select_from(query.subquery())
-        )
-        if pagination.sort and hasattr(self.model, pagination.sort):
-            attr = getattr(self.model, pagination.sort)
+        total = await count_rows(self.db, query, pagination.total_mode)
+        if (attr := self.sort_column(pagination.sort)) is not None:
             query = query.order_by(
                 attr.desc() if pagination.order == "desc" else attr.asc()
             )
-        query = query.offset(offset).limit(pagination.per_page or total)
+        query = query.offset(offset)
+        if pagination.per_page:
+            query = query.limit(pagination.per_page)
         return (await self.db.scalars(query)).all(), total
 
-    async def search(
+    def sort_column(self, sort: Optional[str]) -> Any:
+        return sort_column(self.model, sort)
+
+    def search_query(
         self,
-        *,
         query: Optional[Select] = None,
         filter: Optional[Union[FilterSchemaType, Dict[str, Any]]] = None,
         exclude: Optional[List[int]] = None,
-        pagination: SearchQueryBase = SearchQueryBase(),
-    ) -> Tuple[List[ModelType], int]:
+    ) -> Select:
         query = query if query is not None else self.query
         if filter:
             filter = (
@@ -151,4 +152,55 @@ class CrudBase(
                     )
         if exclude:
             query = query.where(~self.model.id.in_(exclude))
+        return query
+
+    async def search(
+        self,
+        *,
+        query: Optional[Select] = None,
+        filter: Optional[Union[FilterSchemaType, Dict[str, Any]]] = None,
+        exclude: Optional[List[int]] = None,
+        pagination: SearchQueryBase = SearchQueryBase(),
+    ) -> Tuple[List[ModelType], Optional[int]]:
+        query = self.search_query(query, filter, exclude)
         return await self._paginate(query=query, pagination=pagination)
+
+    async def seek(
+        self,
+        *,
+        query: Optional[Select] = None,
+        filter: Optional[Union[FilterSchemaType, Dict[str, Any]]] = None,
+        exclude: Optional[List[int]] = None,
+        pagination: SearchQueryBase = SearchQueryBase(cursor=""),
+    ) -> Tuple[List[ModelType], Optional[int], Optional[str]]:
+        """
+        Same as search but pages with pagination.cursor instead of page numbers.
+        Returns the results, the total if asked for and the next page's cursor.
+        """
+        try:
+            return await seek_page(
+                self.db,
+                self.search_query(query, filter, exclude),
+                sort=self.sort_column(pagination.sort),
+                id=self.model.id,
+                order=pagination.order,
+                cursor=pagination.cursor,
+                limit=pagination.per_page,
+                with_total=pagination.total_mode,
+            )
+        except ValueError as e:
+            raise exception.InvalidParameter(str(e))
+
+    async def search_page(
+        self,
+        *,
+        filter: Optional[Union[FilterSchemaType, Dict[str, Any]]] = None,
+        pagination: SearchQueryBase = SearchQueryBase(),
+    ) -> Tuple[List[ModelType], Optional[int], Optional[str]]:
+        """
+        seek when pagination has a cursor, search otherwise.
+        """
+        if pagination.cursor is not None:
+            return await self.seek(filter=filter, pagination=pagination)
+        results, total = await self.search(filter=filter, pagination=pagination)
+        return results, total, None
@@ -12,4 +12,6 @@ from .base import CrudBase
 class GroupService(CrudBase[Group, CreateGroup, UpdateGroup, FilterGroup]):
     @property
     def query(self) -> Select:
-        return select(self.model).options(selectinload(Group.accounts))
+        return select(self.model).options(
+            selectinload(Group.accounts).joinedload(Account.iaas)
+        )
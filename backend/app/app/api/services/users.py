@@ -1,4 +1,4 @@
-from typing import List, Union, Dict, Any, Optional, Tuple
+from typing import List, Union, Dict, Any, Optional
 
 from fastapi import Depends
 from sqlalchemy import select
@@ -9,7 +9,7 @@ from app.core.security import (
     create_secret,
 )
 from app.database import User
-from app.model import CreateUser, UpdateUser, UserFilter, SearchQueryBase
+from app.model import CreateUser, UpdateUser, UserFilter
 from .base import CrudBase
 
 
@@ -42,18 +42,12 @@ class UserService(CrudBase[User, CreateUser, UpdateUser, UserFilter]):
     async def delete(self, *, obj: User) -> None:
         await super().delete(obj=obj)
 
-    async def search(
+    def search_query(
         self,
-        *,
         query: Optional[Select] = None,
         filter: Optional[Union[UserFilter, Dict[str, Any]]] = None,
         exclude: Optional[List[int]] = None,
-        pagination: SearchQueryBase = SearchQueryBase(),
-    ) -> Tuple[List[User], int]:
+    ) -> Select:
+        # Users never see themselves in searches
         exclude = (exclude or []) + [self.user.id]
-        return await super().search(
-            query=query,
-            filter=filter,
-            exclude=exclude,
-            pagination=pagination,
-        )
+        return super().search_query(query, filter, exclude)
@@ -34,11 +34,15 @@ class AccountAPI:
         """
         Get a list of accounts filtered by query.
         """
-        accounts, total = await self.service.search(
+        accounts, total, cursor = await self.service.search_page(
             filter=filter, pagination=pagination
         )
         return model.AccountSearchResponse.from_results(
-            pagination=pagination, results=accounts, total=total, request=request
+            pagination=pagination,
+            results=accounts,
+            total=total,
+            request=request,
+            cursor=cursor,
         )
 
     @router.post(
@@ -31,9 +31,15 @@ class GroupAPI:
         """
         Get a list of groups filtered by query.
         """
-        groups, total = await self.service.search(filter=filter, pagination=pagination)
+        groups, total, cursor = await self.service.search_page(
+            filter=filter, pagination=pagination
+        )
         return model.GroupSearchResponse.from_results(
-            pagination=pagination, results=groups, total=total, request=request
+            pagination=pagination,
+            results=groups,
+            total=total,
+            request=request,
+            cursor=cursor,
         )
 
     @router.post(
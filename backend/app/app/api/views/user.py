@@ -34,9 +34,15 @@ class UserAPI:
         """
         Get a list of users filtered by query.
         """
-        users, total = await self.service.search(filter=filter, pagination=pagination)
+        users, total, cursor = await self.service.search_page(
+            filter=filter, pagination=pagination
+        )
         return model.UserSearchResponse.from_results(
-            pagination=pagination, results=users, total=total, request=request
+            pagination=pagination,
+            results=users,
+            total=total,
+            request=request,
+            cursor=cursor,
         )
 
     @router.post(
@@ -20,4 +20,8 @@ app.conf.beat_schedule = {
         "task": "get_instance_count_all",
         "schedule": 5 * 60,
     },
+    "maintain_metric_partitions": {
+        "task": "maintain_metric_partitions",
+        "schedule": crontab(hour=1, minute=0),
+    },
 }
@@ -71,6 +71,12 @@ class Configs(BaseSettings):
     REDIS_DSN: Optional[RedisDsn] = None
 
     REDIS_2FA_DB: int = 1
+    # Provider auth tokens, shared between the api and workers
+    REDIS_TOKEN_DB: int = 2
+    # Provider rate limit buckets, shared by every worker
+    REDIS_RATELIMIT_DB: int = 3
+    # Where provider resources were last seen, instance id to region etc.
+    REDIS_LOCATION_DB: int = 4
 
     @validator("REDIS_DSN", pre=True)
     def assemble_redis_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
@@ -82,6 +88,19 @@ class Configs(BaseSettings):
             port=str(values.get("REDIS_PORT")),
         )
 
+    # Collection cycles (billing, instance counts)
+    # Max accounts being collected at once across all providers
+    COLLECT_CONCURRENCY: int = 50
+    # Max accounts being collected at once for a single provider
+    COLLECT_PROVIDER_CONCURRENCY: int = 10
+    # Seconds a single account may take before it's given up on
+    COLLECT_TIMEOUT: float = 120
+
+    # Months of raw samples to keep, older months only live on in the rollups
+    METRIC_RETENTION_MONTHS: Optional[int] = 3
+    # Months of partitions to create ahead of time
+    METRIC_PARTITIONS_AHEAD: int = 2
+
     FIRST_USER_NAME: str = "admin"
     FIRST_USER_PASS: str
 
@@ -0,0 +1,72 @@
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO, Iterable, Iterator, List, Sequence
+
+from openpyxl import Workbook
+from openpyxl.workbook.child import INVALID_TITLE_REGEX
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+from starlette.concurrency import run_in_threadpool
+
+MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Saved workbooks up to this size stay in memory, bigger ones go to disk
+SPOOL_SIZE = 4 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class Spreadsheet:
+    """
+    A write only workbook built in worker threads, so the event loop keeps
+    serving requests while a large export is put together.
+
+    Write only sheets go to a temporary file as rows are appended, so only the
+    batch being appended is ever in memory. Saving zips the sheets into a
+    spooled temporary file, which is what gets streamed to the client.
+    """
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+
+    async def add_sheet(self, title: str, header: Sequence[Any]) -> WriteOnlyWorksheet:
+        sheet = self.workbook.create_sheet(sheet_title(title))
+        await self.append(sheet, [header])
+        return sheet
+
+    async def append(
+        self, sheet: WriteOnlyWorksheet, rows: Iterable[Sequence[Any]]
+    ) -> None:
+        await run_in_threadpool(_append, sheet, list(rows))
+
+    async def save(self) -> BinaryIO:
+        """
+        Returns the finished workbook as a file positioned at the start.
+        The workbook can't be used after this.
+        """
+        return await run_in_threadpool(self._save)
+
+    def _save(self) -> BinaryIO:
+        file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self.workbook.save(file)
+        file.seek(0)
+        return file  # type: ignore
+
+
+def _append(sheet: WriteOnlyWorksheet, rows: List[Sequence[Any]]) -> None:
+    for row in rows:
+        sheet.append(row)
+
+
+def sheet_title(title: str) -> str:
+    # Excel caps titles at 31 characters and doesn't allow []:*?/\
+    return INVALID_TITLE_REGEX.sub("-", title)[:31]
+
+
+def iter_file(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Reads file a chunk at a time and closes it when done. It streams a saved
+    workbook, nothing is sent while rows are still being written.
+    StreamingResponse runs plain iterators in a threadpool.
+    """
+    try:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
@@ -5,3 +5,4 @@ from .account import Account, account
 from .billing import Billing, billing
 from .template import Template, template
 from .metric import CloudMetric, metric
+from .invoice import FinalizedInvoice
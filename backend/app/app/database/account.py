@@ -1,8 +1,10 @@
-from typing import TYPE_CHECKING, Union, Optional, Tuple, List, Dict
+from typing import TYPE_CHECKING, Union, Optional, List, Dict
 import traceback
 
 from sqlalchemy import (
+    bindparam,
     select,
+    update,
     Column,
     Integer,
     String,
@@ -11,7 +13,7 @@ from sqlalchemy import (
     Boolean,
 )
 from sqlalchemy.sql import Select
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import contains_eager, joinedload, relationship
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 
 from .base import Base, CRUDBase
@@ -35,8 +37,9 @@ class Account(Base):
     validated: bool = Column(Boolean, nullable=False, default=False)
     last_error: Optional[str] = Column(String, nullable=True)
 
-    iaas: Iaas = relationship("Iaas", lazy="selectin")
-    group: Group = relationship("Group", lazy="selectin")
+    # Nothing is loaded implicitly, queries ask for what they need
+    iaas: Iaas = relationship("Iaas", lazy="raise")
+    group: Group = relationship("Group", lazy="raise")
     bills: List["Billing"] = relationship(
         "Billing", back_populates="account", lazy="noload", cascade="all, delete-orphan"
     )
@@ -52,11 +55,35 @@ class Account(Base):
 
 
 class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]):
+    def query(self) -> Select:
+        """
+        Accounts are always used with their provider, it's loaded in the same
+        statement. Anything else has to be asked for.
+        """
+        return select(Account).options(joinedload(Account.iaas))
+
+    async def reload(self, db: Session, account: Account) -> Account:
+        """
+        Reloads an account and its provider after a commit or refresh
+        expired them.
+        """
+        return await db.scalar(
+            self.query()
+            .where(Account.id == account.id)
+            .execution_options(populate_existing=True)
+        )
+
     async def get(self, db: Session, id: int) -> Optional[Account]:
+        return await db.scalar(self.query().where(Account.id == id))
+
+    async def get_all(self, db: Session) -> List[Account]:
+        return (await db.execute(self.query())).scalars().all()
+
+    async def get_by_iaas(self, db: Session, *, iaas_id: int) -> List[Account]:
         return (
-            (await db.execute(select(Account).where(Account.id == id)))
+            (await db.execute(self.query().where(Account.iaas_id == iaas_id)))
             .scalars()
-            .first()
+            .all()
         )
 
     async def create(self, db: Session, *, obj_in: CreateAccount) -> Account:
@@ -83,8 +110,7 @@ class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]
         db_obj.currency = CloudFactory.get_client(dbIaas.name, obj_in.data).currency()
         db.add(db_obj)
         await db.commit()
-        await db.refresh(db_obj)
-        return db_obj
+        return await self.reload(db, db_obj)
 
     async def update(
         self,
@@ -102,23 +128,19 @@ class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]
 
             CloudFactory.get_client(db_obj.iaas.name, obj_in.data)
 
-        return await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        return await self.reload(db, db_obj)
 
-    async def filter(
+    def search_query(
         self,
-        db: Session,
-        *,
         query: Optional[Select] = None,
         filter: Optional[Union[AccountFilter, Dict]] = None,
-        offset: Optional[int] = None,
-        limit: Optional[int] = None,
-        sort: Optional[str] = None,
-        order: Optional[str] = "asc",
         exclude: Optional[List[int]] = None,
-    ) -> Tuple[List[Account], int]:
+    ) -> Select:
         filter = AccountFilter(**filter) if isinstance(filter, dict) else filter
-        query = select(Account).join(Iaas)
+        query = select(Account).join(Iaas).options(contains_eager(Account.iaas))
         if filter:
+            filter = filter.copy()
             if filter.iaas:
                 query = query.where(Iaas.name == filter.iaas)
                 filter.iaas = None
@@ -126,16 +148,7 @@ class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]
                 query = query.where(Iaas.type == filter.type)
                 filter.type = None
 
-        return await super().filter(
-            db,
-            query=query,
-            filter=filter,
-            offset=offset,
-            limit=limit,
-            sort=sort,
-            order=order,
-            exclude=exclude,
-        )
+        return super().search_query(query, filter, exclude)
 
     async def get_by_name(
         self, db: Session, *, name: str, iaas: str
@@ -145,6 +158,7 @@ class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]
                 await db.execute(
                     select(Account)
                     .join(Iaas)
+                    .options(contains_eager(Account.iaas))
                     .where(Iaas.name == iaas, Account.name == name)
                 )
             )
@@ -152,6 +166,36 @@ class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]
             .first()
         )
 
+    async def set_status_many(
+        self,
+        db: Session,
+        *,
+        validated: List[int],
+        errors: Dict[int, str],
+    ) -> None:
+        """
+        Marks many accounts as validated or failed in a single commit.
+        errors maps account ids to the error that invalidated them.
+        """
+        if validated:
+            await db.execute(
+                update(Account)
+                .where(Account.id.in_(validated))
+                .values(validated=True, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        if errors:
+            await db.execute(
+                update(Account.__table__)
+                .where(Account.__table__.c.id == bindparam("account_id"))
+                .values(validated=False, last_error=bindparam("error")),
+                [
+                    {"account_id": account_id, "error": error}
+                    for account_id, error in errors.items()
+                ],
+            )
+        await db.commit()
+
     async def validate(self, db: Session, *, account: Account) -> Account:
         if account.validated:
             return account
@@ -170,8 +214,7 @@ class AccountCRUD(CRUDBase[Account, CreateAccount, UpdateAccount, AccountFilter]
 
         db.add(account)
         await db.commit()
-        await db.refresh(account)
-        return account
+        return await self.reload(db, account)
 
 
 account = AccountCRUD(Account)
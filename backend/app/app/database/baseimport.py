@@ -7,3 +7,4 @@ from app.database.account import Account  # noqa
 from app.database.billing import Billing  # noqa
 from app.database.template import Template  # noqa
 from app.database.metric import CloudMetric  # noqa
+from app.database.invoice import FinalizedInvoice  # noqa
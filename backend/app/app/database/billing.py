@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Union, Optional, Tuple, List, Dict
+from typing import Any, Union, Optional, List, Dict
 
 from sqlalchemy import (
     Column,
@@ -8,18 +8,19 @@ from sqlalchemy import (
     ForeignKey,
     Float,
     String,
-    asc,
     desc,
     select,
 )
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql import Select
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import contains_eager, joinedload, relationship
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from dateutil.relativedelta import relativedelta
 
 from .base import Base, CRUDBase
 from .account import Account  # noqa
 from .iaas import Iaas
+from .template import TemplateOrder
 from app.model.billing import (
     BillingPeriodFilter,
     UpdateBillingPeriod,
@@ -33,7 +34,7 @@ class BillingPeriod(Base):
     period: str = Column(String(9), index=True, unique=True)
 
     billing: List["Billing"] = relationship(
-        "Billing", back_populates="period", lazy="selectin"
+        "Billing", back_populates="period", lazy="raise"
     )
 
 
@@ -46,8 +47,10 @@ class Billing(Base):
     total: float = Column(Float, nullable=False)
     balance: Optional[float] = Column(Float, nullable=True)
 
-    period: BillingPeriod = relationship("BillingPeriod", back_populates="billing")
-    account: Account = relationship("Account", lazy="selectin")
+    period: BillingPeriod = relationship(
+        "BillingPeriod", back_populates="billing", lazy="raise"
+    )
+    account: Account = relationship("Account", lazy="raise")
 
     def __repr__(self):
         return f"Billing(id={self.id!r}, account_id={self.account_id!r}, start_date={self.start_date!r}, end_date={self.end_date!r}, total={self.total!r}, balance={self.balance!r})"  # noqa
@@ -56,22 +59,39 @@ class Billing(Base):
 class BillingCRUD(
     CRUDBase[Billing, CreateBillingPeriod, UpdateBillingPeriod, BillingPeriodFilter]
 ):
-    async def filter(
+    def query(self) -> Select:
+        """
+        Billing records are shown with their account and its provider,
+        both are loaded in the same statement.
+        """
+        return select(Billing).options(
+            joinedload(Billing.account).joinedload(Account.iaas)
+        )
+
+    async def get(self, db: Session, id: int) -> Optional[Billing]:
+        return await db.scalar(self.query().where(Billing.id == id))
+
+    def sort_column(self, sort: Optional[str]) -> Any:
+        if sort == "iaas":
+            return Iaas.name
+        if sort == "account":
+            return Account.name
+        return super().sort_column(sort)
+
+    def search_query(
         self,
-        db: Session,
-        *,
         query: Optional[Select] = None,
         filter: Optional[Union[BillingPeriodFilter, Dict]] = None,
-        offset: Optional[int] = None,
-        limit: Optional[int] = None,
-        sort: Optional[str] = None,
-        order: Optional[str] = "asc",
         exclude: Optional[List[int]] = None,
-    ) -> Tuple[List[Billing], int]:
+    ) -> Select:
         query = (
             query
             if query is not None
-            else select(Billing).join(BillingPeriod).join(Account).join(Iaas)
+            else select(Billing)
+            .join(BillingPeriod)
+            .join(Account)
+            .join(Iaas)
+            .options(contains_eager(Billing.account).contains_eager(Account.iaas))
         )
         if filter:
             filter = (
@@ -85,23 +105,7 @@ class BillingCRUD(
                 query = query.where(Iaas.name == filter.iaas)
             if filter.account:
                 query = query.where(Account.name == filter.account)
-        op = asc if order == "asc" else desc
-        if sort == "iaas":
-            query = query.order_by(op(Iaas.name))
-            sort = None
-        if sort == "account":
-            query = query.order_by(op(Account.name))
-            sort = None
-        return await super().filter(
-            db,
-            query=query,
-            filter=None,
-            offset=offset,
-            limit=limit,
-            sort=sort,
-            order=order,
-            exclude=exclude,
-        )
+        return super().search_query(query, None, exclude)
 
     async def create(
         self,
@@ -128,8 +132,72 @@ class BillingCRUD(
         )
         db.add(billing)
         await db.commit()
-        await db.refresh(billing)
-        return billing
+        return await db.scalar(
+            self.query()
+            .where(Billing.id == billing.id)
+            .execution_options(populate_existing=True)
+        )
+
+    async def upsert_many(
+        self,
+        db: Session,
+        *,
+        objs_in: List[CreateBillingPeriod],
+    ) -> None:
+        """
+        Creates or updates many billing records in one go.
+        Records are matched on account and start/end date like create() is.
+        """
+        if not objs_in:
+            return
+        # Cloud providers have end date as exclusive normally subtract 1 day
+        periods = {
+            (obj.end_date - relativedelta(days=1)).strftime("%Y-%m") for obj in objs_in
+        }
+        await db.execute(
+            insert(BillingPeriod)
+            .values([{"period": period} for period in periods])
+            .on_conflict_do_nothing(index_elements=[BillingPeriod.period])
+        )
+        period_ids = dict(
+            (
+                await db.execute(
+                    select(BillingPeriod.period, BillingPeriod.id).where(
+                        BillingPeriod.period.in_(periods)
+                    )
+                )
+            ).all()
+        )
+
+        stmt = insert(Billing).values(
+            [
+                {
+                    "account_id": obj.account_id,
+                    "period_id": period_ids[
+                        (obj.end_date - relativedelta(days=1)).strftime("%Y-%m")
+                    ],
+                    "start_date": obj.start_date,
+                    "end_date": obj.end_date,
+                    "total": obj.total,
+                    "balance": obj.balance,
+                }
+                for obj in objs_in
+            ]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    Billing.account_id,
+                    Billing.start_date,
+                    Billing.end_date,
+                ],
+                set_={
+                    "total": stmt.excluded.total,
+                    "balance": stmt.excluded.balance,
+                },
+            )
+        )
+        await db.commit()
 
     async def get_period(
         self,
@@ -183,22 +251,50 @@ class BillingCRUD(
             .first()
         )
 
+    def export_query(self, *, template_id: int, period: str) -> Select:
+        """
+        A period's billing for the accounts in a template, in the template's
+        order. Plain columns rather than Billing objects so that streaming
+        them doesn't fill up the session.
+        """
+        return (
+            select(
+                Iaas.name.label("iaas"),
+                Account.data["endpoint"].as_string().label("endpoint"),
+                Account.name.label("account"),
+                Billing.start_date,
+                Billing.end_date,
+                Billing.total,
+                Billing.balance,
+            )
+            .join(Billing.period)
+            .join(Billing.account)
+            .join(Account.iaas)
+            .join(TemplateOrder, TemplateOrder.account_id == Billing.account_id)
+            .where(
+                TemplateOrder.template_id == template_id,
+                BillingPeriod.period == period,
+            )
+            .order_by(TemplateOrder.sort_order)
+        )
+
     async def get_billing_period(
         self,
         db: Session,
         *,
         period: str,
     ) -> List[Billing]:
-        resp = (
+        return (
             (
                 await db.execute(
-                    select(BillingPeriod).where(BillingPeriod.period == period)
+                    self.query()
+                    .join(BillingPeriod)
+                    .where(BillingPeriod.period == period)
                 )
             )
             .scalars()
-            .first()
+            .all()
         )
-        return resp.billing if resp else None
 
 
 billing = BillingCRUD(Billing)
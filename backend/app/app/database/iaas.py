@@ -18,7 +18,7 @@ class Iaas(Base):
     params: List[Dict[str, Union[str, List[str]]]] = Column(JSON, nullable=False)
 
     accounts: List["Account"] = relationship(
-        "Account", back_populates="iaas", lazy="selectin"
+        "Account", back_populates="iaas", lazy="raise"
     )
 
     def __repr__(self):
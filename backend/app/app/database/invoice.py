@@ -0,0 +1,69 @@
+from typing import Any, Dict, Iterable
+from datetime import datetime
+
+from sqlalchemy import JSON, select, Column, String, DateTime, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import sessionmaker
+
+from .base import Base
+from pycloud.invoices import Invoice, InvoiceBackend
+
+
+class FinalizedInvoice(Base):
+    """
+    Invoices a provider won't change any more. account is the hash of the
+    credentials the controller fetched it with, not an account id, so the
+    same provider account added twice shares its invoices.
+    """
+
+    __tablename__ = "finalized_invoice"
+    provider: str = Column(String, primary_key=True)
+    account: str = Column(String, primary_key=True)
+    invoice_id: str = Column(String, primary_key=True)
+    data: Dict[str, Any] = Column(JSON, nullable=False)
+    created_at: datetime = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class DatabaseInvoiceBackend(InvoiceBackend):
+    """
+    Keeps finalized invoices in postgres so they outlive the worker that
+    fetched them. Each call uses its own session, controllers don't have one.
+    """
+
+    def __init__(self, session: sessionmaker):
+        self.session = session
+
+    async def get(
+        self, provider: str, account: str, ids: Iterable[str]
+    ) -> Dict[str, Invoice]:
+        async with self.session() as db:
+            rows = await db.execute(
+                select(FinalizedInvoice.invoice_id, FinalizedInvoice.data).where(
+                    FinalizedInvoice.provider == provider,
+                    FinalizedInvoice.account == account,
+                    FinalizedInvoice.invoice_id.in_(list(ids)),
+                )
+            )
+            return {invoice_id: data for invoice_id, data in rows}
+
+    async def put(
+        self, provider: str, account: str, invoices: Dict[str, Invoice]
+    ) -> None:
+        async with self.session() as db:
+            # Whoever stored it first wins, it's the same invoice either way
+            await db.execute(
+                insert(FinalizedInvoice)
+                .values(
+                    [
+                        {
+                            "provider": provider,
+                            "account": account,
+                            "invoice_id": id,
+                            "data": invoice,
+                        }
+                        for id, invoice in invoices.items()
+                    ]
+                )
+                .on_conflict_do_nothing()
+            )
+            await db.commit()
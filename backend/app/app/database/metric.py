@@ -1,21 +1,129 @@
-from tokenize import group
-from typing import Optional, List, Dict, Any
-import logging
-from datetime import datetime
-
-from sqlalchemy import JSON, select, Column, Integer, ForeignKey, DateTime
-from sqlalchemy.sql import Select
-from sqlalchemy.orm import relationship
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Type, Union
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import (
+    select,
+    Column,
+    Integer,
+    ForeignKey,
+    DateTime,
+    Interval,
+    Float,
+    cast,
+    func,
+    literal_column,
+    text,
+)
+from sqlalchemy.sql import Select, ColumnElement
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, array_agg, insert
+from sqlalchemy.orm import declared_attr, relationship
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 import pandas as pd
-import numpy as np
+from pandas.tseries import offsets
+from pandas.tseries.frequencies import to_offset
+from dateutil.relativedelta import relativedelta
 
-from .base import Base, CRUDBase
+from app.core.config import configs
+from .base import Base
 from .account import Account  # noqa
 from .iaas import Iaas, IaasType
 
 
+# Fixed size buckets are counted from here, midnight aligned like pandas
+BUCKET_ORIGIN = datetime(2000, 1, 1)
+
+# Calendar frequencies that have a date_trunc equivalent
+CALENDAR_BUCKETS = {
+    offsets.Week: "week",
+    offsets.MonthBegin: "month",
+    offsets.MonthEnd: "month",
+    offsets.QuarterBegin: "quarter",
+    offsets.QuarterEnd: "quarter",
+    offsets.YearBegin: "year",
+    offsets.YearEnd: "year",
+}
+
+
+def parse_period(period: str) -> offsets.DateOffset:
+    try:
+        offset = to_offset(period)
+    except ValueError:
+        raise ValueError(f"Invalid period: {period}")
+    if not isinstance(offset, offsets.Tick) and (
+        type(offset) not in CALENDAR_BUCKETS or offset.n != 1
+    ):
+        raise ValueError(f"Unsupported period: {period}")
+    return offset
+
+
+def time_bucket(period: str, column: Any) -> ColumnElement:
+    """
+    Translates a pandas frequency string ("5min", "1H", "D", "W", "M", ...)
+    into a SQL expression putting column into buckets of that size.
+    Buckets are labelled with their start time.
+    """
+    offset = parse_period(period)
+    if isinstance(offset, offsets.Tick):
+        return func.date_bin(
+            cast(pd.Timedelta(offset).to_pytimedelta(), Interval),
+            column,
+            cast(BUCKET_ORIGIN, DateTime),
+        )
+    return func.date_trunc(CALENDAR_BUCKETS[type(offset)], column)
+
+
+def utc_naive(time: datetime) -> datetime:
+    if time.tzinfo:
+        return time.astimezone(timezone.utc).replace(tzinfo=None)
+    return time
+
+
+def is_aligned(time: datetime, resolution: timedelta) -> bool:
+    return (utc_naive(time) - BUCKET_ORIGIN) % resolution == timedelta(0)
+
+
+def snap(time: datetime, resolution: timedelta, up: bool = False) -> datetime:
+    """
+    Moves time back to the start of its bucket of resolution, or forward to
+    the start of the next one if up.
+    """
+    remainder = (utc_naive(time) - BUCKET_ORIGIN) % resolution
+    if up and remainder:
+        return time - remainder + resolution
+    return time - remainder
+
+
+# cloud_metric is partitioned by month, see partition_name
+PARTITION_RE = re.compile(r"^cloud_metric_(\d{4})_(\d{2})$")
+
+
+def partition_name(month: datetime) -> str:
+    return f"cloud_metric_{month:%Y_%m}"
+
+
+def month_start(time: datetime) -> datetime:
+    return time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    The start of the oldest month whose raw samples are kept, anything before
+    it only lives on in the rollups. None if raw samples are kept forever.
+    """
+    if not configs.METRIC_RETENTION_MONTHS:
+        return None
+    now = now or datetime.utcnow()
+    return month_start(now - relativedelta(months=configs.METRIC_RETENTION_MONTHS))
+
+
 class CloudMetric(Base):
+    """
+    Raw samples, range partitioned by month on time so old months can be
+    dropped whole instead of DELETEd. Samples outside every monthly partition
+    end up in cloud_metric_default.
+    """
+
     __tablename__ = "cloud_metric"
     id: int = Column(Integer, primary_key=True, index=True)
     account_id: int = Column(
@@ -24,12 +132,70 @@ class CloudMetric(Base):
     time: datetime = Column(DateTime(timezone=True), nullable=False)
     instances: int = Column(Integer, nullable=False)
 
-    account: Account = relationship("Account", lazy="selectin")
+    account: Account = relationship("Account", lazy="raise")
 
     def __repr__(self):
         return f"CloudMetric(id={self.id!r}, account_id={self.account_id!r}, time={self.time!r})"
 
 
+class RollupMixin:
+    """
+    Pre-aggregated cloud_metric samples, one row per account per bucket.
+    total is the sum of the samples so summing it over larger buckets gives
+    the same result as summing the raw samples.
+    """
+
+    # Size of a bucket and the matching date_trunc field
+    resolution: timedelta
+    field: str
+
+    @declared_attr
+    def account_id(cls) -> Column:
+        return Column(
+            Integer,
+            ForeignKey("account.id", ondelete="CASCADE"),
+            primary_key=True,
+        )
+
+    time: datetime = Column(DateTime, primary_key=True)
+    samples: int = Column(Integer, nullable=False)
+    total: int = Column(Integer, nullable=False)
+    min: int = Column(Integer, nullable=False)
+    max: int = Column(Integer, nullable=False)
+    avg: float = Column(Float, nullable=False)
+    last: int = Column(Integer, nullable=False)
+    last_time: datetime = Column(DateTime, nullable=False)
+
+
+class CloudMetricHourly(RollupMixin, Base):
+    __tablename__ = "cloud_metric_hourly"
+    resolution = timedelta(hours=1)
+    field = "hour"
+
+
+class CloudMetricDaily(RollupMixin, Base):
+    __tablename__ = "cloud_metric_daily"
+    resolution = timedelta(days=1)
+    field = "day"
+
+
+# Coarsest first
+ROLLUPS: List[Type[RollupMixin]] = [CloudMetricDaily, CloudMetricHourly]
+
+
+def made_of(offset: offsets.DateOffset, rollup: Type[RollupMixin]) -> bool:
+    """
+    Whether every bucket of offset is made of whole rollup buckets, calendar
+    periods always are.
+    """
+    if not isinstance(offset, offsets.Tick):
+        return True
+    return pd.Timedelta(offset) % rollup.resolution == timedelta(0)
+
+
+MetricSource = Union[Type[CloudMetric], Type[RollupMixin]]
+
+
 class MetricService:
     async def get(self, db: Session, id: int) -> Optional[CloudMetric]:
         return (
@@ -51,9 +217,211 @@ class MetricService:
         await db.refresh(metric)
         return metric
 
-    async def filter(
+    async def create_many(self, db: Session, *, metrics: List[Dict[str, Any]]) -> int:
+        """
+        Stores a whole collection cycle of metrics with a single INSERT.
+        Each metric is a dict with account_id, time and instances. Samples
+        that already exist for an account at that time are skipped.
+        Returns the number of rows actually inserted.
+        """
+        if not metrics:
+            return 0
+        # Passing one array per column and unnesting them server side keeps
+        # this to three bind parameters no matter how many samples there are,
+        # a multi-row VALUES would hit asyncpg's 32767 parameter limit at ~10k
+        samples = (
+            func.unnest(
+                cast([m["account_id"] for m in metrics], ARRAY(Integer)),
+                cast([m["time"] for m in metrics], ARRAY(DateTime)),
+                cast([m["instances"] for m in metrics], ARRAY(Integer)),
+            )
+            .table_valued("account_id", "time", "instances")
+            .render_derived()
+        )
+        result = await db.execute(
+            insert(CloudMetric)
+            .from_select(
+                ["account_id", "time", "instances"],
+                select(samples.c.account_id, samples.c.time, samples.c.instances),
+            )
+            .on_conflict_do_nothing(
+                index_elements=[CloudMetric.account_id, CloudMetric.time]
+            )
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def partitions(self, db: Session) -> List[Tuple[str, datetime]]:
+        """
+        Returns the monthly partitions of cloud_metric and the month each
+        one holds, oldest first.
+        """
+        names = (
+            await db.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = 'cloud_metric'::regclass"
+                )
+            )
+        ).scalars()
+        months = []
+        for name in names:
+            match = PARTITION_RE.match(name)
+            if match:
+                months.append((name, datetime(int(match[1]), int(match[2]), 1)))
+        return sorted(months, key=lambda p: p[1])
+
+    async def ensure_partitions(
+        self, db: Session, *, start: datetime, months: int
+    ) -> List[str]:
+        """
+        Creates the monthly partitions for the month of start and the given
+        number of months after it. Returns the partitions that were created.
+        """
+        existing = {name for name, _ in await self.partitions(db)}
+        created = []
+        month = month_start(start)
+        for _ in range(months + 1):
+            name = partition_name(month)
+            if name not in existing:
+                await db.execute(
+                    text(
+                        f"CREATE TABLE {name} PARTITION OF cloud_metric "
+                        f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                        f"TO ('{month + relativedelta(months=1):%Y-%m-%d}')"
+                    )
+                )
+                created.append(name)
+            month += relativedelta(months=1)
+        await db.commit()
+        return created
+
+    async def drop_partitions(self, db: Session, *, before: datetime) -> List[str]:
+        """
+        Drops the monthly partitions that only hold samples from before the
+        given time. Each month is rolled up first so the hourly and daily
+        tables keep the data. Returns the partitions that were dropped.
+        """
+        dropped = []
+        for name, month in await self.partitions(db):
+            end = month + relativedelta(months=1)
+            if end > before:
+                break
+            await self.rollup(db, start=month, end=end - timedelta(microseconds=1))
+            await db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+        await db.commit()
+        return dropped
+
+    async def rollup(self, db: Session, *, start: datetime, end: datetime) -> None:
+        """
+        Recomputes every hourly and daily rollup bucket overlapping start
+        to end from the raw samples, call it after storing new samples.
+        """
+        hour_start = start.replace(minute=0, second=0, microsecond=0)
+        hour_end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        await self._upsert_rollup(
+            db,
+            CloudMetricHourly,
+            select(
+                CloudMetric.account_id,
+                func.date_trunc(literal_column("'hour'"), CloudMetric.time),
+                func.count(),
+                func.sum(CloudMetric.instances),
+                func.min(CloudMetric.instances),
+                func.max(CloudMetric.instances),
+                func.avg(CloudMetric.instances),
+                array_agg(
+                    aggregate_order_by(CloudMetric.instances, CloudMetric.time.desc())
+                )[1],
+                func.max(CloudMetric.time),
+            )
+            .where(CloudMetric.time >= hour_start)
+            .where(CloudMetric.time < hour_end)
+            .group_by(
+                CloudMetric.account_id,
+                func.date_trunc(literal_column("'hour'"), CloudMetric.time),
+            ),
+        )
+
+        day_start = hour_start.replace(hour=0)
+        day_end = (hour_end - timedelta(hours=1)).replace(hour=0) + timedelta(days=1)
+        hourly = CloudMetricHourly
+        await self._upsert_rollup(
+            db,
+            CloudMetricDaily,
+            select(
+                hourly.account_id,
+                func.date_trunc(literal_column("'day'"), hourly.time),
+                func.sum(hourly.samples),
+                func.sum(hourly.total),
+                func.min(hourly.min),
+                func.max(hourly.max),
+                cast(func.sum(hourly.total), Float) / func.sum(hourly.samples),
+                array_agg(aggregate_order_by(hourly.last, hourly.last_time.desc()))[1],
+                func.max(hourly.last_time),
+            )
+            .where(hourly.time >= day_start)
+            .where(hourly.time < day_end)
+            .group_by(
+                hourly.account_id,
+                func.date_trunc(literal_column("'day'"), hourly.time),
+            ),
+        )
+        await db.commit()
+
+    async def _upsert_rollup(
+        self, db: Session, rollup: Type[RollupMixin], query: Select
+    ) -> None:
+        columns = [
+            "account_id",
+            "time",
+            "samples",
+            "total",
+            "min",
+            "max",
+            "avg",
+            "last",
+            "last_time",
+        ]
+        stmt = insert(rollup).from_select(columns, query)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["account_id", "time"],
+                set_={c: stmt.excluded[c] for c in columns[2:]},
+            )
+        )
+
+    def pick_source(
+        self, *, start: datetime, end: datetime, period: str
+    ) -> MetricSource:
+        """
+        Picks the coarsest table that can answer the query exactly. A rollup
+        only works if start and end fall on its bucket boundaries and every
+        period bucket is made of whole rollup buckets.
+        Raw samples from before the retention cutoff have been dropped, so a
+        query reaching back that far always gets a rollup, the coarsest one
+        period is made of or else the hourly one. series_query snaps its
+        bounds to the rollup's buckets, and widens a finer period to them.
+        """
+        offset = parse_period(period)
+        cutoff = retention_cutoff()
+        expired = cutoff is not None and utc_naive(start) < cutoff
+        for rollup in ROLLUPS:
+            if not made_of(offset, rollup):
+                continue
+            if expired or (
+                is_aligned(start, rollup.resolution)
+                and is_aligned(end, rollup.resolution)
+            ):
+                return rollup
+        if expired:
+            return CloudMetricHourly
+        return CloudMetric
+
+    def series_query(
         self,
-        db: Session,
         *,
         start: datetime,
         end: datetime,
@@ -61,37 +429,82 @@ class MetricService:
         type: Optional[IaasType] = None,
         iaas: Optional[Iaas] = None,
         account: Optional[Account] = None,
-    ) -> pd.DataFrame:
+    ) -> Select:
+        """
+        Builds a query summing instances per provider type into buckets of
+        period, ordered by type then time. Reads from the coarsest rollup
+        that can answer it, see pick_source.
+        Raises ValueError if period can't be done in SQL.
+        """
+        source = self.pick_source(start=start, end=end, period=period)
+        if source is CloudMetric:
+            value = CloudMetric.instances
+        else:
+            value = source.total  # type: ignore
+            start = snap(start, source.resolution)  # type: ignore
+            end = snap(end, source.resolution, up=True)  # type: ignore
+            if not made_of(parse_period(period), source):  # type: ignore
+                # Only past the retention cutoff, the samples a finer period
+                # needs are gone. Each rollup bucket stands in for one sample,
+                # its average, not the sum of all of them.
+                period = to_offset(source.resolution).freqstr  # type: ignore
+                value = source.avg  # type: ignore
+        bucket = time_bucket(period, source.time)
         query = (
-            select(CloudMetric)
-            .join(Account)
+            select(
+                Iaas.type.label("type"),
+                bucket.label("x"),
+                func.sum(value).label("y"),
+            )
+            .select_from(source)
+            .join(Account, Account.id == source.account_id)
             .join(Iaas)
-            .where(CloudMetric.time >= start)
-            .where(CloudMetric.time < end)
+            .where(source.time >= start)
+            .where(source.time < end)
         )
         if account:
-            query = query.where(CloudMetric.account_id == account.id)
+            query = query.where(source.account_id == account.id)
         if iaas:
             query = query.where(Account.iaas_id == iaas.id)
         if type:
             query = query.where(Iaas.type == type)
-        metrics: List[CloudMetric] = (await db.execute(query)).scalars().fetchall()
-        if not metrics:
-            return pd.DataFrame()
-        df = pd.DataFrame(
-            data=[
-                {
-                    "x": metric.time,
-                    "y": metric.instances,
-                    "type": metric.account.iaas.type.name,
-                }
-                for metric in metrics
-            ],
-        )
+        # Grouped by label, the bucket size and origin are bind parameters so
+        # repeating the expression here wouldn't match the one selected
+        return query.group_by("type", "x").order_by("type", "x")
 
-        return (
-            df.groupby(["type", pd.Grouper(key="x", freq=period)]).sum().reset_index()
+    async def stream(self, db: Session, query: Select) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the rows of a series_query as {"type", "x", "y"} without
+        loading the whole result first.
+        """
+        result = await db.stream(query)
+        try:
+            async for row in result:
+                yield {"type": row.type.name, "x": row.x, "y": row.y}
+        finally:
+            # Release the cursor even if the client goes away mid stream
+            await result.close()
+
+    async def filter(
+        self,
+        db: Session,
+        *,
+        start: datetime,
+        end: datetime,
+        period: str,
+        type: Optional[IaasType] = None,
+        iaas: Optional[Iaas] = None,
+        account: Optional[Account] = None,
+    ) -> List[Dict[str, Any]]:
+        query = self.series_query(
+            start=start,
+            end=end,
+            period=period,
+            type=type,
+            iaas=iaas,
+            account=account,
         )
+        return [row async for row in self.stream(db, query)]
 
 
 metric = MetricService()
@@ -0,0 +1,162 @@
+"""
+Cursor (keyset) pagination and totals for search queries.
+
+Page numbers turn into an OFFSET, which makes the database walk through and
+throw away every row before the page, and the count(*) that goes with them
+costs about as much as the page itself. A cursor remembers the sort key and
+id of the last row handed out instead, so the next page starts right after it.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Any, List, Optional, Tuple
+import base64
+import binascii
+import json
+
+from sqlalchemy import func, inspect, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import ClauseElement, Executable, Select
+
+from app.model.common import SearchOrder, TotalMode
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) of a statement, the plan is returned as a single row.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def encode_cursor(value: Any, id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Enum):
+        value = value.value
+    return base64.urlsafe_b64encode(json.dumps([value, id]).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: Any) -> Tuple[Any, int]:
+    """
+    Returns the sort value, as the type of the sort column, and id a cursor
+    points at. Raises ValueError if it isn't a cursor.
+    """
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        python_type = sort.type.python_type
+        if not isinstance(value, python_type):
+            value = (
+                datetime.fromisoformat(value)
+                if python_type is datetime
+                else python_type(value)
+            )
+        return value, int(id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor}") from e
+
+
+def sort_column(model: Any, sort: Optional[str]) -> Any:
+    """
+    Returns the column of model to order by for a sort parameter, None if
+    it's not one.
+    """
+    if sort and sort in inspect(model).column_attrs:
+        return getattr(model, sort)
+    return None
+
+
+def seek(
+    query: Select,
+    *,
+    sort: Any,
+    id: Any,
+    order: Optional[str] = SearchOrder.ASC,
+    cursor: Optional[str] = None,
+) -> Select:
+    """
+    Orders query by sort then id, starting after the row cursor points at.
+    """
+    if getattr(sort.expression, "nullable", False):
+        # NULLs can't be compared, rows with one would never be reached
+        raise ValueError(f"Can't page through {sort.key} with a cursor")
+    keys = (sort, id)
+    desc = order == SearchOrder.DESC
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        after = tuple_(literal(value, sort.type), literal(last_id, id.type))
+        query = query.where(tuple_(*keys) < after if desc else tuple_(*keys) > after)
+    return query.order_by(*(key.desc() if desc else key.asc() for key in keys))
+
+
+async def fetch_page(
+    db: Session,
+    query: Select,
+    *,
+    sort: Any,
+    id: Any,
+    order: Optional[str] = SearchOrder.ASC,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Returns a page of query and the cursor for the next one, None on the
+    last page. sort defaults to id.
+    """
+    sort = sort if sort is not None else id
+    query = seek(query, sort=sort, id=id, order=order, cursor=cursor)
+    if limit:
+        # One extra row tells if there's another page
+        query = query.limit(limit + 1)
+    rows = (await db.execute(query.add_columns(sort.label("sort_key")))).all()
+    if not limit or len(rows) <= limit:
+        return [row[0] for row in rows], None
+    rows = rows[:limit]
+    last, key = rows[-1]
+    return [row[0] for row in rows], encode_cursor(key, last.id)
+
+
+async def seek_page(
+    db: Session,
+    query: Select,
+    *,
+    sort: Any,
+    id: Any,
+    order: Optional[str] = SearchOrder.ASC,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    with_total: Optional[TotalMode] = None,
+) -> Tuple[List[Any], Optional[int], Optional[str]]:
+    """
+    fetch_page along with the total of query if asked for, what the CRUD
+    classes' seek return.
+    """
+    total = await count_rows(db, query, with_total)
+    results, next_cursor = await fetch_page(
+        db, query, sort=sort, id=id, order=order, cursor=cursor, limit=limit
+    )
+    return results, total, next_cursor
+
+
+async def count_rows(
+    db: Session, query: Select, mode: Optional[TotalMode]
+) -> Optional[int]:
+    """
+    Counts the rows of query, or asks the planner how many it expects to
+    find which doesn't have to visit them. None skips counting.
+    """
+    if mode == TotalMode.EXACT:
+        return await db.scalar(select(func.count()).select_from(query.subquery()))
+    if mode == TotalMode.ESTIMATE:
+        plan = await db.scalar(Explain(query))
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return None
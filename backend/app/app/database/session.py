@@ -3,6 +3,11 @@ from sqlalchemy.orm import sessionmaker
 import aioredis
 
 from app.core.config import configs
+from app.database.invoice import DatabaseInvoiceBackend
+from pycloud.cache import tokens
+from pycloud.invoices import invoices
+from pycloud.locations import locations
+from pycloud.ratelimit import limiter
 
 engine = create_async_engine(
     configs.POSTGRES_DSN,
@@ -19,6 +24,31 @@ SessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+# Finalized invoices are kept for good, not just for a worker's lifetime
+invoices.backend = DatabaseInvoiceBackend(SessionLocal)
+
 redis_2fa = aioredis.from_url(
     configs.REDIS_DSN, db=configs.REDIS_2FA_DB, encoding="utf-8", decode_responses=True
 )
+
+# Controllers are created per call, keep their logins around between them
+tokens.redis = aioredis.from_url(
+    configs.REDIS_DSN,
+    db=configs.REDIS_TOKEN_DB,
+    encoding="utf-8",
+    decode_responses=True,
+)
+# and every worker paces its provider requests against the same budget
+limiter.redis = aioredis.from_url(
+    configs.REDIS_DSN,
+    db=configs.REDIS_RATELIMIT_DB,
+    encoding="utf-8",
+    decode_responses=True,
+)
+# Single resource lookups go straight to where inventory scans last saw it
+locations.redis = aioredis.from_url(
+    configs.REDIS_DSN,
+    db=configs.REDIS_LOCATION_DB,
+    encoding="utf-8",
+    decode_responses=True,
+)
@@ -31,7 +31,7 @@ class TemplateOrder(Base):
     # include: bool = Column(Boolean, nullable=False, index=True)
     sort_order: int = Column(Integer, nullable=False)
 
-    account: Account = relationship("Account", lazy="selectin")
+    account: Account = relationship("Account", lazy="raise")
 
     def __repr__(self):
         return f"TemplateOrder(id={self.id!r}, name={self.name!r}, description={self.description!r}, price={self.price!r}, is_active={self.is_active!r})"
@@ -43,7 +43,10 @@ class Template(Base):
     description: str = Column(String, nullable=False)
 
     orders: List[TemplateOrder] = relationship(
-        "TemplateOrder", lazy="selectin", cascade="all, delete-orphan"
+        "TemplateOrder",
+        lazy="selectin",
+        order_by=TemplateOrder.sort_order,
+        cascade="all, delete-orphan",
     )
 
     def __repr__(self):
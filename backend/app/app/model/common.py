@@ -2,6 +2,7 @@ from typing import Optional, TypeVar, List, Generic
 from enum import Enum
 
 from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 
 from pydantic import BaseModel
 from pydantic.generics import GenericModel
@@ -15,18 +16,35 @@ class SearchOrder(str, Enum):
     DESC = "desc"
 
 
+class TotalMode(str, Enum):
+    EXACT = "exact"
+    # The query planner's row estimate, no scan of the results
+    ESTIMATE = "estimate"
+
+
 class SearchQueryBase(BaseModel):
     page: int = 0
     per_page: int = 0
     sort: Optional[str] = None
     order: SearchOrder = SearchOrder.ASC
+    # Pages through the results with the cursor from the last page's next link
+    # instead of by page number, an empty cursor starts at the first page
+    cursor: Optional[str] = None
+    # Page numbers always count the results, cursors only when asked to
+    with_total: Optional[TotalMode] = None
+
+    @property
+    def total_mode(self) -> Optional[TotalMode]:
+        if self.with_total or self.cursor is not None:
+            return self.with_total
+        return TotalMode.EXACT
 
 
 class SearchResponse(GenericModel, Generic[RespType]):
     results: List[RespType]
     page: int
     per_page: int
-    total: int
+    total: Optional[int]
     order: SearchOrder
     next: Optional[str] = None
     prev: Optional[str] = None
@@ -37,17 +55,25 @@ class SearchResponse(GenericModel, Generic[RespType]):
         *,
         pagination: SearchQueryBase,
         results: List[RespType],
-        total: int,
-        request: Request
+        total: Optional[int],
+        request: Request,
+        cursor: Optional[str] = None,
     ) -> "SearchResponse[RespType]":
         ret = cls(**pagination.dict(exclude_unset=False), results=results, total=total)
-        params = pagination.dict(exclude_unset=False)
+        if pagination.cursor is not None:
+            # Only forward, the cursor is where the next page starts
+            if cursor:
+                ret.next = str(request.url.include_query_params(cursor=cursor))
+            return ret
+        # Keep the filters, a cursor=None in the links would turn them into
+        # cursor pages
+        params = jsonable_encoder(pagination, exclude_none=True)
         if total > pagination.per_page * (pagination.page + 1):
             params["page"] = pagination.page + 1
-            ret.next = str(request.url.replace_query_params(**params))
+            ret.next = str(request.url.include_query_params(**params))
         if pagination.page > 0:
             params["page"] = pagination.page - 1
-            ret.prev = str(request.url.replace_query_params(**params))
+            ret.prev = str(request.url.include_query_params(**params))
         return ret
 
 
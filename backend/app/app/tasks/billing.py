@@ -1,11 +1,15 @@
+from typing import List
+
 from sqlalchemy.exc import IntegrityError
-from celery import shared_task, group
+from celery import shared_task
 
 from dateutil.relativedelta import relativedelta
 
 from .utils import run_sync
+from .collector import Collector, Outcome
 from app.database.session import SessionLocal
 from app import database, model
+from app.database.account import Account
 
 from pycloud import CloudFactory
 from pycloud.exc import UnknownError, RateLimit, AuthorizationError
@@ -67,6 +71,41 @@ async def get_billing(self, account_id: int) -> None:
         await db.commit()
 
 
+async def collect_billing(accounts: List[Account]) -> List[Outcome]:
+    """
+    Fetches the current month's billing for the given accounts concurrently
+    and writes the results back in bulk.
+    """
+    outcomes = await Collector().run(
+        accounts, lambda client: client.get_current_invoiced()
+    )
+
+    async with SessionLocal() as db:
+        await database.billing.upsert_many(
+            db,
+            objs_in=[
+                model.CreateBillingPeriod(**o.value.dict(), account_id=o.account.id)
+                for o in outcomes
+                if o.ok
+            ],
+        )
+        await database.account.set_status_many(
+            db,
+            validated=[
+                o.account.id
+                for o in outcomes
+                if o.ok and (not o.account.validated or o.account.last_error)
+            ],
+            errors={o.account.id: str(o.error) for o in outcomes if o.unauthorized},
+        )
+
+    # Transient failures get another go on their own like they used to
+    for o in outcomes:
+        if o.retryable:
+            get_billing.apply_async((o.account.id,), countdown=60)
+    return outcomes
+
+
 @shared_task(name="get_billing_all")
 @run_sync
 async def get_all_billing() -> None:
@@ -76,4 +115,4 @@ async def get_all_billing() -> None:
     async with SessionLocal() as db:
         accounts = await database.account.get_all(db)
 
-        group(get_billing.s(account.id) for account in accounts)()
+    await collect_billing(accounts)
@@ -1,19 +1,25 @@
-from datetime import datetime, tzinfo
-from pytz import UTC
+from typing import List
+from datetime import datetime
+import logging
 
-from sqlalchemy.exc import IntegrityError
-from celery import shared_task, group
+from celery import shared_task
 
 from pycloud.base import CloudBase
 from pycloud.models import IaasType
 
 from .utils import run_sync
+from .collector import Collector, Outcome
 from app.database.session import SessionLocal
 from app import database, model
+from app.core.config import configs
+from app.database.account import Account
+from app.database.metric import retention_cutoff
 
 from pycloud import CloudFactory
 from pycloud.exc import UnknownError, RateLimit, AuthorizationError
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task(name="get_instance_count", bind=True)
 @run_sync
@@ -40,7 +46,7 @@ async def get_instance_count(self, account_id: int) -> None:
             db.commit()
             raise
         except (UnknownError, RateLimit) as e:
-            print(f"{account.name} {account.iaas.name} {e}")
+            logger.warning(f"{account.name} {account.iaas.name}: {e!r}, retrying")
             raise self.retry(exc=e, countdown=60)
 
         await database.metric.create(
@@ -48,6 +54,36 @@ async def get_instance_count(self, account_id: int) -> None:
         )
 
 
+async def collect_instance_counts(
+    accounts: List[Account],
+) -> List[Outcome]:
+    """
+    Counts instances for the given accounts concurrently and stores every
+    count under the same timestamp in one go.
+    """
+    time = datetime.utcnow()
+    outcomes = await Collector().run(
+        accounts, lambda client: client.get_instance_count()
+    )
+
+    async with SessionLocal() as db:
+        await database.metric.create_many(
+            db,
+            metrics=[
+                {"account_id": o.account.id, "time": time, "instances": o.value}
+                for o in outcomes
+                if o.ok
+            ],
+        )
+        await database.metric.rollup(db, start=time, end=time)
+        await database.account.set_status_many(
+            db,
+            validated=[],
+            errors={o.account.id: str(o.error) for o in outcomes if o.unauthorized},
+        )
+    return outcomes
+
+
 @shared_task(name="get_instance_count_all", bind=True)
 @run_sync
 async def get_instance_count_all(self) -> None:
@@ -56,8 +92,25 @@ async def get_instance_count_all(self) -> None:
         if not accounts:
             raise Exception("No accounts found")
 
-        group(
-            get_instance_count.s(account.id)
-            for account in accounts
-            if account.iaas.type != IaasType.SIP
-        )()
+    await collect_instance_counts(
+        [account for account in accounts if account.iaas.type != IaasType.SIP]
+    )
+
+
+@shared_task(name="maintain_metric_partitions")
+@run_sync
+async def maintain_metric_partitions() -> None:
+    """
+    Creates the cloud_metric partitions for the coming months and drops the
+    ones past the retention period.
+    """
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        created = await database.metric.ensure_partitions(
+            db, start=now, months=configs.METRIC_PARTITIONS_AHEAD
+        )
+        dropped = []
+        cutoff = retention_cutoff(now)
+        if cutoff:
+            dropped = await database.metric.drop_partitions(db, before=cutoff)
+    logger.info(f"Metric partitions created: {created}, dropped: {dropped}")
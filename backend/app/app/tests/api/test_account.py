@@ -174,6 +174,58 @@ async def test_filter_accounts(
         assert account["iaas"]["type"] == "PAAS"
 
 
+@pytest.mark.asyncio
+async def test_get_accounts_cursor(
+    client: TestClient,
+    admin_token_headers: Dict[str, str],
+):
+    group = random_username()
+    await client.post(
+        f"{configs.API_V1_STR}/groups",
+        json={"name": group},
+        headers=admin_token_headers,
+    )
+    names = sorted(random_username() for _ in range(5))
+    for name in names:
+        await client.post(
+            f"{configs.API_V1_STR}/accounts",
+            json={
+                "name": name,
+                "iaas": "Heroku",
+                "data": {"api_key": "test"},
+                "group": group,
+            },
+            headers=admin_token_headers,
+        )
+
+    url = f"{configs.API_V1_STR}/accounts"
+    params = {"group": group, "sort": "name", "per_page": 2, "cursor": ""}
+    pages = []
+    while url:
+        r = await client.get(url, params=params, headers=admin_token_headers)
+        assert r.status_code == 200
+        js = r.json()
+        assert js["total"] is None
+        pages.append([account["name"] for account in js["results"]])
+        # The next link carries the filters along
+        url, params = js["next"], None
+    assert pages == [names[:2], names[2:4], names[4:]]
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/accounts",
+        params={"group": group, "cursor": "", "with_total": "exact"},
+        headers=admin_token_headers,
+    )
+    assert r.json()["total"] == 5
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/accounts",
+        params={"cursor": "garbage"},
+        headers=admin_token_headers,
+    )
+    assert r.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_get_id(
     client: TestClient,
@@ -311,7 +363,7 @@ async def test_update_duplicate(
         headers=admin_token_headers,
     )
     assert r.status_code == 409
-    js = r.json()
+    assert name2 in r.json()["detail"]
 
 
 @pytest.mark.asyncio
@@ -1,12 +1,17 @@
+from datetime import datetime
+from io import BytesIO
 from typing import Dict
 
 import pytest
 from httpx import AsyncClient as TestClient
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from dateutil.relativedelta import relativedelta
+from openpyxl import load_workbook
 
 from app.core.config import configs
 from app import database
+from app.core.spreadsheet import sheet_title
+from app.database.group import Group
 from app.model import CreateAccount, CreateBillingPeriod
 from app.tests.utils import random_username
 
@@ -55,3 +60,133 @@ async def test_get_billing(
     assert "id" in js["results"][0]
     assert "account_id" in js["results"][0]
     assert "iaas_id" in js["results"][0]["account"]
+
+
+@pytest.mark.asyncio
+async def test_get_billing_cursor(
+    db: Session,
+    client: TestClient,
+    user_token_headers: Dict[str, str],
+):
+    group = Group(name=random_username())
+    db.add(group)
+    await db.commit()
+    names = sorted(random_username() for _ in range(5))
+    for name in names:
+        acct = await database.account.create(
+            db,
+            obj_in=CreateAccount(
+                name=name,
+                iaas="DigitalOcean",
+                group=group.name,
+                data={"api_key": "test"},
+            ),
+        )
+        await database.billing.create(
+            db,
+            obj_in=CreateBillingPeriod(
+                account_id=acct.id,
+                total=100,
+                balance=50,
+                start_date=datetime(1997, 3, 1),
+                end_date=datetime(1997, 4, 1),
+            ),
+        )
+
+    url = f"{configs.API_V1_STR}/billing"
+    params = {"period": "1997-03", "sort": "account", "per_page": 2, "cursor": ""}
+    pages = []
+    while url:
+        r = await client.get(url, params=params, headers=user_token_headers)
+        assert r.status_code == 200
+        js = r.json()
+        assert js["total"] is None
+        assert js["prev"] is None
+        pages.append([bill["account"]["name"] for bill in js["results"]])
+        url, params = js["next"], None
+    assert pages == [names[:2], names[2:4], names[4:]]
+
+    # Page numbers still work and still count
+    r = await client.get(
+        f"{configs.API_V1_STR}/billing",
+        params={"period": "1997-03", "sort": "account", "per_page": 2, "page": 1},
+        headers=user_token_headers,
+    )
+    js = r.json()
+    assert [bill["account"]["name"] for bill in js["results"]] == names[2:4]
+    assert js["total"] == 5
+
+    r = await client.get(js["next"], headers=user_token_headers)
+    assert [bill["account"]["name"] for bill in r.json()["results"]] == names[4:]
+
+
+@pytest.mark.asyncio
+async def test_export_billing(
+    db: Session,
+    client: TestClient,
+    user_token_headers: Dict[str, str],
+):
+    group = Group(name=random_username())
+    db.add(group)
+    await db.commit()
+    accounts = []
+    for i in range(3):
+        acct = await database.account.create(
+            db,
+            obj_in=CreateAccount(
+                name=random_username(),
+                iaas="DigitalOcean",
+                group=group.name,
+                data={"api_key": "test"},
+            ),
+        )
+        accounts.append(acct)
+        for month in (5, 6):
+            await database.billing.create(
+                db,
+                obj_in=CreateBillingPeriod(
+                    account_id=acct.id,
+                    total=i * month,
+                    balance=0,
+                    start_date=datetime(1997, month, 1),
+                    end_date=datetime(1997, month + 1, 1),
+                ),
+            )
+    forward, backward = random_username(), random_username()
+    for name, order in ((forward, accounts), (backward, accounts[::-1])):
+        await database.template.create(
+            db,
+            obj_in={
+                "name": name,
+                "description": "",
+                "order": [acct.id for acct in order],
+            },
+        )
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/billing/export",
+        params={"period": ["1997-05", "1997-06"], "template": [forward, backward]},
+        headers=user_token_headers,
+    )
+    assert r.status_code == 200
+    wb = load_workbook(BytesIO(r.content))
+    assert wb.sheetnames == [
+        sheet_title(f"{period} {name}")
+        for name in (forward, backward)
+        for period in ("1997-05", "1997-06")
+    ]
+    rows = list(wb.worksheets[1].values)
+    assert rows[0][0] == "Provider"
+    assert rows[1:] == [
+        ("DigitalOcean", acct.name, "1997-06-01", "1997-07-01", i * 6, 0)
+        for i, acct in enumerate(accounts)
+    ]
+    rows = list(wb.worksheets[2].values)
+    assert [row[1] for row in rows[1:]] == [acct.name for acct in accounts[::-1]]
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/billing/export",
+        params={"period": ["1997-05", "1900-01"], "template": forward},
+        headers=user_token_headers,
+    )
+    assert r.status_code == 404
@@ -25,6 +25,33 @@ async def test_iaas_get_all(
         assert i["params"] == iaas[i["name"]].params
 
 
+@pytest.mark.asyncio
+async def test_iaas_get_all_cursor(
+    client: TestClient,
+    admin_token_headers: Dict[str, str],
+) -> None:
+    providers = CloudFactory.get_providers()
+    url = f"{configs.API_V1_STR}/providers"
+    params = {"cursor": "", "per_page": 3, "sort": "name", "order": "desc"}
+    names = []
+    while url:
+        r = await client.get(url, params=params, headers=admin_token_headers)
+        assert r.status_code == 200
+        js = r.json()
+        assert len(js["results"]) <= 3
+        names += [i["name"] for i in js["results"]]
+        url, params = js["next"], None
+    assert names == sorted((p.name for p in providers), reverse=True)
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/providers",
+        params={"cursor": "", "with_total": "estimate"},
+        headers=admin_token_headers,
+    )
+    assert r.status_code == 200
+    assert isinstance(r.json()["total"], int)
+
+
 @pytest.mark.asyncio
 async def test_iaas_get_all_filter(
     client: TestClient,
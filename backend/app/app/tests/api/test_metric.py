@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from typing import Dict
+
+import pytest
+from httpx import AsyncClient as TestClient
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from app import database, model
+from app.core.config import configs
+from app.database.group import Group
+from app.tests.utils import random_username
+
+
+async def create_account(db: Session, iaas: str) -> database.Account:
+    group = Group(name=random_username())
+    db.add(group)
+    await db.commit()
+    return await database.account.create(
+        db,
+        obj_in=model.CreateAccount(
+            name=random_username(),
+            iaas=iaas,
+            group=group.name,
+            data={"api_key": "test"},
+        ),
+    )
+
+
+@pytest.fixture(autouse=True)
+def keep_raw_samples(monkeypatch) -> None:
+    # The samples here are years old, keep them from expiring
+    monkeypatch.setattr(configs, "METRIC_RETENTION_MONTHS", None)
+
+
+@pytest.mark.asyncio
+async def test_get_metrics(
+    client: TestClient,
+    admin_token_headers: Dict[str, str],
+    db: Session,
+) -> None:
+    iaas = await create_account(db, "DigitalOcean")
+    paas = await create_account(db, "Heroku")
+    start = datetime(2010, 1, 1)
+    await database.metric.create_many(
+        db,
+        metrics=[
+            {
+                "account_id": acct.id,
+                "time": start + timedelta(minutes=5 * i),
+                "instances": n,
+            }
+            for i in range(24)
+            for acct, n in ((iaas, 1), (paas, 2))
+        ],
+    )
+    await database.metric.rollup(db, start=start, end=start + timedelta(hours=2))
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/metric/",
+        params={
+            "start": start.isoformat(),
+            "end": (start + timedelta(days=1)).isoformat(),
+            "period": "1H",
+        },
+        headers=admin_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json() == [
+        {
+            "label": "IaaS Instances",
+            "data": [
+                {"type": "IAAS", "x": "2010-01-01T00:00:00", "y": 12},
+                {"type": "IAAS", "x": "2010-01-01T01:00:00", "y": 12},
+            ],
+        },
+        {
+            "label": "PaaS Instances",
+            "data": [
+                {"type": "PAAS", "x": "2010-01-01T00:00:00", "y": 24},
+                {"type": "PAAS", "x": "2010-01-01T01:00:00", "y": 24},
+            ],
+        },
+    ]
+
+    r = await client.get(
+        f"{configs.API_V1_STR}/metric/{iaas.id}",
+        params={"start": start.isoformat()},
+        headers=admin_token_headers,
+    )
+    assert r.status_code == 200
+    js = r.json()
+    assert js["label"] == f"{iaas.name} (DigitalOcean)"
+    assert len(js["data"]) == 24
+    assert all(point["y"] == 1 for point in js["data"])
+
+
+@pytest.mark.asyncio
+async def test_get_metrics_empty(
+    client: TestClient,
+    admin_token_headers: Dict[str, str],
+) -> None:
+    r = await client.get(
+        f"{configs.API_V1_STR}/metric/",
+        params={"start": "1990-01-01T00:00:00", "end": "1990-01-02T00:00:00"},
+        headers=admin_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json() == [
+        {"label": "IaaS Instances", "data": []},
+        {"label": "PaaS Instances", "data": []},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_metrics_invalid_period(
+    client: TestClient,
+    admin_token_headers: Dict[str, str],
+) -> None:
+    r = await client.get(
+        f"{configs.API_V1_STR}/metric/",
+        params={"period": "fortnight"},
+        headers=admin_token_headers,
+    )
+    assert r.status_code == 400
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+import pytest
+from httpx import AsyncClient as TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from app import database, model
+from app.core.config import configs
+from app.database.group import Group
+from app.database.session import engine
+from app.tests.utils import random_username
+
+PERIOD = "1996-01"
+
+
+@contextmanager
+def count_statements() -> Iterator[List[str]]:
+    """
+    Records every SQL statement sent to the database inside the block.
+    """
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+async def add_accounts(db: Session, group: Group, count: int) -> None:
+    for _ in range(count):
+        account = await database.account.create(
+            db,
+            obj_in=model.CreateAccount(
+                name=random_username(),
+                iaas="DigitalOcean",
+                group=group.name,
+                data={"api_key": "test"},
+            ),
+        )
+        await database.billing.create(
+            db,
+            obj_in=model.CreateBillingPeriod(
+                account_id=account.id,
+                total=1,
+                balance=0,
+                start_date=datetime(1996, 1, 1),
+                end_date=datetime(1996, 2, 1),
+            ),
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path,params,expected",
+    [
+        # user, count, page with account and provider joined
+        ("/billing", {"period": PERIOD}, 3),
+        # user, count, page with provider joined
+        ("/accounts", {"group": "{group}"}, 3),
+        # user, count, page, accounts with providers joined
+        ("/groups", {}, 4),
+        # user, provider, accounts with providers joined
+        ("/providers/{iaas}/accounts", {}, 3),
+        # user, account, one query per series
+        ("/metric/", {"start": "1996-01-01T00:00:00"}, 3),
+    ],
+)
+async def test_statements_per_endpoint(
+    client: TestClient,
+    admin_token_headers: Dict[str, str],
+    db: Session,
+    path: str,
+    params: Dict[str, str],
+    expected: int,
+) -> None:
+    group = Group(name=random_username())
+    db.add(group)
+    await db.commit()
+    iaas = await database.iaas.get_by_name(db, name="DigitalOcean")
+    assert iaas
+    fill = {"group": group.name, "iaas": str(iaas.id)}
+    url = configs.API_V1_STR + path.format(**fill)
+    params = {k: v.format(**fill) for k, v in params.items()}
+
+    counts = []
+    for accounts in (1, 10):
+        await add_accounts(db, group, accounts)
+        with count_statements() as statements:
+            r = await client.get(url, params=params, headers=admin_token_headers)
+        assert r.status_code == 200
+        counts.append(len(statements))
+
+    # Nothing is loaded per row, ten times the accounts costs no extra queries
+    assert counts == [expected, expected]
@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from app.database.invoice import DatabaseInvoiceBackend
+from app.database.session import SessionLocal
+from app.tests.utils import random_username
+
+
+@pytest.mark.asyncio
+async def test_finalized_invoices(
+    db: Session,
+) -> None:
+    backend = DatabaseInvoiceBackend(SessionLocal)
+    account = random_username()
+
+    await backend.put("Heroku", account, {"2022-05": {"total": 1}})
+    # Storing it again keeps the first copy rather than failing
+    await backend.put("Heroku", account, {"2022-05": {"total": 2}})
+
+    assert await backend.get("Heroku", account, ["2022-05", "2022-06"]) == {
+        "2022-05": {"total": 1}
+    }
+    assert await backend.get("DigitalOcean", account, ["2022-05"]) == {}
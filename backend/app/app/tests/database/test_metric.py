@@ -1,13 +1,34 @@
 from random import choice
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, List
+import time
 
 import pytest
+import pandas as pd
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import event, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy.exc import IntegrityError
 
 from app import database
-from pycloud.utils import current_month_date_range, range_from_month
+from app.core.config import configs
+from app.database.account import Account
+from app.database.group import Group
+from app.database.session import engine
+from app.database.metric import (
+    CloudMetric,
+    CloudMetricDaily,
+    CloudMetricHourly,
+    month_start,
+)
+from app.model.account import CreateAccount
+from app.tests.utils import random_username
+from pycloud.utils import range_from_month
+
+
+@pytest.fixture(autouse=True)
+def keep_raw_samples(monkeypatch) -> None:
+    # The samples here are years old, only retention tests let them expire
+    monkeypatch.setattr(configs, "METRIC_RETENTION_MONTHS", None)
 
 
 @pytest.mark.asyncio
@@ -23,3 +44,372 @@ async def test_resample(
     metrics = await database.metric.filter(
         db, account=acct, start=start, end=end, period="5min"
     )
+    times = [m["x"] for m in metrics]
+    assert times == sorted(times)
+    assert all(start <= t < end and t.minute % 5 == 0 for t in times)
+
+
+async def sample_accounts(
+    db: Session, iaas: str = "DigitalOcean", count: int = 10
+) -> List[Account]:
+    group = Group(name=random_username())
+    db.add(group)
+    await db.commit()
+    return [
+        await database.account.create(
+            db,
+            obj_in=CreateAccount(
+                name=random_username(),
+                iaas=iaas,
+                group=group.name,
+                data={"api_key": "test"},
+            ),
+        )
+        for _ in range(count)
+    ]
+
+
+def cycle_samples(accounts: List[Account], start: datetime, count: int) -> List[Dict]:
+    return [
+        {
+            "account_id": accounts[i % len(accounts)].id,
+            "time": start + timedelta(minutes=5 * (i // len(accounts))),
+            "instances": i,
+        }
+        for i in range(count)
+    ]
+
+
+async def count_metrics(db: Session, accounts: List[Account]) -> int:
+    return await db.scalar(
+        select(func.count(CloudMetric.id)).where(
+            CloudMetric.account_id.in_([a.id for a in accounts])
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_many(
+    db: Session,
+) -> None:
+    accounts = await sample_accounts(db)
+    samples = cycle_samples(accounts, datetime(2001, 1, 1), 100)
+
+    assert await database.metric.create_many(db, metrics=samples) == 100
+    assert await count_metrics(db, accounts) == 100
+
+    # Re-running the same cycle must not fail or duplicate anything
+    assert await database.metric.create_many(db, metrics=samples) == 0
+    assert await count_metrics(db, accounts) == 100
+    assert await database.metric.create_many(db, metrics=[]) == 0
+
+
+@pytest.mark.asyncio
+async def test_create_many_one_statement(
+    db: Session,
+) -> None:
+    accounts = await sample_accounts(db)
+    samples = cycle_samples(accounts, datetime(2002, 1, 1), 10_000)
+    statements: List[str] = []
+
+    def executed(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", executed)
+    try:
+        assert await database.metric.create_many(db, metrics=samples) == 10_000
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", executed)
+
+    # Past asyncpg's bind parameter limit, still a single INSERT
+    assert [s.split()[0] for s in statements] == ["INSERT"]
+    assert await count_metrics(db, accounts) == 10_000
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_create_many_benchmark(
+    db: Session,
+) -> None:
+    accounts = await sample_accounts(db)
+    samples = 10_000
+
+    one_by_one = cycle_samples(accounts, datetime(2003, 1, 1), samples)
+    start = time.monotonic()
+    for sample in one_by_one:
+        await database.metric.create(db, **sample)
+    single = time.monotonic() - start
+
+    bulk = cycle_samples(accounts, datetime(2003, 6, 1), samples)
+    start = time.monotonic()
+    await database.metric.create_many(db, metrics=bulk)
+    batched = time.monotonic() - start
+
+    assert await count_metrics(db, accounts) == samples * 2
+    assert (
+        batched * 10 < single
+    ), f"{samples} samples: create {single:.2f}s, create_many {batched:.2f}s"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "period,year",
+    # Each period gets its own year, the database is shared between tests
+    [
+        ("5min", 2004),
+        ("15min", 2005),
+        ("1H", 2006),
+        ("D", 2007),
+        ("W", 2008),
+        ("M", 2009),
+    ],
+)
+async def test_filter_matches_pandas(
+    db: Session,
+    period: str,
+    year: int,
+) -> None:
+    accounts = await sample_accounts(db, count=3) + await sample_accounts(
+        db, iaas="Heroku", count=2
+    )
+    start = datetime(year, 1, 1)
+    # Shift the last couple of accounts so not every bucket has every account
+    samples = cycle_samples(accounts, start, 5 * 24 * 12 * 40) + cycle_samples(
+        accounts[-2:], start + timedelta(minutes=2), 500
+    )
+    await database.metric.create_many(db, metrics=samples)
+    end = start + relativedelta(months=2)
+    await database.metric.rollup(db, start=start, end=end)
+    types = {a.id: a.iaas.type.name for a in accounts}
+
+    rows = await database.metric.filter(db, start=start, end=end, period=period)
+
+    # What the endpoint used to do with pandas
+    df = pd.DataFrame(
+        [
+            {"x": s["time"], "y": s["instances"], "type": types[s["account_id"]]}
+            for s in samples
+        ]
+    )
+    expected = (
+        df.groupby(["type", pd.Grouper(key="x", freq=period, label="left")])
+        .sum()
+        .reset_index()
+    )
+    if period in ("W", "M"):
+        # pandas labels calendar buckets by their end, SQL by their start
+        assert [(r["type"], r["y"]) for r in rows] == [
+            (t, y) for t, y in zip(expected["type"], expected["y"]) if y
+        ]
+    else:
+        assert rows == [
+            {"type": t, "x": x.to_pydatetime(), "y": y}
+            for t, x, y in zip(expected["type"], expected["x"], expected["y"])
+        ]
+
+
+@pytest.mark.asyncio
+async def test_filter_invalid_period(
+    db: Session,
+) -> None:
+    for period in ("fortnight", "2M"):
+        with pytest.raises(ValueError):
+            await database.metric.filter(
+                db, start=datetime(2004, 1, 1), end=datetime(2004, 2, 1), period=period
+            )
+
+
+@pytest.mark.asyncio
+async def test_rollup(
+    db: Session,
+) -> None:
+    accounts = await sample_accounts(db, count=2)
+    start = datetime(2011, 1, 1)
+    # Two days of samples, 0..575 for the first account and 1000.. for the second
+    await database.metric.create_many(
+        db,
+        metrics=[
+            {
+                "account_id": acct.id,
+                "time": start + timedelta(minutes=5 * i),
+                "instances": base + i,
+            }
+            for i in range(2 * 288)
+            for acct, base in ((accounts[0], 0), (accounts[1], 1000))
+        ],
+    )
+    await database.metric.rollup(db, start=start, end=start + timedelta(days=2))
+
+    hourly = (
+        (
+            await db.execute(
+                select(CloudMetricHourly)
+                .where(CloudMetricHourly.account_id == accounts[0].id)
+                .order_by(CloudMetricHourly.time)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    assert len(hourly) == 48
+    assert hourly[1].time == start + timedelta(hours=1)
+    assert hourly[1].samples == 12
+    assert hourly[1].total == sum(range(12, 24))
+    assert (hourly[1].min, hourly[1].max, hourly[1].last) == (12, 23, 23)
+    assert hourly[1].avg == 17.5
+
+    daily = (
+        (
+            await db.execute(
+                select(CloudMetricDaily)
+                .where(CloudMetricDaily.account_id == accounts[1].id)
+                .order_by(CloudMetricDaily.time)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    assert [d.time for d in daily] == [start, start + timedelta(days=1)]
+    assert daily[1].samples == 288
+    assert daily[1].total == sum(range(1288, 1576))
+    assert (daily[1].min, daily[1].max, daily[1].last) == (1288, 1575, 1575)
+    assert daily[1].last_time == start + timedelta(days=2, minutes=-5)
+
+    # A new sample only touches its own buckets
+    time = start + timedelta(days=2, minutes=30)
+    await database.metric.create_many(
+        db, metrics=[{"account_id": accounts[1].id, "time": time, "instances": 5}]
+    )
+    await database.metric.rollup(db, start=time, end=time)
+    await db.refresh(daily[1])
+    assert daily[1].total == sum(range(1288, 1576))
+    rows = await database.metric.filter(
+        db,
+        start=start + timedelta(days=2),
+        end=start + timedelta(days=3),
+        period="D",
+        account=accounts[1],
+    )
+    assert rows == [{"type": "IAAS", "x": start + timedelta(days=2), "y": 5}]
+
+
+def test_pick_source(monkeypatch) -> None:
+    day = datetime(2022, 3, 1)
+    pick = database.metric.pick_source
+    assert pick(start=day, end=day + timedelta(days=30), period="D") is CloudMetricDaily
+    assert pick(start=day, end=day + timedelta(days=30), period="M") is CloudMetricDaily
+    assert (
+        pick(start=day, end=day + timedelta(days=1), period="1H") is CloudMetricHourly
+    )
+    assert (
+        pick(start=day + timedelta(hours=3), end=day + timedelta(days=1), period="D")
+        is CloudMetricHourly
+    )
+    assert pick(start=day, end=day + timedelta(days=1), period="5min") is CloudMetric
+    assert pick(start=day, end=day + timedelta(days=1), period="90min") is CloudMetric
+    assert (
+        pick(start=day + timedelta(minutes=5), end=day + timedelta(days=1), period="D")
+        is CloudMetric
+    )
+
+    # Raw samples that old are gone, the rollups answer whatever the bounds
+    monkeypatch.setattr(configs, "METRIC_RETENTION_MONTHS", 3)
+    assert (
+        pick(start=day, end=day + timedelta(days=1), period="5min") is CloudMetricHourly
+    )
+    assert (
+        pick(start=day + timedelta(minutes=5), end=day + timedelta(days=1), period="D")
+        is CloudMetricDaily
+    )
+    recent = month_start(datetime.utcnow()) + timedelta(minutes=5)
+    assert pick(start=recent, end=recent + timedelta(days=1), period="D") is CloudMetric
+
+
+@pytest.mark.asyncio
+async def test_partitions(
+    db: Session,
+) -> None:
+    accounts = await sample_accounts(db, count=2)
+    start = datetime(1995, 1, 1)
+
+    # Every test shares one transaction, streamed queries from earlier tests
+    # keep their portals open until it ends and block partition DDL
+    await db.execute(text("CLOSE ALL"))
+    created = await database.metric.ensure_partitions(db, start=start, months=1)
+    assert created == ["cloud_metric_1995_01", "cloud_metric_1995_02"]
+    assert await database.metric.ensure_partitions(db, start=start, months=1) == []
+
+    # Samples land in their month's partition
+    await database.metric.create_many(
+        db, metrics=cycle_samples(accounts, start, 2 * 288 * 40)
+    )
+    partitions = (
+        await db.execute(
+            text(
+                "SELECT tableoid::regclass::text, count(*) FROM cloud_metric "
+                "WHERE time < '1995-03-01' GROUP BY 1 ORDER BY 1"
+            )
+        )
+    ).all()
+    assert partitions == [
+        ("cloud_metric_1995_01", 2 * 288 * 31),
+        ("cloud_metric_1995_02", 2 * 288 * 9),
+    ]
+
+    # Retention drops whole months but the rollups keep them
+    dropped = await database.metric.drop_partitions(db, before=datetime(1995, 2, 15))
+    assert dropped == ["cloud_metric_1995_01"]
+    assert await count_metrics(db, accounts) == 2 * 288 * 9
+    rows = await database.metric.filter(
+        db, start=start, end=datetime(1995, 2, 1), period="M", account=accounts[0]
+    )
+    assert rows == [{"type": "IAAS", "x": start, "y": sum(range(0, 2 * 288 * 31, 2))}]
+
+
+@pytest.mark.asyncio
+async def test_dropped_month(
+    db: Session,
+    monkeypatch,
+) -> None:
+    accounts = await sample_accounts(db, count=2)
+    start = datetime(2014, 1, 1)
+    await db.execute(text("CLOSE ALL"))
+    await database.metric.ensure_partitions(db, start=start, months=0)
+    await database.metric.create_many(
+        db, metrics=cycle_samples(accounts, start, 2 * 288 * 31)
+    )
+    assert "cloud_metric_2014_01" in await database.metric.drop_partitions(
+        db, before=datetime(2014, 2, 1)
+    )
+
+    # Past the retention cutoff even an unaligned query reads the rollups,
+    # its bounds snapped to whole hours
+    monkeypatch.setattr(configs, "METRIC_RETENTION_MONTHS", 3)
+    rows = await database.metric.filter(
+        db,
+        start=start + timedelta(minutes=7),
+        end=start + timedelta(days=1, minutes=3),
+        period="1H",
+        account=accounts[0],
+    )
+    assert rows == [
+        {
+            "type": "IAAS",
+            "x": start + timedelta(hours=h),
+            "y": sum(range(24 * h, 24 * (h + 1), 2)),
+        }
+        for h in range(25)
+    ]
+
+    # Finer than the rollup, each hour stands in for one sample, its average
+    rows = await database.metric.filter(
+        db,
+        start=start + timedelta(minutes=7),
+        end=start + timedelta(days=1, minutes=3),
+        period="5min",
+        account=accounts[0],
+    )
+    assert rows == [
+        {"type": "IAAS", "x": start + timedelta(hours=h), "y": 24 * h + 11}
+        for h in range(25)
+    ]
@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from app import database, model
+from app.core.config import configs
+from app.database.account import Account
+from app.database.group import Group
+from app.database.metric import CloudMetric
+from app.tasks import billing as billing_tasks
+from app.tasks.billing import collect_billing
+from app.tasks.collector import Collector
+from app.tasks.metrics import collect_instance_counts
+from app.tests.utils import random_username
+from pycloud.utils import current_month_date_range
+
+ACCOUNTS = 20
+
+
+class FakeDigitalOcean:
+    """
+    Pretends to be the DigitalOcean API, keeping track of how many
+    requests it is handling at once.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, request: Request) -> Response:
+        key = request.headers["Authorization"].split(" ")[1]
+        if key == "bad":
+            return Response(401, json={})
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(5 if key == "slow" else 0.05)
+        finally:
+            self.active -= 1
+        i = int(key.split("-")[1])
+        if request.url.path == "/v2/customers/my/balance":
+            return Response(200, json={"month_to_date_usage": i})
+        return Response(200, json={"droplets": [], "meta": {"total": i}})
+
+
+async def create_accounts(db: Session, keys: List[str]) -> List[Account]:
+    group = Group(name=random_username())
+    db.add(group)
+    await db.commit()
+    return [
+        await database.account.create(
+            db,
+            obj_in=model.CreateAccount(
+                name=random_username(),
+                iaas="DigitalOcean",
+                group=group.name,
+                data={"api_key": key},
+            ),
+        )
+        for key in keys
+    ]
+
+
+@pytest.fixture
+def fake_do(monkeypatch) -> FakeDigitalOcean:
+    fake = FakeDigitalOcean()
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(fake))
+    )
+    monkeypatch.setattr(configs, "COLLECT_TIMEOUT", 0.5)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_collect_billing(
+    db: Session,
+    fake_do: FakeDigitalOcean,
+    monkeypatch,
+) -> None:
+    retried = []
+    monkeypatch.setattr(
+        billing_tasks.get_billing,
+        "apply_async",
+        lambda args, countdown: retried.append(args[0]),
+    )
+    good = await create_accounts(db, [f"key-{i}" for i in range(ACCOUNTS)])
+    bad, slow = await create_accounts(db, ["bad", "slow"])
+
+    outcomes = await collect_billing(good + [bad, slow])
+
+    assert sum(o.ok for o in outcomes) == ACCOUNTS
+    period = current_month_date_range()[0].strftime("%Y-%m")
+    for i, acct in enumerate(good):
+        bill = await database.billing.get_account_period(
+            db, account_id=acct.id, period=period
+        )
+        assert bill
+        assert bill.total == i
+        await db.refresh(acct)
+        assert acct.validated
+
+    await db.refresh(bad)
+    assert not bad.validated
+    assert bad.last_error
+    assert retried == [slow.id]
+
+    # Running the cycle again updates the existing records
+    await collect_billing(good[:1])
+    bills = await database.billing.get_billing_period(db, period=period)
+    assert len([b for b in bills if b.account_id == good[0].id]) == 1
+
+
+@pytest.mark.asyncio
+async def test_collect_instance_counts(
+    db: Session,
+    fake_do: FakeDigitalOcean,
+) -> None:
+    accounts = await create_accounts(db, [f"key-{i}" for i in range(ACCOUNTS)])
+    start = datetime.utcnow()
+
+    outcomes = await collect_instance_counts(accounts)
+
+    assert all(o.ok for o in outcomes)
+    assert fake_do.peak <= configs.COLLECT_PROVIDER_CONCURRENCY
+    metrics = (
+        (
+            await db.execute(
+                select(CloudMetric).where(
+                    CloudMetric.account_id.in_([a.id for a in accounts])
+                )
+            )
+        )
+        .scalars()
+        .all()
+    )
+    assert sorted(m.instances for m in metrics) == list(range(ACCOUNTS))
+    # The whole cycle shares one timestamp
+    assert len({m.time for m in metrics}) == 1
+    assert metrics[0].time - start < timedelta(seconds=5)
+
+
+@pytest.mark.asyncio
+async def test_collector_limits(
+    db: Session,
+    fake_do: FakeDigitalOcean,
+) -> None:
+    accounts = await create_accounts(db, [f"key-{i}" for i in range(ACCOUNTS)])
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    outcomes = await Collector(concurrency=4, provider_concurrency=2).run(
+        accounts, lambda client: client.get_instance_count()
+    )
+    elapsed = loop.time() - start
+
+    assert [o.value for o in outcomes] == list(range(ACCOUNTS))
+    assert fake_do.peak == 2
+    # 20 accounts two at a time
+    assert elapsed >= 0.05 * ACCOUNTS / 2
@@ -1,21 +1,90 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ClassVar,
+    List,
+    Dict,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-from pydantic import BaseModel, AnyHttpUrl
-from httpx import AsyncClient, AsyncHTTPTransport
+from pydantic import BaseModel
+from httpx import AsyncClient, AsyncHTTPTransport, Response
 from urllib.parse import urljoin
 
-from .models import IaasType, IaasParam, BillingResponse, VirtualMachine
+from . import exc
+from .cache import Token, token_key, tokens
+from .models import (
+    IaasType,
+    IaasParam,
+    BillingResponse,
+    DailyCost,
+    InstanceBreakdown,
+    VirtualMachine,
+)
+from .executor import DEFAULT_WORKERS, get_executor
+from .invoices import Invoice, invoices
+from .ratelimit import Limit, limiter, rate_key
+from .streaming import iter_array
+
+T = TypeVar("T")
 
 
 session: Optional[AsyncClient] = None
 
 
+class RequestContext(BaseModel):
+    """
+    Per account request state. The httpx session is shared by every provider
+    instance in the process so anything account specific lives here instead.
+    """
+
+    base_url: Optional[str] = None
+    headers: Dict[str, str] = {}
+    auth: Optional[Tuple[str, str]] = None
+    timeout: Optional[float] = None
+
+    def url(self, path: Any) -> str:
+        if self.base_url is None:
+            return str(path)
+        return urljoin(self.base_url, str(path))
+
+    def apply(self, **kwargs: Any) -> Dict[str, Any]:
+        """
+        Merges the context into the keyword arguments of an httpx request.
+        Anything passed explicitly wins over the context.
+        """
+        kwargs["headers"] = {**self.headers, **(kwargs.get("headers") or {})}
+        if self.auth is not None:
+            kwargs.setdefault("auth", self.auth)
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        return kwargs
+
+
 class ProviderBase(BaseModel, ABC):
     _session: AsyncClient
     _id: int
-    _base: AnyHttpUrl
-    _headers: Dict[str, str] = {}
+    _ctx: RequestContext
+    # Token from the shared cache, for providers that log in
+    _token: Optional[Token] = None
+
+    # Threads available to this provider for blocking SDK calls
+    executor_workers: ClassVar[int] = DEFAULT_WORKERS
+    # Requests allowed to each of the provider's hosts, shared by all accounts.
+    # None leaves pacing to whatever the responses say about their limits.
+    rate_limit: ClassVar[Optional[Limit]] = None
+    # Whose buckets those are, providers calling the same API for the same
+    # accounts name one of them. None is the provider's own class name.
+    rate_limit_key: ClassVar[Optional[str]] = None
+    # 429s waited out before giving up with exc.RateLimit
+    rate_limit_retries: ClassVar[int] = 3
+    # Longest Retry-After worth waiting for here rather than failing
+    rate_limit_max_wait: ClassVar[float] = 30.0
 
     class Config:
         underscore_attrs_are_private = True
@@ -34,7 +103,122 @@ class ProviderBase(BaseModel, ABC):
         return "USD"
 
     def url(self, path: str) -> str:
-        return urljoin(self._base, path)
+        return self._ctx.url(path)
+
+    async def request(
+        self, method: str, url: Any, stream: bool = False, **kwargs: Any
+    ) -> Response:
+        """
+        Sends a request on the shared session with this account's context applied.
+        url may be relative to the context's base_url or absolute.
+        With stream the body is left unread, the caller must close the response.
+        """
+        resp = await self._send(method, url, stream, **kwargs)
+        if resp.status_code == 401 and self._token is not None:
+            # Revoked or expired early, log in again and have another go.
+            # Clearing the token first keeps a failing login from looping.
+            await resp.aclose()
+            token, self._token = self._token, None
+            await tokens.invalidate(self.token_key(), token)
+            await self.authenticate()
+            resp = await self._send(method, url, stream, **kwargs)
+        return resp
+
+    async def stream_items(
+        self,
+        method: str,
+        url: Any,
+        check: Callable[[Response], None],
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        """
+        Sends a request whose response is a JSON array and yields its items as
+        they arrive, so a huge listing is never held whole. check raises for a
+        response that isn't the listing, an error's body is read for it.
+        """
+        resp = await self.request(method, url, stream=True, **kwargs)
+        try:
+            if not resp.is_success:
+                await resp.aread()
+            check(resp)
+            async for item in iter_array(resp.aiter_bytes()):
+                yield item
+        finally:
+            await resp.aclose()
+
+    async def _send(
+        self, method: str, url: Any, stream: bool = False, **kwargs: Any
+    ) -> Response:
+        url = self._ctx.url(url)
+        key = rate_key(self.rate_limit_key or type(self).__name__, url)
+        kwargs = self._ctx.apply(**kwargs)
+        # What AsyncClient.request does, split up so the body can be streamed
+        send: Dict[str, Any] = {"stream": stream}
+        if "auth" in kwargs:
+            send["auth"] = kwargs.pop("auth")
+        for _ in range(self.rate_limit_retries + 1):
+            await limiter.acquire(key, self.rate_limit)
+            resp = await self._session.send(
+                self._session.build_request(method, url, **kwargs), **send
+            )
+            delay = await limiter.observe(
+                key, self.rate_limit, resp, self.rate_limit_max_wait
+            )
+            if delay is None:
+                return resp
+            # Read so a streamed response is finished with and its text is there
+            await resp.aread()
+            if delay > self.rate_limit_max_wait:
+                break
+        raise exc.RateLimit(f"{key} is still rate limiting: {resp.text}")
+
+    async def login(self) -> Token:
+        """
+        Logs in and returns the token, for providers that need one.
+        Use authenticate() rather than calling this.
+        """
+        raise NotImplementedError
+
+    def use_token(self, token: Token) -> None:
+        """
+        Applies a token to the request context.
+        """
+        self._ctx.headers["Authorization"] = f"Bearer {token.value}"
+
+    def token_key(self) -> str:
+        return token_key(type(self).__name__, self.dict())
+
+    async def authenticate(self) -> None:
+        """
+        Applies a cached token for this account, logging in if there isn't one.
+        """
+        # login() may go through request(), which must not retry with an old token
+        self._token = None
+        self._token = await tokens.get(self.token_key(), self.login)
+        self.use_token(self._token)
+
+    async def fetch_invoices(
+        self,
+        ids: List[str],
+        fetch: Callable[[str], Awaitable[Invoice]],
+        final: Callable[[Invoice], bool] = lambda invoice: True,
+    ) -> Dict[str, Invoice]:
+        """
+        Returns this account's invoices with ids, fetching only the ones that
+        haven't been stored as finalized. Those final says are done get stored.
+        """
+        return await invoices.fetch(
+            type(self).__name__, self.token_key(), ids, fetch, final
+        )
+
+    async def run_blocking(
+        self, func: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> T:
+        """
+        Runs a blocking call (boto3, ...) on this provider's bounded executor.
+        """
+        executor = get_executor(type(self).__name__, self.executor_workers)
+        return await executor.run(func, *args, **kwargs)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -45,8 +229,8 @@ class ProviderBase(BaseModel, ABC):
                 transport=transport, follow_redirects=True, timeout=30
             )
         self._session = session
-        self._headers.update(
-            {
+        self._ctx = RequestContext(
+            headers={
                 "Content-Type": "application/json",
                 "Accept": "application/json",
             }
@@ -82,12 +266,26 @@ class ProviderBase(BaseModel, ABC):
         """
         pass
 
+    async def get_daily_costs(self) -> List[DailyCost]:
+        """
+        Returns the cost of each day so far this month, for providers that
+        can tell.
+        """
+        raise NotImplementedError()
+
 
 class CloudBase(ProviderBase, ABC):
     @abstractmethod
     async def get_instance_count(self) -> int:
         pass
 
+    async def get_instance_breakdown(self) -> InstanceBreakdown:
+        """
+        Returns the instance count per region and state, for providers that
+        can tell.
+        """
+        raise NotImplementedError()
+
 
 class SIPBase(ProviderBase):
     @staticmethod
@@ -103,17 +301,14 @@ class IaasBase(CloudBase):
     async def create_instance(self) -> VirtualMachine:
         raise NotImplementedError()
 
-    @abstractmethod
     async def get_instance(self, instance_id: str) -> VirtualMachine:
-        pass
+        raise NotImplementedError()
 
-    @abstractmethod
     async def get_instances(self) -> List[VirtualMachine]:
-        pass
+        raise NotImplementedError()
 
-    @abstractmethod
     async def delete_instance(self, instance: VirtualMachine) -> None:
-        pass
+        raise NotImplementedError()
 
 
 class PaasBase(CloudBase):
@@ -0,0 +1,137 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import weakref
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Tokens count as expired this long before they really do, so they're
+# replaced before a request can go out with one that's about to lapse
+REFRESH_MARGIN = 60.0
+# Assumed lifetime when a provider doesn't say how long its tokens last
+DEFAULT_TTL = 300.0
+
+
+class Token(BaseModel):
+    value: str
+    # Unix timestamp
+    expires_at: float
+    # Whatever else the provider needs from its login, service catalogs etc.
+    data: Dict[str, Any] = {}
+
+    @classmethod
+    def expiring(
+        cls, value: str, expires_in: Optional[float] = None, **data: Any
+    ) -> "Token":
+        return cls(
+            value=value,
+            expires_at=time.time() + float(expires_in or DEFAULT_TTL),
+            data=data,
+        )
+
+    def fresh(self) -> bool:
+        return self.expires_at - REFRESH_MARGIN > time.time()
+
+
+def token_key(provider: str, *credentials: Any) -> str:
+    """
+    Cache key for a set of credentials, hashed so secrets don't end up in keys.
+    """
+    raw = json.dumps([provider, *credentials], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Auth tokens shared by every provider instance in the process, and with
+    redis set, between processes too.
+
+    Providers are created per account per call, so without this every
+    collection logs in again. Logins for the same key are single flight, a
+    burst of calls for one account waits on one login instead of each doing
+    their own.
+
+    redis is anything with an aioredis style async get/set/delete. It's only
+    a cache, errors talking to it are logged and otherwise ignored.
+    """
+
+    def __init__(self, redis: Any = None, prefix: str = "pycloud:token:"):
+        self.redis = redis
+        self.prefix = prefix
+        self._tokens: Dict[str, Token] = {}
+        # A key's lock goes away once nobody holds or waits on it
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def get(self, key: str, login: Callable[[], Awaitable[Token]]) -> Token:
+        """
+        Returns a fresh token for key, calling login when there isn't one.
+        """
+        token = self._tokens.get(key)
+        if token is not None and token.fresh():
+            return token
+        async with self._lock(key):
+            # Someone else may have logged in while we waited
+            token = self._tokens.get(key)
+            if token is not None and token.fresh():
+                return token
+            token = await self._load(key)
+            if token is None or not token.fresh():
+                token = await login()
+                await self._store(key, token)
+            self._tokens[key] = token
+            return token
+
+    async def invalidate(self, key: str, token: Token) -> None:
+        """
+        Drops a token the provider rejected. Does nothing when it has already
+        been replaced, so a burst of 401s only leads to one login.
+        """
+        async with self._lock(key):
+            current = self._tokens.get(key)
+            if current is None or current.value != token.value:
+                return
+            del self._tokens[key]
+            stored = await self._load(key)
+            if stored is not None and stored.value == token.value:
+                await self._call("delete", self.prefix + key)
+
+    def clear(self) -> None:
+        """
+        Forgets the in process tokens, redis is left alone.
+        """
+        self._tokens.clear()
+        self._locks.clear()
+
+    async def _load(self, key: str) -> Optional[Token]:
+        raw = await self._call("get", self.prefix + key)
+        return Token.parse_raw(raw) if raw else None
+
+    async def _store(self, key: str, token: Token) -> None:
+        ttl = int(token.expires_at - REFRESH_MARGIN - time.time())
+        if ttl > 0:
+            await self._call("set", self.prefix + key, token.json(), ex=ttl)
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self.redis is None:
+            return None
+        try:
+            return await getattr(self.redis, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Token cache {method} failed: {e!r}")
+            return None
+
+
+tokens = TokenCache()
@@ -1,25 +1,134 @@
-from datetime import date, datetime
-from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 import itertools
-from itertools import chain
+import threading
+import time
 
 import asyncio
-from asgiref.sync import sync_to_async
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 if TYPE_CHECKING:
-    from mypy_boto3_ec2.service_resource import Instance, ServiceResourceInstancesCollection
+    from mypy_boto3_ec2.service_resource import Instance
 
 from pycloud.base import IaasBase
-from pycloud.models import BillingResponse, IaasParam, VirtualMachine
+from pycloud.locations import locations
+from pycloud.models import BillingResponse, IaasParam, InstanceBreakdown, VirtualMachine
 from pycloud.utils import current_month_date_range, as_async
 from pycloud import exc
 
+# Clients kept between polls, a few services in each of ~17 regions per account
+CLIENT_CACHE_SIZE = 512
+# Threads that may use one client at once, as many as Amazon's executor has
+MAX_POOL_CONNECTIONS = 20
+# Regions are enabled or disabled by hand, rarely, no need to ask every poll
+REGION_TTL = 3600.0
+# Largest page describe_instances will return
+INSTANCE_PAGE_SIZE = 1000
+
+
+class ClientCache:
+    """
+    boto3 clients keyed by credentials, service and region, the least recently
+    used dropped once there are more than size of them. Making a client costs
+    tens of milliseconds of CPU, far more than most of the calls made with it.
+
+    Clients are thread safe but sessions and resources aren't. Clients are all
+    made from one session under a lock, which also shares its loaded endpoint
+    and service data, and resources are built fresh on a cached client.
+    """
+
+    def __init__(
+        self,
+        size: int = CLIENT_CACHE_SIZE,
+        max_pool_connections: int = MAX_POOL_CONNECTIONS,
+    ):
+        self.size = size
+        self._config = Config(
+            max_pool_connections=max_pool_connections, tcp_keepalive=True
+        )
+        self._session: Optional[boto3.session.Session] = None
+        self._clients: "OrderedDict[Tuple[str, str, str, Optional[str]], Any]" = (
+            OrderedDict()
+        )
+        # Resource classes per service, they don't depend on the credentials
+        self._resources: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def client(
+        self,
+        access_key: str,
+        secret_key: str,
+        service: str,
+        region: Optional[str] = None,
+    ) -> Any:
+        key = (access_key, secret_key, service, region)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+            if self._session is None:
+                self._session = boto3.session.Session()
+            client = self._session.client(
+                service,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region,
+                config=self._config,
+            )
+            self._clients[key] = client
+            if len(self._clients) > self.size:
+                self._clients.popitem(last=False)
+            return client
+
+    def resource(
+        self,
+        access_key: str,
+        secret_key: str,
+        service: str,
+        region: Optional[str] = None,
+    ) -> Any:
+        client = self.client(access_key, secret_key, service, region)
+        with self._lock:
+            if service not in self._resources:
+                resource = self._session.resource(  # type: ignore
+                    service,
+                    aws_access_key_id=access_key,
+                    aws_secret_access_key=secret_key,
+                    region_name=region,
+                )
+                self._resources[service] = type(resource)
+            return self._resources[service](client=client)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+
+clients = ClientCache()
+# Enabled regions per access key and when to ask again
+regions: Dict[str, Tuple[float, List[str]]] = {}
+
+
 class Amazon(IaasBase):
     access_key: str
     secret_key: str
 
+    # Enough to scan every region at once
+    executor_workers: ClassVar[int] = 20
+
     @staticmethod
     def params() -> List[IaasParam]:
         return [
@@ -27,6 +136,12 @@ class Amazon(IaasBase):
             IaasParam(key="secret_key", label="Secret Key", type="secret"),
         ]
 
+    def client(self, service: str, region: Optional[str] = None) -> Any:
+        return clients.client(self.access_key, self.secret_key, service, region)
+
+    def resource(self, service: str, region: Optional[str] = None) -> Any:
+        return clients.resource(self.access_key, self.secret_key, service, region)
+
     @staticmethod
     def map_instance(instance: "Instance") -> VirtualMachine:
         return VirtualMachine(
@@ -44,11 +159,7 @@ class Amazon(IaasBase):
     @as_async
     def validate_account(self) -> None:
         try:
-            boto3.client(
-                "sts",
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-            ).get_caller_identity()
+            self.client("sts").get_caller_identity()
         except Exception as e:
             raise exc.AuthorizationError("Failed to validate account: {}".format(e))
 
@@ -58,13 +169,7 @@ class Amazon(IaasBase):
         """
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ce.html#CostExplorer.Client.get_cost_and_usage
         try:
-            client = boto3.client(
-                "ce",
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-            )
-            # TODO: Wrap in async call
-            resp = client.get_cost_and_usage(
+            resp = self.client("ce").get_cost_and_usage(
                 TimePeriod={
                     "Start": start.strftime("%Y-%m-%d"),
                     "End": end.strftime("%Y-%m-%d"),
@@ -85,7 +190,7 @@ class Amazon(IaasBase):
 
     async def get_current_invoiced(self) -> BillingResponse:
         start, end = current_month_date_range()
-        return await sync_to_async(self._get_billing)(start, end)
+        return await self.run_blocking(self._get_billing, start, end)
 
     async def get_current_usage(self) -> BillingResponse:
         return await self.get_current_invoiced()
@@ -94,35 +199,62 @@ class Amazon(IaasBase):
         pass
 
     async def get_instance_count(self) -> int:
-        return len(await self.get_instances())
+        return (await self.get_instance_breakdown()).total
 
-    @as_async
-    def get_regions(self) -> List[str]:
-        rclient = boto3.client(
-            "ec2",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            region_name="us-east-1",
+    async def get_instance_breakdown(self) -> InstanceBreakdown:
+        regions = await self.get_regions()
+        scans = await asyncio.gather(
+            *[self._count_in_region(region) for region in regions]
+        )
+        # The poll sees every instance anyway, note where they are for later
+        await locations.put(
+            self.token_key(),
+            {id: region for region, (_, ids) in zip(regions, scans) for id in ids},
+        )
+        return InstanceBreakdown(
+            regions={region: counts for region, (counts, _) in zip(regions, scans)}
         )
-        region_resp = rclient.describe_regions()
+
+    @as_async
+    def _count_in_region(self, region: str) -> Tuple[Dict[str, int], List[str]]:
+        """
+        Instances per state in region, and their ids. Only those are kept,
+        nothing is built for the instances.
+        """
+        paginator = self.client("ec2", region).get_paginator("describe_instances")
+        pages = paginator.paginate(PaginationConfig={"PageSize": INSTANCE_PAGE_SIZE})
+        counts: Dict[str, int] = {}
+        ids: List[str] = []
+        for id, state in pages.search(
+            "Reservations[].Instances[].[InstanceId, State.Name]"
+        ):
+            counts[state] = counts.get(state, 0) + 1
+            ids.append(id)
+        return counts, ids
+
+    async def get_regions(self) -> List[str]:
+        cached = regions.get(self.access_key)
+        if cached is None or cached[0] <= time.monotonic():
+            cached = (time.monotonic() + REGION_TTL, await self._describe_regions())
+            regions[self.access_key] = cached
+        return cached[1]
+
+    @as_async
+    def _describe_regions(self) -> List[str]:
+        region_resp = self.client("ec2", "us-east-1").describe_regions()
         return [region["RegionName"] for region in region_resp["Regions"]]
 
     @as_async
-    def _get_instances_in_region(self, region: str, instance_ids: Optional[List[str]] = None) -> "ServiceResourceInstancesCollection":
-        client = boto3.resource(
-            "ec2",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            region_name=region,
-        )
-        instances = client.instances
+    def _get_instances_in_region(self, region: str, instance_ids: Optional[List[str]] = None) -> List["Instance"]:
+        instances = self.resource("ec2", region).instances
         if instance_ids:
             instances = instances.filter(Filters=[{'Name': 'instance-id', 'Values': instance_ids}])
-        return instances.all()
+        # Collections are lazy, iterate here so the API calls happen on the executor
+        return list(instances.all())
 
     async def _get_instances(self, instance_ids: Optional[List[str]] = None) -> List["Instance"]:
         regions = await self.get_regions()
-        instanceList: List["ServiceResourceInstancesCollection"] = (
+        instanceList: List[List["Instance"]] = (
             await asyncio.gather(
                 *[
                     self._get_instances_in_region(region, instance_ids)
@@ -130,28 +262,45 @@ class Amazon(IaasBase):
                 ]
             )
         )
+        await locations.put(
+            self.token_key(),
+            {
+                instance.id: region
+                for region, instances in zip(regions, instanceList)
+                for instance in instances
+            },
+        )
         return list(itertools.chain.from_iterable(instanceList))
 
+    async def _find_instance(self, instance_id: str) -> Optional["Instance"]:
+        """
+        Looks in the region the instance was last seen in, every region only
+        when it's never been seen or has moved on.
+        """
+        region = await locations.get(self.token_key(), instance_id)
+        if region is not None:
+            instances = await self._get_instances_in_region(region, [instance_id])
+            if instances:
+                return instances[0]
+            await locations.forget(self.token_key(), instance_id)
+        instances = await self._get_instances(instance_ids=[instance_id])
+        return instances[0] if instances else None
+
     async def get_instances(self) -> List[VirtualMachine]:
         return self.map_instances(await self._get_instances())
 
     async def get_instance(self, instance_id: str) -> Optional[VirtualMachine]:
-        instances = await self._get_instances(instance_ids=[instance_id])
-        return self.map_instance(instances[0]) if instances else None
+        instance = await self._find_instance(instance_id)
+        return self.map_instance(instance) if instance else None
 
     async def delete_instance(self, instance: VirtualMachine) -> None:
-        instances = await self._get_instances(instance_ids=[instance.id])
-        if instances:
-            await sync_to_async(instances[0].terminate)()
+        found = await self._find_instance(instance.id)
+        if found:
+            await self.run_blocking(found.terminate)
 
     @as_async
     def list_buckets(self) -> List[str]:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-        )
-        resp = s3.list_buckets()
+        resp = self.client("s3").list_buckets()
         return [bucket["Name"] for bucket in resp["Buckets"]]
 
     @as_async
@@ -161,12 +310,7 @@ class Amazon(IaasBase):
         """
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3.html#S3.Client.get_bucket_policy
         try:
-            client = boto3.client(
-                "s3",
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-            )
-            resp = client.get_bucket_policy(Bucket=bucket)
+            resp = self.client("s3").get_bucket_policy(Bucket=bucket)
             return resp["Policy"]["Statement"][0]["Condition"]["NotIpAddress"]["aws:SourceIp"]
         except ClientError as e:
             raise exc.AuthorizationError("Failed to get bucket policy: {}".format(e))
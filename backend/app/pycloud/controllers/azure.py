@@ -1,14 +1,59 @@
-from typing import List
+from typing import Any, ClassVar, Dict, List
+from datetime import datetime
+
+from httpx import Response
+import pytz
 
 from pycloud.base import IaasBase
-from pycloud.models import BillingResponse, IaasParam
+from pycloud.cache import Token
+from pycloud.models import BillingResponse, DailyCost, IaasParam, InstanceBreakdown
+from pycloud.paginator import LinkPaginator
+from pycloud.ratelimit import Limit
+from pycloud.utils import current_month_date_range
+from pycloud.decoding import decode
 from pycloud import exc
 
 
 auth_endpoint = "https://login.microsoftonline.com/{tenant_id}/oauth2/token"
 usage_endpoint = "https://management.azure.com/subscriptions/{subscriptionId}/providers/Microsoft.Consumption/usageDetails"
 period_endpoint = "https://management.azure.com/subscriptions/{subscriptionId}/providers/Microsoft.Billing/billingPeriods?api-version=2017-04-24-preview"
-vm_endpoint = "https://management.azure.com/subscriptions/{subscriptionId}/providers/Microsoft.Compute/virtualMachines"
+cost_endpoint = "https://management.azure.com/subscriptions/{subscriptionId}/providers/Microsoft.CostManagement/query"
+graph_endpoint = (
+    "https://management.azure.com/providers/Microsoft.ResourceGraph/resources"
+)
+
+# What counts as an instance, by resource type, and what it's reported as.
+# Scale set instances are only in the ComputeResources table, the rest are in
+# Resources.
+instance_kinds = {
+    "microsoft.compute/virtualmachines": "vm",
+    "microsoft.compute/virtualmachinescalesets/virtualmachines": "vmss",
+    "microsoft.web/sites": "app_service",
+    "microsoft.app/containerapps": "container_app",
+}
+# Only these are the account's instances, the same virtual machines it always
+# counted. App Service and Container Apps are PaaS and only in the breakdown.
+vm_kinds = ("vm", "vmss")
+
+# Counts them all for a subscription in one go, one row per type and region
+instance_query = """
+Resources
+| where type in~ ('microsoft.compute/virtualmachines', 'microsoft.web/sites', 'microsoft.app/containerapps')
+| union (ComputeResources | where type =~ 'microsoft.compute/virtualmachinescalesets/virtualmachines')
+| summarize count() by type = tolower(type), location
+"""
+
+
+def check_usage(r: Response) -> None:
+    if r.status_code != 200:
+        raise exc.UnknownError(f"failed to get usage:\n{r.text}")
+
+
+def check_query(r: Response) -> None:
+    if r.status_code in (401, 403):
+        raise exc.AuthorizationError(f"{r.url.path} unauthorized:\n{r.text}")
+    if r.status_code != 200:
+        raise exc.UnknownError(f"{r.url.path} query failed:\n{r.text}")
 
 
 class Azure(IaasBase):
@@ -17,6 +62,17 @@ class Azure(IaasBase):
     client_id: str
     client_secret: str
 
+    # Resource Manager throttles reads per subscription and says so with 429s,
+    # this just keeps a big collection from piling onto it all at once
+    rate_limit: ClassVar[Limit] = Limit(rate=20, burst=40)
+    # What Cost Management sums. In US dollars like the accounts are, whatever
+    # the subscription is billed in, PreTaxCost would be in its own currency.
+    cost_metric: ClassVar[str] = "PreTaxCostUSD"
+    # Download and add up every usageDetails record instead of asking Cost
+    # Management for the sum. Far slower on a big subscription, only for
+    # offers the query API doesn't cover.
+    itemized_usage: ClassVar[bool] = False
+
     @staticmethod
     def params() -> List[IaasParam]:
         return [
@@ -28,9 +84,9 @@ class Azure(IaasBase):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._base = "https://management.azure.com/"
+        self._ctx.base_url = "https://management.azure.com/"
 
-    async def authenticate(self) -> None:
+    async def login(self) -> Token:
         # Build payload for authentication
         data = {
             "grant_type": "client_credentials",
@@ -43,18 +99,84 @@ class Azure(IaasBase):
         x = await self._session.post(
             auth_endpoint.format(tenant_id=self.tenant_id), data=data
         )
-        js = x.json()
+        js = decode(x)
         if x.status_code != 200:
             raise exc.AuthorizationError(f"authentication failed:\n{x.text}")
-        token = js["access_token"]
-        self._headers.update({"Authorization": f"Bearer {token}"})
+        return Token.expiring(js["access_token"], js.get("expires_in"))
 
     async def validate_account(self) -> None:
         await self.authenticate()
 
     async def get_current_invoiced(self) -> BillingResponse:
+        if self.itemized_usage:
+            return await self._sum_usage_details()
+
+        start, end = current_month_date_range()
+        await self.authenticate()
+        rows = await self._cost_query("None")
+
+        return BillingResponse(
+            start_date=start,
+            end_date=end,
+            total=sum(self._cost(row) for row in rows),
+            balance=None,
+        )
+
+    async def get_daily_costs(self) -> List[DailyCost]:
+        await self.authenticate()
+        rows = await self._cost_query("Daily")
+
+        # UsageDate comes back as a number, 20220131
+        return sorted(
+            (
+                DailyCost(
+                    date=datetime.strptime(str(row["UsageDate"]), "%Y%m%d").replace(
+                        tzinfo=pytz.UTC
+                    ),
+                    total=self._cost(row),
+                )
+                for row in rows
+            ),
+            key=lambda day: day.date,
+        )
+
+    async def _cost_query(self, granularity: str) -> List[Dict[str, Any]]:
+        """
+        Has Cost Management sum this month's cost so far, as one row or one a
+        day, see
+        https://learn.microsoft.com/en-us/rest/api/cost-management/query/usage
+        Rows come back keyed by column name.
+        """
+        body = {
+            "type": "ActualCost",
+            "timeframe": "MonthToDate",
+            "dataset": {
+                "granularity": granularity,
+                "aggregation": {
+                    "totalCost": {"name": self.cost_metric, "function": "Sum"}
+                },
+            },
+        }
+        url = cost_endpoint.format(subscriptionId=self.subscription_id)
+        params = {"api-version": "2021-10-01"}
+        rows: List[Dict[str, Any]] = []
+        while url:
+            r = await self.request("POST", url, params=params, json=body)
+            check_query(r)
+            properties = decode(r)["properties"]
+            columns = [column["name"] for column in properties["columns"]]
+            rows.extend(dict(zip(columns, row)) for row in properties["rows"])
+            # The link carries the query along
+            url, params = properties.get("nextLink"), None
+        return rows
+
+    def _cost(self, row: Dict[str, Any]) -> float:
+        # Named after the metric or the aggregation depending on the API version
+        return row.get(self.cost_metric, row.get("totalCost", 0))
+
+    async def _sum_usage_details(self) -> BillingResponse:
         await self.authenticate()
-        # Parameters for the initial request
+        # Parameters for the initial request, the nextLinks carry them along
         params = {
             # Microsoft, thats all I have to say
             "api-version": "2021-10-01",
@@ -62,43 +184,23 @@ class Azure(IaasBase):
             "$expand": "properties/meterDetails",
         }
 
-        # This is the initial request, you could just manually append the parameters
-        # to the URL but this is easier to change
-        # We're just building the URL and makes looping later cleaner
-        p = self._session.build_request(
-            "GET",
-            usage_endpoint.format(subscriptionId=self.subscription_id),
-            params=params,
-        )
-        next_url = p.url
-
         startDate = None
         endDate = None
 
         total = 0
-        # We loop here to handle pagination
-        while next_url is not None:
-            # We already appended the parameters above
-            x = await self._session.get(next_url, headers=self._headers)
-            js = x.json()
-            if x.status_code != 200:
-                raise exc.UnknownError(f"failed to get usage:\n{x.text}")
-
-            # Loop through the returned itemized JSON and total
-            [total := total + i["properties"]["paygCostInUSD"] for i in js["value"]]
+        async for i in LinkPaginator(
+            self.request,
+            usage_endpoint.format(subscriptionId=self.subscription_id),
+            params=params,
+            items=lambda js: js["value"],
+            check=check_usage,
+        ):
+            total += i["properties"]["paygCostInUSD"]
 
             # If we haven't grabbed the billing start and end dates do so now
-            if startDate is None and js["value"]:
-                startDate = js["value"][0]["properties"]["servicePeriodStartDate"]
-                endDate = js["value"][0]["properties"]["servicePeriodEndDate"]
-
-            # Check if there is another page
-            if "nextLink" in js.keys():
-                # Yep, make this the request
-                next_url = js["nextLink"]
-            else:
-                # Nope break the loop
-                break
+            if startDate is None:
+                startDate = i["properties"]["servicePeriodStartDate"]
+                endDate = i["properties"]["servicePeriodEndDate"]
 
         return BillingResponse(
             start_date=startDate,
@@ -113,31 +215,45 @@ class Azure(IaasBase):
         pass
 
     async def get_instance_count(self) -> int:
+        states = (await self.get_instance_breakdown()).states()
+        return sum(states.get(kind, 0) for kind in vm_kinds)
+
+    async def get_instance_breakdown(self) -> InstanceBreakdown:
+        """
+        Instances per kind in each region, IaaS and PaaS alike, from a single
+        Resource Graph query rather than paging through every resource.
+        """
         await self.authenticate()
 
-        # Only probe status, should be faster
-        params = {
-            "api-version": "2021-11-01",
-            "statusOnly": "true",
-        }
+        regions: Dict[str, Dict[str, int]] = {}
+        for row in await self._query(instance_query):
+            kind = instance_kinds.get(row["type"], row["type"])
+            counts = regions.setdefault(row["location"], {})
+            counts[kind] = counts.get(kind, 0) + row["count_"]
+        return InstanceBreakdown(regions=regions)
 
-        p = self._session.build_request(
-            "GET",
-            vm_endpoint.format(subscriptionId=self.subscription_id),
-            params=params,
-        )
-        next_url = p.url
-
-        count = 0
-        # We loop here to handle pagination
-        while next_url is not None:
-            x = await self._session.get(next_url, headers=self._headers)
-            js = x.json()
-            if x.status_code != 200:
-                raise exc.UnknownError(f"failed to get usage:\n{x.text}")
-            count += len(js["value"])
-            if "nextLink" in js.keys():
-                next_url = js["nextLink"]
-            else:
-                break
-        return count
+    async def _query(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Runs a Resource Graph query over the subscription, see
+        https://learn.microsoft.com/en-us/rest/api/azureresourcegraph/resourcegraph/resources/resources
+        """
+        body: Dict[str, Any] = {
+            "subscriptions": [self.subscription_id],
+            "query": query,
+            "options": {"resultFormat": "objectArray"},
+        }
+        rows: List[Dict[str, Any]] = []
+        while True:
+            r = await self.request(
+                "POST",
+                graph_endpoint,
+                params={"api-version": "2021-03-01"},
+                json=body,
+            )
+            check_query(r)
+            js = decode(r)
+            rows.extend(js["data"])
+            # Only big results are split, a summary rarely is
+            if not js.get("$skipToken"):
+                return rows
+            body["options"]["$skipToken"] = js["$skipToken"]
@@ -1,10 +1,29 @@
 from typing import List, Literal, Tuple, Union, Dict
 
+from httpx import Response
+
 from pycloud.base import IaasBase
 from pycloud.models import BillingResponse, IaasParam
+from pycloud.paginator import OffsetPaginator
+from pycloud.decoding import decode
 from pycloud import exc
 from pycloud.utils import current_month_date_range
 
+# Ledger entries per page, the first page's size wins if the API caps it lower
+LEDGER_PAGE_SIZE = 500
+
+
+def check_billing(r: Response) -> None:
+    if r.status_code != 200:
+        if r.status_code == 401:
+            raise exc.AuthorizationError(
+                "Invalid username or password. Please check your CloudSigma credentials."
+            )
+        else:
+            raise exc.UnknownError(
+                "Failed to get CloudSigma billing: {}".format(r.text)
+            )
+
 
 class CloudSigma(IaasBase):
     username: str
@@ -61,11 +80,11 @@ class CloudSigma(IaasBase):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._base = f"https://{self.endpoint}.cloudsigma.com/"
-        self._auth = (self.username, self.password)
+        self._ctx.base_url = f"https://{self.endpoint}.cloudsigma.com/"
+        self._ctx.auth = (self.username, self.password)
 
     async def validate_account(self) -> None:
-        r = await self._session.get(self.url("/api/2.0/profile"), auth=self._auth)
+        r = await self.request("GET", "/api/2.0/profile")
         if r.status_code != 200:
             if r.status_code == 401:
                 raise exc.AuthorizationError(
@@ -79,68 +98,32 @@ class CloudSigma(IaasBase):
     async def get_current_invoiced(self) -> BillingResponse:
         start, end = current_month_date_range()
         # First retrieve our account balance
-        x = await self._session.get(self.url("/api/2.0/balance"), auth=self._auth)
-        if x.status_code != 200:
-            if x.status_code == 401:
-                raise exc.AuthorizationError(
-                    "Invalid username or password. Please check your CloudSigma credentials."
-                )
-            else:
-                raise exc.UnknownError(
-                    "Failed to get CloudSigma billing: {}".format(x.text)
-                )
-        js = x.json()
+        x = await self.request("GET", "/api/2.0/balance")
+        check_billing(x)
+        js = decode(x)
         balance = round(float(js["balance"]), 2)
 
         # Query parameters, filter by what we want
-        # our first request we want nothing returned, we simply want the total count that our query returns
         params: Dict[str, Union[str, int]] = {
             "time__gt": start.strftime("%Y-%m-%d"),
             "time__lt": end.strftime("%Y-%m-%d"),
-            "limit": 0,
         }
 
-        # Do the thing
-        x = await self._session.get(
-            self.url("/api/2.0/ledger"), auth=self._auth, params=params
-        )
-        if x.status_code != 200:
-            if x.status_code == 401:
-                raise exc.AuthorizationError(
-                    "Invalid username or password. Please check your CloudSigma credentials."
-                )
-            else:
-                raise exc.UnknownError(
-                    "Failed to get CloudSigma billing: {}".format(x.text)
-                )
-        js = x.json()
-
-        # Set the limit for our next request, grab everything
-        params["limit"] = js["meta"]["total_count"]
-
-        # Do the thing
-        x = await self._session.get(
-            self.url("/api/2.0/ledger"), auth=self._auth, params=params
-        )
-        if x.status_code != 200:
-            if x.status_code == 401:
-                raise exc.AuthorizationError(
-                    "Invalid username or password. Please check your CloudSigma credentials."
-                )
-            else:
-                raise exc.UnknownError(
-                    "Failed to get CloudSigma billing: {}".format(x.text)
-                )
-        js = x.json()
-
-        # Loop through the returned itemized JSON and total
+        # Page through the itemized ledger and total, the first page says how
+        # many there are so the rest come several at a time
         total = float(0)
-        # We only care about > 0 amounts for this since negative are us adding to the balance
-        # List comprehension is great
-        [
-            total := total + (float(i["amount"]) if float(i["amount"]) > 0 else 0)
-            for i in js["objects"]
-        ]
+        async for i in OffsetPaginator(
+            self.request,
+            "/api/2.0/ledger",
+            params=params,
+            items=lambda js: js["objects"],
+            check=check_billing,
+            total=lambda r, js: js["meta"]["total_count"],
+            page_size=LEDGER_PAGE_SIZE,
+        ):
+            # We only care about > 0 amounts for this since negative are us adding to the balance
+            if float(i["amount"]) > 0:
+                total += float(i["amount"])
 
         return BillingResponse(
             total=total,
@@ -156,7 +139,7 @@ class CloudSigma(IaasBase):
         pass
 
     async def get_instance_count(self) -> int:
-        r = await self._session.get(self.url("/api/2.0/servers"), auth=self._auth)
+        r = await self.request("GET", "/api/2.0/servers")
         if r.status_code != 200:
             if r.status_code == 401:
                 raise exc.AuthorizationError(
@@ -166,5 +149,5 @@ class CloudSigma(IaasBase):
                 raise exc.UnknownError(
                     "Failed to get CloudSigma server count: {}".format(r.text)
                 )
-        js = r.json()
+        js = decode(r)
         return js["meta"]["total_count"]
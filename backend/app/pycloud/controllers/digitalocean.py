@@ -1,13 +1,20 @@
-from typing import List
+from typing import Any, Dict, List
+
+from httpx import Response
 
 from pycloud.base import IaasBase
 from pycloud.models import IaasParam, BillingResponse, VirtualMachine
+from pycloud.paginator import OffsetPaginator, page_number
 from pycloud.utils import current_month_date_range
+from pycloud.decoding import decode
 from pycloud import exc
 
+# Most droplets /v2/droplets will return a page
+DROPLET_PAGE_SIZE = 200
+
 
 def public_ip(networks):
-    for n in networks:
+    for n in networks.get("v4", []):
         if n["type"] == "public":
             return n["ip_address"]
 
@@ -23,11 +30,11 @@ class DigitalOcean(IaasBase):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._headers.update({"Authorization": f"Bearer {self.api_key}"})
-        self._base = "https://api.digitalocean.com/"  # type: ignore
+        self._ctx.headers.update({"Authorization": f"Bearer {self.api_key}"})
+        self._ctx.base_url = "https://api.digitalocean.com/"
 
     async def validate_account(self) -> None:
-        r = await self._session.get(self.url("/v2/account"), headers=self._headers)
+        r = await self.request("GET", "/v2/account")
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API token. Please check your DigitalOcean credentials."
@@ -42,10 +49,18 @@ class DigitalOcean(IaasBase):
         Returns the invoiced billing for the given month.
         """
         start, end = current_month_date_range()
-        r = await self._session.get(
-            self.url("/v2/customers/my/invoices"),
-            headers=self._headers,
+        month = end.strftime("%Y-%m")
+        # Paid invoices don't change, once one's stored the list isn't needed
+        invoices = await self.fetch_invoices([month], self._get_paid_invoice)
+        return BillingResponse(
+            total=invoices[month]["total"],
+            balance=None,
+            start_date=start,
+            end_date=end,
         )
+
+    async def _get_paid_invoice(self, month: str) -> Dict[str, Any]:
+        r = await self.request("GET", "/v2/customers/my/invoices")
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API key. Please check your DigitalOcean API key."
@@ -54,33 +69,19 @@ class DigitalOcean(IaasBase):
             raise exc.UnknownError(
                 "Failed to get DigitalOcean invoices: {}".format(r.text)
             )
-        js = r.json()
-        total = 0
+        js = decode(r)
         for i in js["invoices"]:
-            if i["status"] == "paid" and i["date"]["month"] == end.strftime("%Y-%m"):
-                total = i["total"]
-                break
-        else:
-            raise exc.UnknownError(
-                "No invoices found for the given month: {}".format(
-                    end.strftime("%Y-%m")
-                )
-            )
-        return BillingResponse(
-            total=total,
-            balance=None,
-            start_date=start,
-            end_date=end,
+            if i["status"] == "paid" and i["date"]["month"] == month:
+                return i
+        raise exc.UnknownError(
+            "No invoices found for the given month: {}".format(month)
         )
 
     async def get_current_invoiced(self) -> BillingResponse:
         """
         Returns the current billing for the current month.
         """
-        r = await self._session.get(
-            self.url("/v2/customers/my/balance"),
-            headers=self._headers,
-        )
+        r = await self.request("GET", "/v2/customers/my/balance")
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API key. Please check your DigitalOcean API key."
@@ -89,7 +90,7 @@ class DigitalOcean(IaasBase):
             raise exc.UnknownError(
                 "Failed to get DigitalOcean billing: {}".format(r.text)
             )
-        js = r.json()
+        js = decode(r)
         start, end = current_month_date_range()
         return BillingResponse(
             total=js["month_to_date_usage"],
@@ -105,33 +106,40 @@ class DigitalOcean(IaasBase):
         pass
 
     async def get_instances(self) -> List[VirtualMachine]:
-        r = await self._session.get(
-            self.url("/v2/droplets"), headers=self._headers
+        def check(r: Response) -> None:
+            if r.status_code == 401:
+                raise exc.AuthorizationError(
+                    "Invalid API key. Please check your DigitalOcean API key."
+                )
+            if r.status_code != 200:
+                raise exc.UnknownError(
+                    "Failed to get DigitalOcean instances: {}".format(r.text)
+                )
+
+        droplets = OffsetPaginator(
+            self.request,
+            "/v2/droplets",
+            items=lambda js: js["droplets"],
+            check=check,
+            total=lambda r, js: js["meta"]["total"],
+            page_size=DROPLET_PAGE_SIZE,
+            page_params=page_number(),
         )
-        if r.status_code == 401:
-            raise exc.AuthorizationError(
-                "Invalid API key. Please check your DigitalOcean API key."
-            )
-        if r.status_code != 200:
-            raise exc.UnknownError(
-                "Failed to get DigitalOcean instances: {}".format(r.text)
-            )
-            return None
-        js = r.json()
         return [
             VirtualMachine(
                 name=i["name"],
                 id=i["id"],
                 ip=public_ip(i["networks"]),
-                status=i["status"],
+                state=i["status"],
                 iaas="DigitalOcean",
                 tags=i["tags"],
             )
-            for i in js["droplets"]
+            async for i in droplets
         ]
 
     async def get_instance_count(self) -> int:
-        r = await self._session.get(self.url("/v2/droplets"), headers=self._headers)
+        # Only the total is wanted, not the droplets
+        r = await self.request("GET", "/v2/droplets", params={"per_page": 1})
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API key. Please check your DigitalOcean API key."
@@ -140,13 +148,11 @@ class DigitalOcean(IaasBase):
             raise exc.UnknownError(
                 "Failed to get DigitalOcean droplets: {}".format(r.text)
             )
-        js = r.json()
+        js = decode(r)
         return js["meta"]["total"]
 
     async def get_instance(self, instance_id: str) -> VirtualMachine:
-        r = await self._session.get(
-            self.url("/v2/droplets/{}".format(instance_id)), headers=self._headers
-        )
+        r = await self.request("GET", "/v2/droplets/{}".format(instance_id))
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API key. Please check your DigitalOcean API key."
@@ -155,20 +161,18 @@ class DigitalOcean(IaasBase):
             raise exc.UnknownError(
                 "Failed to get DigitalOcean instance: {}".format(r.text)
             )
-        js = r.json()
+        js = decode(r)
         return VirtualMachine(
             name=js["name"],
             id=js["id"],
             ip=public_ip(js["networks"]),
-            status=js["status"],
+            state=js["status"],
             iaas="DigitalOcean",
             tags=js["tags"],
         )
 
     async def delete_instance(self, instance: VirtualMachine) -> None:
-        r = await self._session.delete(
-            self.url("/v2/droplets/{}".format(instance.id)), headers=self._headers
-        )
+        r = await self.request("DELETE", "/v2/droplets/{}".format(instance.id))
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API key. Please check your DigitalOcean API key."
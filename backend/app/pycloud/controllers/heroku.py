@@ -1,8 +1,12 @@
-from typing import List
+from typing import Any, Dict, List
+
+from httpx import Response
 
 from pycloud.base import PaasBase
 from pycloud.models import BillingResponse, IaasParam
+from pycloud.paginator import RangePaginator
 from pycloud.utils import current_month_date_range
+from pycloud.decoding import decode
 from pycloud import exc
 
 
@@ -17,8 +21,8 @@ class Heroku(PaasBase):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._base = "https://api.heroku.com/"  # type: ignore
-        self._headers.update(
+        self._ctx.base_url = "https://api.heroku.com/"
+        self._ctx.headers.update(
             {
                 "Authorization": f"Bearer {self.api_key}",
                 "Accept": "application/vnd.heroku+json; version=3",
@@ -26,7 +30,7 @@ class Heroku(PaasBase):
         )
 
     async def validate_account(self) -> None:
-        r = await self._session.get(self.url("/account"), headers=self._headers)
+        r = await self.request("GET", "/account")
         if r.status_code == 401:
             raise exc.AuthorizationError(
                 "Invalid API token. Please check your Heroku credentials."
@@ -35,10 +39,22 @@ class Heroku(PaasBase):
             raise exc.UnknownError("Failed to get Heroku profile: {}".format(r.text))
 
     async def get_current_invoiced(self) -> BillingResponse:
-        resp = await self._session.get(
-            self.url("/account/invoices"),
-            headers=self._headers,
+        start, end = current_month_date_range()
+        month = start.strftime("%Y-%m")
+        # Once paid (state 1) an invoice won't change, until then it's fetched
+        # every time
+        invoices = await self.fetch_invoices(
+            [month], self._get_invoice, lambda invoice: invoice.get("state") == 1
         )
+        return BillingResponse(
+            total=(invoices[month]["total"] / 100),
+            balance=None,
+            start_date=start,
+            end_date=end,
+        )
+
+    async def _get_invoice(self, month: str) -> Dict[str, Any]:
+        resp = await self.request("GET", "/account/invoices")
 
         if resp.status_code != 200:
             if resp.status_code == 401:
@@ -50,17 +66,10 @@ class Heroku(PaasBase):
                     "Failed to get Heroku billing: {}".format(resp.text)
                 )
 
-        start, end = current_month_date_range()
-        month = start.strftime("%Y-%m")
-        js = resp.json()
+        js = decode(resp)
         for invoice in js:
             if month in invoice["period_start"]:
-                return BillingResponse(
-                    total=(invoice["total"] / 100),
-                    balance=None,
-                    start_date=start,
-                    end_date=end,
-                )
+                return invoice
 
         raise Exception("No invoice found for the current month")
 
@@ -71,20 +80,16 @@ class Heroku(PaasBase):
         pass
 
     async def get_instance_count(self) -> int:
-        resp = await self._session.get(
-            self.url("/apps"),
-            headers=self._headers,
-        )
-
-        if resp.status_code != 200:
-            if resp.status_code == 401:
-                raise exc.AuthorizationError(
-                    "Invalid API key. Please check your Heroku API key."
-                )
-            else:
-                raise exc.UnknownError(
-                    "Failed to get Heroku instance count: {}".format(resp.text)
-                )
+        def check(resp: Response) -> None:
+            # 206 when there are more apps than fit in a range
+            if resp.status_code not in (200, 206):
+                if resp.status_code == 401:
+                    raise exc.AuthorizationError(
+                        "Invalid API key. Please check your Heroku API key."
+                    )
+                else:
+                    raise exc.UnknownError(
+                        "Failed to get Heroku instance count: {}".format(resp.text)
+                    )
 
-        js = resp.json()
-        return len(js)
+        return await RangePaginator(self.request, "/apps", check=check).count()
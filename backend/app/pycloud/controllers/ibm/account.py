@@ -3,6 +3,8 @@ from datetime import datetime
 
 from pydantic import BaseModel
 
+from pycloud.decoding import decode
+
 from .common import Pagination, BaseResource
 from .user import User
 from .resource_group import ListResourceGroupsResp, ResourceGroupResource
@@ -54,21 +56,21 @@ class Account(BaseModel):
 
 class AccountResource(BaseResource[Account]):
     async def get_user(self) -> User:
-        r = await self.parent.client.get(
+        r = await self.parent.request(
+            "GET",
             f"https://accounts.cloud.ibm.com/{self.me.metadata.url}/{self.me.entity.owner_iam_id}",
-            headers=self.parent.headers,
             params={
                 "include_linkages": True,
             },
         )
         if r.status_code != 200:
             raise Exception(f"get_user failed: {r.text}")
-        return User(**r.json())
+        return User(**decode(r))
 
     async def get_resource_groups(self) -> List[ResourceGroupResource]:
-        r = await self.parent.client.get(
+        r = await self.parent.request(
+            "GET",
             "https://resource-controller.cloud.ibm.com/v2/resource-groups",
-            headers=self.parent.headers,
             params={
                 "account_id": self.me.metadata.guid,
             },
@@ -77,17 +79,17 @@ class AccountResource(BaseResource[Account]):
             raise Exception(f"get_resource_groups failed: {r.text}")
         return [
             ResourceGroupResource(me=r, parent=self.parent)
-            for r in ListResourceGroupsResp(**r.json()).resources
+            for r in ListResourceGroupsResp(**decode(r)).resources
         ]
 
     async def get_coe(self) -> COEDescription:
-        r = await self.parent.client.get(
+        r = await self.parent.request(
+            "GET",
             f"https://accounts.cloud.ibm.com/coe/v2/accounts/{self.me.metadata.guid}",
-            headers=self.parent.headers,
         )
         if r.status_code != 200:
             raise Exception(f"get_coe failed: {r.text}")
-        return COEDescription(**r.json())
+        return COEDescription(**decode(r))
 
 
 class ListAccountResp(Pagination[Account]):
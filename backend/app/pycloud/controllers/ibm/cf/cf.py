@@ -3,6 +3,11 @@ from base64 import b64encode
 
 from httpx import AsyncClient
 
+from pycloud.cache import Token, token_key
+from pycloud.paginator import OffsetPaginator
+from pycloud.decoding import construct, decode
+
+from ..common import PAGE_SIZE, TokenAuth, page_params
 from .auth import LoginResp
 from .organization import ListOrganiztionsResp, OrganizationResource
 
@@ -11,7 +16,7 @@ if TYPE_CHECKING:
     from ..region import RegionResource, Region
 
 
-class CloudFoundry:
+class CloudFoundry(TokenAuth):
     ibm: "IBMApi"
     region: "Region"
     headers: Dict[str, str]
@@ -24,8 +29,10 @@ class CloudFoundry:
         self.apikey = self.ibm.api_key
         self.client = self.ibm.client
         self.headers = {}
+        self.token = None
+        self.token_key = token_key("CloudFoundry", self.apikey, self.region.region)
 
-    async def login(self) -> None:
+    async def _login(self) -> Token:
         r = await self.ibm.client.post(
             f"https://iam.cloud.ibm.com/cloudfoundry/login/{self.region.region}/oauth/token",
             headers={
@@ -37,19 +44,34 @@ class CloudFoundry:
             },
         )
         if r.status_code != 200:
-            if r.json()["errorCode"] == "BXNIM0207E":
+            if decode(r)["errorCode"] == "BXNIM0207E":
                 raise NotImplementedError()  # We don't have CF configured for this region
             raise Exception(f"login failed: {r.status_code} {r.text}")
-        self.token = LoginResp(**r.json())
-        self.headers.update({"Authorization": f"Bearer {self.token.access_token}"})
+        js = decode(r)
+        return Token.expiring(js["access_token"], js["expires_in"], login=js)
+
+    def use_token(self, token: Token) -> None:
+        super().use_token(token)
+        self.token = LoginResp(**token.data["login"])
 
     async def get_organizations(self) -> List[OrganizationResource]:
-        r = await self.ibm.client.get(
+        organizations = await OffsetPaginator(
+            self.request,
             f"{self.region.cf_api}/v2/organizations",
-            headers=self.headers,
-        )
-        if r.status_code != 200:
-            raise Exception(f"get_organizations failed: {r.text}")
+            items=lambda js: construct(ListOrganiztionsResp, js).resources,
+            total=lambda r, js: js["total_results"],
+            page_size=PAGE_SIZE,
+            page_params=page_params,
+        ).all()
         return OrganizationResource.map_model(
-            ListOrganiztionsResp(**r.json()).resources, parent=self, region=self.region
+            organizations, parent=self, region=self.region
         )
+
+    async def count_apps(self) -> int:
+        # The v3 listing says how many there are, a page of one is enough
+        r = await self.request(
+            "GET", f"{self.region.cf_api}/v3/apps", params={"per_page": 1}
+        )
+        if r.status_code != 200:
+            raise Exception(f"count_apps failed: {r.text}")
+        return decode(r)["pagination"]["total_results"]
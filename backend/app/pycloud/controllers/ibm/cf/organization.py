@@ -2,8 +2,11 @@ from typing import Optional, List
 
 from pydantic import BaseModel
 
+from pycloud.decoding import construct
+from pycloud.paginator import OffsetPaginator
+
 from .common import Metadata, BaseResource
-from ..common import Pagination
+from ..common import PAGE_SIZE, Pagination, page_params
 from .space import SpaceResource, ListSpacesResp
 
 
@@ -36,12 +39,12 @@ class ListOrganiztionsResp(Pagination[Organization]):
 
 class OrganizationResource(BaseResource[Organization]):
     async def get_spaces(self) -> List[SpaceResource]:
-        r = await self.parent.client.get(
+        spaces = await OffsetPaginator(
+            self.parent.request,
             f"{self.region.cf_api}/{self.me.entity.spaces_url}",
-            headers=self.parent.headers,
-        )
-        if r.status_code != 200:
-            raise Exception(r.text)
-        return SpaceResource.map_model(
-            ListSpacesResp(**r.json()).resources, parent=self.parent, region=self.region
-        )
+            items=lambda js: construct(ListSpacesResp, js).resources,
+            total=lambda r, js: js["total_results"],
+            page_size=PAGE_SIZE,
+            page_params=page_params,
+        ).all()
+        return SpaceResource.map_model(spaces, parent=self.parent, region=self.region)
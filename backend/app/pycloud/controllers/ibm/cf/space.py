@@ -2,6 +2,8 @@ from typing import List, Optional, Any
 
 from pydantic import BaseModel
 
+from pycloud.decoding import construct, decode
+
 from ..common import Pagination
 from .common import Metadata, BaseResource
 from .app import App
@@ -45,10 +47,11 @@ class SummaryResp(BaseModel):
 
 class SpaceResource(BaseResource[Space]):
     async def get_info(self) -> SummaryResp:
-        r = await self.parent.client.get(
+        r = await self.parent.request(
+            "GET",
             f"{self.region.cf_api}/{self.me.metadata.url}/summary",
-            headers=self.parent.headers,
         )
         if r.status_code != 200:
             raise Exception(r.text)
-        return SummaryResp(**r.json())
+        # Fetched for every space each collection, read as it comes
+        return construct(SummaryResp, decode(r))
@@ -1,6 +1,10 @@
-from typing import TYPE_CHECKING, List, Optional, TypeVar, Generic, Any
+from typing import TYPE_CHECKING, Dict, List, Optional, TypeVar, Generic, Any
 from pydantic import BaseModel
 from pydantic.generics import GenericModel
+from httpx import AsyncClient, Response
+
+from pycloud.cache import Token, tokens
+from pycloud.paginator import page_number
 
 if TYPE_CHECKING:
     from .ibm import IBMApi
@@ -8,6 +12,42 @@ if TYPE_CHECKING:
 Model = TypeVar("Model", bound=BaseModel)
 
 
+class TokenAuth:
+    """
+    Logs in through the shared token cache and retries once with a new token
+    when one is rejected. Subclasses set token_key and implement _login.
+    """
+
+    client: AsyncClient
+    headers: Dict[str, str]
+    token_key: str
+    _token: Optional[Token] = None
+
+    async def _login(self) -> Token:
+        raise NotImplementedError
+
+    def use_token(self, token: Token) -> None:
+        self.headers.update({"Authorization": f"Bearer {token.value}"})
+
+    async def login(self) -> None:
+        self._token = await tokens.get(self.token_key, self._login)
+        self.use_token(self._token)
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> Response:
+        r = await self.client.request(method, url, headers=self.headers, **kwargs)
+        if r.status_code == 401 and self._token is not None:
+            token, self._token = self._token, None
+            await tokens.invalidate(self.token_key, token)
+            await self.login()
+            r = await self.client.request(method, url, headers=self.headers, **kwargs)
+        return r
+
+
+# Most results the v2 APIs will return a page, pages count from 1
+PAGE_SIZE = 100
+page_params = page_number("page", "results-per-page")
+
+
 class Pagination(GenericModel, Generic[Model]):
     total_results: int
     total_pages: int
@@ -4,12 +4,23 @@ from datetime import datetime
 from httpx import AsyncClient
 from pydantic import parse_obj_as
 
+from pycloud.cache import Token, token_key
+from pycloud.decoding import construct, decode
+from pycloud.paginator import LinkPaginator
+
 from .auth import LoginResp
+from .common import TokenAuth
 from .account import AccountResource, ListAccountResp
-from .region import Region, ListRegionsResp, RegionResource
+from .region import ListRegionsResp, RegionResource
+from .resource_instance import (
+    PAGE_LIMIT,
+    ListResourceInstancesResp,
+    next_url,
+    resource_controller,
+)
 
 
-class IBMApi:
+class IBMApi(TokenAuth):
     headers: Dict[str, str]
     token: Optional[LoginResp]
     client: AsyncClient
@@ -20,8 +31,9 @@ class IBMApi:
         self.headers = {}
         self.token = None
         self.cf_token = None
+        self.token_key = token_key("IBM", api_key)
 
-    async def login(self) -> None:
+    async def _login(self) -> Token:
         r = await self.client.post(
             "https://iam.cloud.ibm.com/identity/token",
             auth=("bx", "bx"),
@@ -33,17 +45,12 @@ class IBMApi:
         )
         if r.status_code != 200:
             raise Exception(f"login failed: {r.status_code} {r.text}")
-        self.token = LoginResp(**r.json())
-        r = await self.client.post(
-            "https://iam.cloud.ibm.com/identity/token",
-            auth=("bx", "bx"),
-            json={
-                "grant_type": "refresh_token",
-                "refresh_token": self.token.refresh_token,
-                "response_type": "cloud_iam",
-            },
-        )
-        self.headers.update({"Authorization": f"Bearer {self.token.access_token}"})
+        js = decode(r)
+        return Token.expiring(js["access_token"], js["expires_in"], login=js)
+
+    def use_token(self, token: Token) -> None:
+        super().use_token(token)
+        self.token = LoginResp(**token.data["login"])
 
     async def refresh_auth(self) -> None:
         if not self.token:
@@ -58,7 +65,7 @@ class IBMApi:
         )
         if r.status_code != 200:
             raise Exception(f"refresh_auth failed: {r.text}")
-        self.token = LoginResp(**r.json())
+        self.token = LoginResp(**decode(r))
         self.headers.update({"Authorization": f"Bearer {self.token.access_token}"})
 
     async def ibm_check_token(self) -> None:
@@ -70,23 +77,32 @@ class IBMApi:
             await self.refresh_auth()
 
     async def get_accounts(self) -> List[AccountResource]:
-        r = await self.client.get(
-            "https://accounts.cloud.ibm.com/v1/accounts",
-            headers=self.headers,
-        )
+        r = await self.request("GET", "https://accounts.cloud.ibm.com/v1/accounts")
         if r.status_code != 200:
             raise Exception(f"get_accounts failed: {r.text}")
         return AccountResource.map_model(
-            ListAccountResp.parse_raw(r.text).resources, parent=self
+            ListAccountResp.parse_obj(decode(r)).resources, parent=self
         )
 
     async def get_regions(self) -> List[RegionResource]:
-        r = await self.client.get(
-            "https://mccp.us-south.cf.cloud.ibm.com/v2/regions",
-            headers=self.headers,
+        r = await self.request(
+            "GET", "https://mccp.us-south.cf.cloud.ibm.com/v2/regions"
         )
         if r.status_code != 200:
             raise Exception(f"get_regions failed: {r.text}")
         return RegionResource.map_model(
-            parse_obj_as(ListRegionsResp, r.json()), parent=self
+            parse_obj_as(ListRegionsResp, decode(r)), parent=self
+        )
+
+    def resource_instances(self) -> LinkPaginator:
+        """
+        Every service instance in the account, whatever the region, from the
+        Resource Controller. Iterate over it, pages come one after another.
+        """
+        return LinkPaginator(
+            self.request,
+            f"{resource_controller}/v2/resource_instances",
+            params={"limit": PAGE_LIMIT},
+            items=lambda js: construct(ListResourceInstancesResp, js).resources,
+            next=next_url,
         )
@@ -0,0 +1,41 @@
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+from pydantic import BaseModel
+
+resource_controller = "https://resource-controller.cloud.ibm.com"
+
+# Resource Controller won't give more than this a page
+PAGE_LIMIT = 100
+
+
+class ResourceInstance(BaseModel):
+    id: str
+    guid: str
+    crn: str
+    name: str
+    region_id: str
+    resource_id: str
+    type: str
+    state: str
+
+    @property
+    def service(self) -> str:
+        """
+        The catalog name of the service it's an instance of, from its CRN:
+        crn:v1:bluemix:public:<service>:<location>:a/<account>:<instance>::
+        """
+        return self.crn.split(":")[4]
+
+
+class ListResourceInstancesResp(BaseModel):
+    rows_count: int
+    next_url: Optional[str]
+    resources: List[ResourceInstance]
+
+
+def next_url(js: Dict[str, Any]) -> Optional[str]:
+    # Relative to the Resource Controller
+    if not js.get("next_url"):
+        return None
+    return urljoin(resource_controller, js["next_url"])
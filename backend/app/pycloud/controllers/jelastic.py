@@ -1,10 +1,12 @@
-from typing import List, Literal
+from typing import ClassVar, List, Literal
 
 from pydantic import BaseModel, AnyHttpUrl, validator
 
 from pycloud.base import PaasBase
 from pycloud.models import IaasParam, BillingResponse
+from pycloud.ratelimit import Limit
 from pycloud.utils import current_month_date_range
+from pycloud.decoding import decode
 from pycloud import exc
 
 
@@ -29,6 +31,9 @@ class Jelastic(PaasBase):
     endpoint: str
     api_key: str
 
+    # Hosting providers run their own, often small, Jelastic platforms
+    rate_limit: ClassVar[Limit] = Limit(rate=5, burst=10)
+
     @validator("endpoint")
     def validate_endpoint(cls, v):
         if v not in endpoints:
@@ -54,17 +59,17 @@ class Jelastic(PaasBase):
 
     def __init__(self, **kwargs):  # type: ignore
         super().__init__(**kwargs)
-        self._base = endpoints[self.endpoint].endpoint
+        self._ctx.base_url = endpoints[self.endpoint].endpoint
 
     async def validate_account(self) -> None:
         data = {
             "appid": "1dd8d191d38fff45e62564fcf67fdcd6",
             "session": self.api_key,
         }
-        r = await self._session.get(
-            self.url("/1.0/billing/account/rest/getaccount"), params=data
+        r = await self.request(
+            "GET", "/1.0/billing/account/rest/getaccount", params=data
         )
-        js = r.json()
+        js = decode(r)
         if js["result"]:
             # Result should be 0 for success
             raise exc.AuthorizationError(
@@ -81,12 +86,12 @@ class Jelastic(PaasBase):
             "endtime": last_day.strftime("%Y-%m-%d 00:00:00"),
             "period": "MONTH",
         }
-        resp = await self._session.get(
-            self.url("/1.0/billing/account/rest/getaccountbillinghistorybyperiod"),
+        resp = await self.request(
+            "GET",
+            "/1.0/billing/account/rest/getaccountbillinghistorybyperiod",
             params=data,
-            headers=self._headers,
         )
-        js = resp.json()
+        js = decode(resp)
         # Jelastic always returns 200, check internal result non-zero
         if js["result"]:
             if js["result"] == 702:
@@ -101,12 +106,12 @@ class Jelastic(PaasBase):
             "appid": "1dd8d191d38fff45e62564fcf67fdcd6",
             "session": self.api_key,
         }
-        resp = await self._session.get(
-            self.url("/1.0/billing/account/rest/getaccount"),
+        resp = await self.request(
+            "GET",
+            "/1.0/billing/account/rest/getaccount",
             params=data,
-            headers=self._headers,
         )
-        js = resp.json()
+        js = decode(resp)
         if js["result"]:
             if js["result"] == 702:
                 raise exc.AuthorizationError(
@@ -128,14 +133,15 @@ class Jelastic(PaasBase):
         pass
 
     async def get_instance_count(self) -> int:
-        resp = await self._session.get(
-            self.url("/1.0/environment/control/rest/getenvs"),
+        resp = await self.request(
+            "GET",
+            "/1.0/environment/control/rest/getenvs",
             params={
                 "appid": "1dd8d191d38fff45e62564fcf67fdcd6",
                 "session": self.api_key,
             },
         )
-        js = resp.json()
+        js = decode(resp)
         if js["result"]:
             if js["result"] == 702:
                 raise exc.AuthorizationError(
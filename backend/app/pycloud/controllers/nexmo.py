@@ -3,6 +3,7 @@ from typing import List
 from pycloud.base import SIPBase
 from pycloud.models import IaasParam, BillingResponse
 from pycloud.utils import current_month_date_range
+from pycloud.decoding import decode
 from pycloud import exc
 
 
@@ -22,11 +23,12 @@ class Nexmo(SIPBase):
 
     def __init__(self, **kwargs):  # type: ignore
         super().__init__(**kwargs)
-        self._base = "https://rest.nexmo.com/"
+        self._ctx.base_url = "https://rest.nexmo.com/"
 
     async def validate_account(self) -> None:
-        r = await self._session.get(
-            self.url("/account/get-balance"),
+        r = await self.request(
+            "GET",
+            "/account/get-balance",
             params={"api_key": self.api_key, "api_secret": self.api_secret},
         )
         if r.status_code != 200:
@@ -37,8 +39,9 @@ class Nexmo(SIPBase):
 
     async def get_current_invoiced(self) -> BillingResponse:
         start, end = current_month_date_range()
-        r = await self._session.get(
-            self.url("/account/get-balance"),
+        r = await self.request(
+            "GET",
+            "/account/get-balance",
             params={"api_key": self.api_key, "api_secret": self.api_secret},
         )
         if r.status_code != 200:
@@ -46,7 +49,7 @@ class Nexmo(SIPBase):
                 raise exc.AuthorizationError("Invalid API key or secret")
             else:
                 raise exc.UnknownError(f"Unexpected error occurred: {r.text}")
-        js = r.json()
+        js = decode(r)
         return BillingResponse(
             start_date=start, end_date=end, total=0.0, balance=js["value"]
         )
@@ -1,14 +1,37 @@
-from typing import Any, List
+from typing import Any, ClassVar, Dict, List, Optional
 from datetime import datetime
+import asyncio
+import hashlib
+import json
+import time
 
-import ovh
-from asgiref.sync import sync_to_async
+from dateutil.relativedelta import relativedelta
+from httpx import URL, Response
 
 from pycloud.base import IaasBase
 from pycloud.models import BillingResponse, IaasParam
 from pycloud.utils import current_month_date_range
+from pycloud.decoding import decode
 from pycloud import exc
 
+# API roots, the same ones the ovh SDK uses
+endpoints = {
+    "ovh-eu": "https://eu.api.ovh.com/1.0",
+    "ovh-ca": "https://ca.api.ovh.com/1.0",
+    "ovh-us": "https://api.us.ovhcloud.com/1.0",
+}
+
+# The API's clock minus ours per endpoint, requests are signed with its time
+time_deltas: Dict[str, int] = {}
+
+# How far back to look for the latest bill, widening until one turns up.
+# None lists every bill the account has.
+BILL_LOOKBACK: List[Optional[relativedelta]] = [
+    relativedelta(months=2),
+    relativedelta(years=1),
+    None,
+]
+
 
 class OVHCloud(IaasBase):
     endpoint: str
@@ -17,7 +40,8 @@ class OVHCloud(IaasBase):
     consumer_key: str
     project_id: str
 
-    _client: Any
+    # Bill details fetched at once
+    bill_fanout: ClassVar[int] = 8
 
     @staticmethod
     def params() -> List[IaasParam]:
@@ -34,55 +58,94 @@ class OVHCloud(IaasBase):
             IaasParam(key="project_id", label="Project ID", type="string"),
         ]
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self._client = ovh.Client(
-            endpoint=self.endpoint,
-            application_key=self.app_key,
-            application_secret=self.app_secret,
-            consumer_key=self.consumer_key,
+    async def call(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, str]] = None,
+        data: Any = None,
+    ) -> Any:
+        """
+        Sends a request signed the way the ovh SDK signs them, see
+        https://help.ovhcloud.com/csm/en-api-getting-started-ovhcloud-api
+        and returns the decoded response.
+        """
+        # The signature covers the URL exactly as it's sent, query and all
+        url = str(URL(endpoints[self.endpoint] + path, params=params))
+        body = "" if data is None else json.dumps(data)
+        timestamp = str(int(time.time()) + await self._time_delta())
+        signature = hashlib.sha1(
+            "+".join(
+                [self.app_secret, self.consumer_key, method, url, body, timestamp]
+            ).encode()
+        ).hexdigest()
+        r = await self.request(
+            method,
+            url,
+            content=body or None,
+            headers={
+                "X-Ovh-Application": self.app_key,
+                "X-Ovh-Consumer": self.consumer_key,
+                "X-Ovh-Timestamp": timestamp,
+                "X-Ovh-Signature": f"$1${signature}",
+            },
         )
+        return self._result(r)
 
-    async def validate_account(self) -> None:
-        def _validate_account():
-            try:
-                self._client.get("/me")
-            except ovh.exceptions.InvalidCredential:
-                raise exc.AuthorizationError("Invalid consumer key")
-            except ovh.exceptions.InvalidKey:
-                raise exc.AuthorizationError("Invalid application key or secret")
-            except Exception as e:
-                raise exc.UnknownError(e)
-
-        await sync_to_async(_validate_account)()
-
-    async def get_current_invoiced(self) -> BillingResponse:
-        start, end = current_month_date_range()
+    async def _time_delta(self) -> int:
+        if self.endpoint not in time_deltas:
+            r = await self.request("GET", endpoints[self.endpoint] + "/auth/time")
+            if r.status_code != 200:
+                raise exc.UnknownError(f"Failed to get OVH time: {r.text}")
+            time_deltas[self.endpoint] = int(r.text) - int(time.time())
+        return time_deltas[self.endpoint]
 
+    @staticmethod
+    def _result(r: Response) -> Any:
+        if r.status_code == 200:
+            return decode(r)
         try:
-            # TODO: Wrap in async call
-            bills = self._client.get("/me/bill")
-        except ovh.exceptions.InvalidCredential:
+            error = decode(r)
+        except ValueError:
+            error = {}
+        code = error.get("errorCode")
+        if code in ("INVALID_CREDENTIAL", "NOT_CREDENTIAL"):
             raise exc.AuthorizationError("Invalid consumer key")
-        except ovh.exceptions.InvalidKey:
+        if code == "INVALID_KEY" or "signature" in error.get("message", "").lower():
             raise exc.AuthorizationError("Invalid application key or secret")
-        except Exception as e:
-            raise exc.UnknownError(e)
+        raise exc.UnknownError(f"{r.request.url.path} failed: {r.text}")
 
-        prevBilling = None
-        billDate = None
+    async def validate_account(self) -> None:
+        await self.call("GET", "/me")
 
-        for billid in bills:
-            bill = self._client.get(f"/me/bill/{billid}")
-            ptime = datetime.fromisoformat(bill["date"])
-            if billDate is None or ptime > billDate:
-                billDate = ptime
-                prevBilling = bill
+    async def get_current_invoiced(self) -> BillingResponse:
+        start, end = current_month_date_range()
+
+        bills: List[str] = []
+        for lookback in BILL_LOOKBACK:
+            params = {}
+            if lookback is not None:
+                params["date.from"] = (start - lookback).strftime("%Y-%m-%d")
+            bills = await self.call("GET", "/me/bill", params)
+            if bills:
+                break
 
         # TODO: Properly handle the case where there are no bills
-        if prevBilling is None:
+        if not bills:
             raise Exception("No bill found")
 
+        fanout = asyncio.Semaphore(self.bill_fanout)
+
+        async def fetch(billid: str) -> Dict[str, Any]:
+            async with fanout:
+                return await self.call("GET", f"/me/bill/{billid}")
+
+        # Bills are final once issued, only the new ones need downloading
+        details = await self.fetch_invoices([str(billid) for billid in bills], fetch)
+        prevBilling = max(
+            details.values(), key=lambda bill: datetime.fromisoformat(bill["date"])
+        )
+
         return BillingResponse(
             total=prevBilling["priceWithTax"]["value"],
             balance=None,
@@ -93,14 +156,7 @@ class OVHCloud(IaasBase):
     async def get_current_usage(self) -> BillingResponse:
         start, end = current_month_date_range()
 
-        try:
-            usage = self._client.get("me/consumption/usage/forecast")
-        except ovh.exceptions.InvalidCredential:
-            raise exc.AuthorizationError("Invalid consumer key")
-        except ovh.exceptions.InvalidKey:
-            raise exc.AuthorizationError("Invalid application key or secret")
-        except Exception as e:
-            raise exc.UnknownError(e)
+        usage = await self.call("GET", "/me/consumption/usage/forecast")
 
         try:
             total = usage[0]["price"]["value"]
@@ -118,16 +174,4 @@ class OVHCloud(IaasBase):
         pass
 
     async def get_instance_count(self) -> int:
-        def _get_server_count():
-            try:
-                return len(
-                    self._client.get(f"/cloud/project/{self.project_id}/instance")
-                )
-            except ovh.exceptions.InvalidCredential:
-                raise exc.AuthorizationError("Invalid consumer key")
-            except ovh.exceptions.InvalidKey:
-                raise exc.AuthorizationError("Invalid application key or secret")
-            except Exception as e:
-                raise exc.UnknownError(e)
-
-        return await sync_to_async(_get_server_count)()
+        return len(await self.call("GET", f"/cloud/project/{self.project_id}/instance"))
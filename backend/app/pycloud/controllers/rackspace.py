@@ -1,7 +1,12 @@
 from typing import List, Dict, Any
+from datetime import datetime, timezone
+
+from dateutil.parser import isoparse
 
 from pycloud.base import IaasBase
+from pycloud.cache import Token
 from pycloud.models import BillingResponse, IaasParam
+from pycloud.decoding import decode
 from pycloud import exc
 
 
@@ -22,12 +27,12 @@ class Rackspace(IaasBase):
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._base = "https://billing.api.rackspacecloud.com/"  # type: ignore
+        self._ctx.base_url = "https://billing.api.rackspacecloud.com/"
 
-    async def authenticate(self) -> None:
-        resp = await self._session.post(
+    async def login(self) -> Token:
+        resp = await self.request(
+            "POST",
             "https://identity.api.rackspacecloud.com/v2.0/tokens",
-            headers=self._headers,
             json={
                 "auth": {
                     "RAX-KSKEY:apiKeyCredentials": {
@@ -46,13 +51,24 @@ class Rackspace(IaasBase):
                 raise exc.UnknownError(
                     "Failed to get Rackspace billing: {}".format(resp.text)
                 )
-        js = resp.json()
-        token = js["access"]["token"]["id"]
-        self._headers.update({"X-Auth-Token": token})
+        js = decode(resp)
+        token = js["access"]["token"]
+        expires_in = None
+        if "expires" in token:
+            expires = isoparse(token["expires"]) - datetime.now(timezone.utc)
+            expires_in = expires.total_seconds()
+        # The service catalog comes with the token, keep it alongside
+        return Token.expiring(
+            token["id"],
+            expires_in,
+            services={
+                service["name"]: service for service in js["access"]["serviceCatalog"]
+            },
+        )
 
-        self._services = {
-            service["name"]: service for service in js["access"]["serviceCatalog"]
-        }
+    def use_token(self, token: Token) -> None:
+        self._ctx.headers["X-Auth-Token"] = token.value
+        self._services = token.data["services"]
 
     async def validate_account(self) -> None:
         await self.authenticate()
@@ -63,9 +79,8 @@ class Rackspace(IaasBase):
         """
         await self.authenticate()
 
-        resp = await self._session.get(
-            self.url("/v2/accounts/{ran}/estimated_charges".format(ran=self.ran)),
-            headers=self._headers,
+        resp = await self.request(
+            "GET", "/v2/accounts/{ran}/estimated_charges".format(ran=self.ran)
         )
         if resp.status_code != 200:
             if resp.status_code == 401:
@@ -76,7 +91,7 @@ class Rackspace(IaasBase):
                 raise exc.UnknownError(
                     "Failed to get Rackspace billing: {}".format(resp.text)
                 )
-        js = resp.json()
+        js = decode(resp)
         return BillingResponse(
             total=js["estimatedCharges"]["chargeTotal"],
             balance=None,
@@ -95,11 +110,9 @@ class Rackspace(IaasBase):
         endpoints = self._services["cloudServersOpenStack"]["endpoints"]
         count = 0
         for endpoint in endpoints:
-            resp = await self._session.get(
-                f"{endpoint['publicURL']}/servers/detail", headers=self._headers
-            )
+            resp = await self.request("GET", f"{endpoint['publicURL']}/servers/detail")
             if resp.status_code != 200:
                 raise exc.UnknownError(f"Failed to get Rackspace servers: {resp.text}")
-            js = resp.json()
+            js = decode(resp)
             count += len(js["servers"])
         return count
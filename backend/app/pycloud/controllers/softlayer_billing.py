@@ -0,0 +1,304 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import logging
+import time
+import weakref
+
+from dateutil.relativedelta import relativedelta
+
+from pycloud.base import ProviderBase
+from pycloud.invoices import Invoice
+from pycloud.models import BillingResponse
+from pycloud.decoding import decode
+from pycloud import exc
+
+logger = logging.getLogger(__name__)
+
+# The account the credentials belong to
+api_getAccount = "/rest/v3.1/SoftLayer_Account/getObject.json"
+
+# Grab previous invoice object
+api_getPrevInvoice = "/rest/v3.1/SoftLayer_Account/getLatestRecurringInvoice.json"
+
+# Grab top level items of indicated invoice
+api_getInvoiceTopLevel = (
+    "/rest/v3.1/SoftLayer_Billing_Invoice/{id}/getInvoiceTopLevelItems.json"
+)
+
+# Grab an invoices non-zero cost children
+api_getInvoiceChildren = (
+    "/rest/v3.1/SoftLayer_Billing_Invoice_Item/{id}/getNonZeroAssociatedChildren.json"
+)
+
+# item for usage costs
+api_getNextInvoiceTopLevel = (
+    "/rest/v3.1/SoftLayer_Account/getNextInvoiceTopLevelBillingItems.json"
+)
+
+# Returns only non-zero cost children of billing item id {id}
+api_getChildren = (
+    "/rest/v3.1/SoftLayer_Billing_Item/{id}/getNonZeroNextInvoiceChildren.json"
+)
+
+# Items per page, SoftLayer starts timing out on big relational masks well
+# before it runs out of items
+PAGE_SIZE = 100
+# Requests in flight at once when paging or falling back to per item calls
+FANOUT = 10
+# How long a fetched invoice is reused, about one collection cycle
+INVOICE_TTL = 600.0
+
+Items = List[Dict[str, Any]]
+
+# Object filter string operations, longest first so ! and = don't shadow them
+OPERATIONS: List[Tuple[str, Callable[[str, str], bool]]] = [
+    ("!^=", lambda v, arg: not v.startswith(arg)),
+    ("!$=", lambda v, arg: not v.endswith(arg)),
+    ("!*=", lambda v, arg: arg not in v),
+    ("!=", lambda v, arg: v != arg),
+    ("^=", lambda v, arg: v.startswith(arg)),
+    ("$=", lambda v, arg: v.endswith(arg)),
+    ("*=", lambda v, arg: arg in v),
+]
+
+
+def matches(operation: str, value: str) -> bool:
+    """
+    Applies an object filter operation to a string the way SoftLayer would,
+    https://sldn.softlayer.com/article/object-filters/
+    """
+    for op, test in OPERATIONS:
+        if operation.startswith(op):
+            return test(value, operation[len(op) :])
+    return value == operation
+
+
+class InvoiceCache:
+    """
+    Invoice items fetched unfiltered, so the Softlayer and Bluemix sides of
+    one SoftLayer account share a single fetch and just filter their half.
+    Concurrent fetches of the same invoice wait on the first.
+    """
+
+    def __init__(self, ttl: float = INVOICE_TTL):
+        self.ttl = ttl
+        self._items: Dict[Hashable, Tuple[float, Items]] = {}
+        # A key's lock goes away once nobody holds or waits on it
+        self._locks: "weakref.WeakValueDictionary[Hashable, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Items]]) -> Items:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            now = time.monotonic()
+            cached = self._items.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+            items = await fetch()
+            # Drop whatever has gone stale while we're here
+            for stale in [
+                k for k, (expires, _) in self._items.items() if expires <= now
+            ]:
+                del self._items[stale]
+            self._items[key] = (now + self.ttl, items)
+            return items
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._locks.clear()
+
+
+invoices = InvoiceCache()
+# SoftLayer account id per set of credentials
+accounts: Dict[str, int] = {}
+
+
+class SoftlayerBilling:
+    """
+    Invoice totals for a SoftLayer account, shared by Softlayer and Bluemix.
+
+    An item's total is its own recurring fee plus those of its non-zero
+    children. The children come along with the items through the object mask
+    https://sldn.softlayer.com/article/object-masks/ so an account takes a
+    call per page of items rather than one per item. If SoftLayer won't
+    serve the nested mask the children are fetched per item instead, a few
+    at a time.
+
+    Items are fetched for the whole account and kept in invoices, category
+    is an object filter operation on their categoryCode applied afterwards.
+    """
+
+    def __init__(
+        self,
+        provider: ProviderBase,
+        category: str,
+        page_size: int = PAGE_SIZE,
+        fanout: int = FANOUT,
+    ):
+        self.provider = provider
+        self.category = category
+        self.page_size = page_size
+        self._fanout = asyncio.Semaphore(fanout)
+
+    async def invoiced(self) -> BillingResponse:
+        """
+        Totals the latest recurring invoice.
+        """
+        r = await self.provider.request("GET", api_getPrevInvoice)
+        if r.status_code != 200:
+            raise exc.UnknownError(f"getPrevInvoice failed:\n{r.text}")
+        invoice = decode(r)
+        # Bluemix/softlayer return an empty response if there isn't one
+        if not invoice:
+            raise exc.UnknownError("No previous invoice found")
+
+        async def total(id: str) -> Invoice:
+            items = await self._mine(
+                ("invoice", invoice.get("accountId"), invoice["id"]),
+                lambda: self._items(
+                    api_getInvoiceTopLevel.format(id=id),
+                    ["id", "categoryCode", "recurringFee", "billingItemId"],
+                    "nonZeroAssociatedChildren",
+                    api_getInvoiceChildren,
+                ),
+            )
+            return {"total": self._total(items, "nonZeroAssociatedChildren")}
+
+        # An issued invoice is final, its items are only ever totalled once
+        id = str(invoice["id"])
+        totals = await self.provider.fetch_invoices([id], total)
+
+        # The invoice is created at the end of the period it bills for
+        resp = BillingResponse(
+            total=totals[id]["total"],
+            start_date=invoice["createDate"],
+            end_date=invoice["createDate"],
+        )
+        resp.start_date = resp.start_date - relativedelta(months=1)
+        return resp
+
+    async def usage(self) -> BillingResponse:
+        """
+        Totals what's on the next invoice so far.
+        """
+        items = await self._mine(
+            ("next", await self._account_id()),
+            lambda: self._items(
+                api_getNextInvoiceTopLevel,
+                [
+                    "id",
+                    "categoryCode",
+                    "recurringFee",
+                    "cycleStartDate",
+                    "nextBillDate",
+                ],
+                "nonZeroNextInvoiceChildren",
+                api_getChildren,
+            ),
+        )
+        return BillingResponse(
+            total=self._total(items, "nonZeroNextInvoiceChildren"),
+            start_date=items[0]["cycleStartDate"] if items else None,
+            end_date=items[0]["nextBillDate"] if items else None,
+        )
+
+    async def _mine(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Items]]
+    ) -> Items:
+        """
+        This side's share of the account's items.
+        """
+        items = await invoices.get(key, fetch)
+        return [item for item in items if matches(self.category, item["categoryCode"])]
+
+    @staticmethod
+    def _total(items: Items, children: str) -> float:
+        return sum(
+            float(item["recurringFee"])
+            + sum(float(child["recurringFee"]) for child in item.get(children, []))
+            for item in items
+        )
+
+    async def _account_id(self) -> int:
+        key = self.provider.token_key()
+        if key not in accounts:
+            r = await self.provider.request(
+                "GET", api_getAccount, params={"objectMask": "mask[id]"}
+            )
+            if r.status_code == 401:
+                raise exc.AuthorizationError(
+                    "Invalid API key. Please check your Softlayer API key."
+                )
+            if r.status_code != 200:
+                raise exc.UnknownError(f"getObject failed:\n{r.text}")
+            accounts[key] = decode(r)["id"]
+        return accounts[key]
+
+    async def _items(
+        self,
+        url: str,
+        fields: List[str],
+        children: str,
+        children_url: str,
+    ) -> Items:
+        """
+        Every top level item of url with its children under item[children].
+        """
+        nested = f"mask[{','.join(fields)},{children}[recurringFee]]"
+        try:
+            return await self._paged(url, {"objectMask": nested})
+        except exc.UnknownError as e:
+            logger.warning(f"Nested mask failed, fetching children per item: {e}")
+
+        items = await self._paged(url, {"objectMask": f"mask[{','.join(fields)}]"})
+
+        async def fetch_children(item: Dict[str, Any]) -> None:
+            item[children] = await self._paged(
+                children_url.format(id=item["id"]),
+                {"objectMask": "mask[recurringFee]"},
+            )
+
+        await asyncio.gather(*[fetch_children(item) for item in items])
+        return items
+
+    async def _paged(self, url: str, params: Dict[str, str]) -> List[Any]:
+        """
+        Every result of url, a page at a time with resultLimit. Once the first
+        page says how many there are the rest are fetched together.
+        """
+        first, total = await self._page(url, params, 0)
+        if total is None:
+            # No count to go by, walk the pages until one comes back short
+            results = first
+            while len(first) == self.page_size:
+                first, _ = await self._page(url, params, len(results))
+                results += first
+            return results
+        pages = await asyncio.gather(
+            *[
+                self._page(url, params, offset)
+                for offset in range(self.page_size, total, self.page_size)
+            ]
+        )
+        return first + [result for page, _ in pages for result in page]
+
+    async def _page(
+        self, url: str, params: Dict[str, str], offset: int
+    ) -> Tuple[List[Any], Optional[int]]:
+        async with self._fanout:
+            r = await self.provider.request(
+                "GET",
+                url,
+                params={**params, "resultLimit": f"{offset},{self.page_size}"},
+            )
+        if r.status_code == 401:
+            raise exc.AuthorizationError(
+                "Invalid API key. Please check your Softlayer API key."
+            )
+        if r.status_code != 200:
+            raise exc.UnknownError(f"{url} failed:\n{r.text}")
+        total = r.headers.get("SoftLayer-Total-Items")
+        return decode(r), int(total) if total is not None else None
@@ -0,0 +1,74 @@
+from typing import Any, Dict, List, Tuple, Type, TypeVar, Union
+from functools import lru_cache
+
+import orjson
+from httpx import Response
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+M = TypeVar("M", bound=BaseModel)
+
+# How to build each field of a model: its name, the key it comes under, the
+# model to build it as if it's one, whether it's a list of them, and the field
+Plan = List[Tuple[str, str, Any, bool, ModelField]]
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodes JSON with orjson. Its errors are json.JSONDecodeError too, so
+    callers catch them the same as the stdlib's.
+    """
+    return orjson.loads(data)
+
+
+def decode(r: Response) -> Any:
+    """
+    A response's JSON, decoded straight from its bytes. Unlike r.json() the
+    body is never turned into a str first.
+    """
+    return loads(r.content)
+
+
+@lru_cache(maxsize=None)
+def _plan(model: Type[BaseModel]) -> Plan:
+    plan: Plan = []
+    for name, field in model.__fields__.items():
+        nested = None
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            if field.shape in (SHAPE_SINGLETON, SHAPE_LIST):
+                nested = field.type_
+        plan.append((name, field.alias, nested, field.shape == SHAPE_LIST, field))
+    return plan
+
+
+def construct(model: Type[M], data: Dict[str, Any]) -> M:
+    """
+    Builds model from decoded JSON without validating it, nested models and
+    lists of them included. Far cheaper than model(**data) for the big
+    responses a collection makes lots of, but nothing is coerced: a datetime
+    stays the str it came as. Only for responses read as they come.
+    """
+    values: Dict[str, Any] = {}
+    fields_set = set()
+    for name, alias, nested, many, field in _plan(model):
+        if alias in data:
+            value = data[alias]
+        elif name in data:
+            value = data[name]
+        else:
+            if not field.required:
+                values[name] = field.get_default()
+            continue
+        if nested is not None and value is not None:
+            if many:
+                value = [construct(nested, item) for item in value]
+            else:
+                value = construct(nested, value)
+        values[name] = value
+        fields_set.add(name)
+    # What BaseModel.construct does, without going over the fields again
+    m = model.__new__(model)
+    object.__setattr__(m, "__dict__", values)
+    object.__setattr__(m, "__fields_set__", fields_set)
+    m._init_private_attributes()
+    return m
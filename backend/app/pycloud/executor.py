@@ -0,0 +1,135 @@
+from typing import Any, Callable, Dict, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import threading
+import time
+
+from pydantic import BaseModel
+
+
+T = TypeVar("T")
+
+# Used when a provider doesn't specify how many threads it may use
+DEFAULT_WORKERS = 4
+
+
+class ExecutorStats(BaseModel):
+    name: str
+    max_workers: int
+    # Calls waiting for a free thread right now
+    queued: int
+    # Calls currently running on a thread
+    running: int
+    # Calls submitted since the executor was created
+    submitted: int
+    # Time spent waiting for a free thread, in seconds
+    wait_total: float
+    wait_max: float
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.submitted if self.submitted else 0.0
+
+
+class ProviderExecutor:
+    """
+    Bounded thread pool for blocking SDK calls (boto3, ...).
+
+    asgiref's sync_to_async defaults to thread_sensitive=True which funnels
+    every call in the process through a single thread, so gathering blocking
+    calls never actually overlaps. Each provider gets its own pool so a slow
+    provider can't starve the others.
+    """
+
+    def __init__(self, name: str, max_workers: int = DEFAULT_WORKERS):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"pycloud-{name}"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._submitted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        # Carry contextvars over to the worker thread like sync_to_async does
+        ctx = contextvars.copy_context()
+        queued_at = time.monotonic()
+        with self._lock:
+            self._queued += 1
+            self._submitted += 1
+
+        def call() -> T:
+            waited = time.monotonic() - queued_at
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return ctx.run(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        return await loop.run_in_executor(self._pool, call)
+
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            return ExecutorStats(
+                name=self.name,
+                max_workers=self.max_workers,
+                queued=self._queued,
+                running=self._running,
+                submitted=self._submitted,
+                wait_total=self._wait_total,
+                wait_max=self._wait_max,
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_executors: Dict[str, ProviderExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: Optional[int] = None) -> ProviderExecutor:
+    """
+    Returns the executor for the given provider, creating it on first use.
+    max_workers is only used when the executor doesn't exist yet.
+    """
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ProviderExecutor(name, max_workers or DEFAULT_WORKERS)
+        return _executors[name]
+
+
+def configure_executor(name: str, max_workers: int) -> ProviderExecutor:
+    """
+    (Re)creates the executor for the given provider with a new size.
+    Calls already submitted to the old executor are allowed to finish.
+    """
+    with _executors_lock:
+        old = _executors.get(name)
+        _executors[name] = ProviderExecutor(name, max_workers)
+    if old:
+        old.shutdown(wait=False)
+    return _executors[name]
+
+
+def executor_stats() -> Dict[str, ExecutorStats]:
+    with _executors_lock:
+        executors = list(_executors.values())
+    return {e.name: e.stats() for e in executors}
+
+
+async def run_blocking(
+    name: str, func: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    return await get_executor(name).run(func, *args, **kwargs)
@@ -0,0 +1,91 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+Invoice = Dict[str, Any]
+
+
+class InvoiceBackend:
+    """
+    Where finalized invoices are kept, in memory unless something more
+    permanent is plugged in. Keys are (provider, account, invoice id), account
+    being whatever the controller identifies the account by.
+    """
+
+    def __init__(self):
+        self._invoices: Dict[Tuple[str, str, str], Invoice] = {}
+
+    async def get(
+        self, provider: str, account: str, ids: Iterable[str]
+    ) -> Dict[str, Invoice]:
+        found = {}
+        for id in ids:
+            invoice = self._invoices.get((provider, account, id))
+            if invoice is not None:
+                found[id] = invoice
+        return found
+
+    async def put(
+        self, provider: str, account: str, invoices: Dict[str, Invoice]
+    ) -> None:
+        for id, invoice in invoices.items():
+            self._invoices[(provider, account, id)] = invoice
+
+
+class FinalizedInvoices:
+    """
+    Invoices that can't change any more, so are only ever fetched once.
+
+    Like the token cache it's only a cache, errors from the backend are logged
+    and the invoices fetched from the provider as if it wasn't there.
+    """
+
+    def __init__(self, backend: Optional[InvoiceBackend] = None):
+        self.backend = backend or InvoiceBackend()
+
+    async def get(
+        self, provider: str, account: str, ids: Iterable[str]
+    ) -> Dict[str, Invoice]:
+        try:
+            return await self.backend.get(provider, account, list(ids))
+        except Exception as e:
+            logger.warning(f"Finalized invoice lookup failed: {e!r}")
+            return {}
+
+    async def put(
+        self, provider: str, account: str, invoices: Dict[str, Invoice]
+    ) -> None:
+        if not invoices:
+            return
+        try:
+            await self.backend.put(provider, account, invoices)
+        except Exception as e:
+            logger.warning(f"Storing finalized invoices failed: {e!r}")
+
+    async def fetch(
+        self,
+        provider: str,
+        account: str,
+        ids: Iterable[str],
+        fetch: Callable[[str], Awaitable[Invoice]],
+        final: Callable[[Invoice], bool],
+    ) -> Dict[str, Invoice]:
+        """
+        Returns the invoices with ids, only calling fetch for those that
+        aren't stored. The ones final says are done with are stored.
+        """
+        ids = list(ids)
+        found = await self.get(provider, account, ids)
+        missing = [id for id in ids if id not in found]
+        fetched = dict(zip(missing, await asyncio.gather(*map(fetch, missing))))
+        await self.put(
+            provider,
+            account,
+            {id: invoice for id, invoice in fetched.items() if final(invoice)},
+        )
+        return {**found, **fetched}
+
+
+invoices = FinalizedInvoices()
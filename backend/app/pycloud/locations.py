@@ -0,0 +1,65 @@
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long an account's locations are kept after they were last recorded.
+# Inventory scans record them every poll, this only clears out accounts
+# that are gone.
+LOCATION_TTL = 7 * 24 * 3600
+
+
+class LocationIndex:
+    """
+    Where each of an account's resources lives, e.g. instance id to region,
+    so single resource calls can go straight to the right place instead of
+    searching every region. Scans that list everything anyway record what
+    they saw.
+
+    With redis set it's kept there, a hash per account, and survives
+    restarts. Like the token cache it's only a cache: errors talking to redis
+    are logged and a lookup that fails is a miss.
+    """
+
+    def __init__(self, redis: Any = None, prefix: str = "pycloud:location:"):
+        self.redis = redis
+        self.prefix = prefix
+        self._locations: Dict[str, Dict[str, str]] = {}
+
+    async def get(self, account: str, id: str) -> Optional[str]:
+        location = self._locations.get(account, {}).get(id)
+        if location is None:
+            location = await self._call("hget", self.prefix + account, id)
+            if location is not None:
+                self._locations.setdefault(account, {})[id] = location
+        return location
+
+    async def put(self, account: str, locations: Dict[str, str]) -> None:
+        if not locations:
+            return
+        self._locations.setdefault(account, {}).update(locations)
+        key = self.prefix + account
+        await self._call("hset", key, mapping=locations)
+        await self._call("expire", key, LOCATION_TTL)
+
+    async def forget(self, account: str, id: str) -> None:
+        self._locations.get(account, {}).pop(id, None)
+        await self._call("hdel", self.prefix + account, id)
+
+    def clear(self) -> None:
+        """
+        Forgets the in process locations, redis is left alone.
+        """
+        self._locations.clear()
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self.redis is None:
+            return None
+        try:
+            return await getattr(self.redis, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Location index {method} failed: {e!r}")
+            return None
+
+
+locations = LocationIndex()
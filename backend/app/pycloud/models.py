@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, Optional, Literal, Any
+from typing import Dict, List, Optional, Literal, Any
 from datetime import datetime
 
 from pydantic import BaseModel, root_validator
@@ -19,6 +19,11 @@ class BillingResponse(BaseModel):
         return values
 
 
+class DailyCost(BaseModel):
+    date: datetime
+    total: float
+
+
 class IaasType(Enum):
     IAAS = "IAAS"
     PAAS = "PAAS"
@@ -35,6 +40,26 @@ class VirtualMachine(BaseModel):
     tags: List[str] = []
 
 
+class InstanceBreakdown(BaseModel):
+    # Instances per state in each region, or per kind for providers that
+    # count more than one kind of instance
+    regions: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(sum(states.values()) for states in self.regions.values())
+
+    def states(self) -> Dict[str, int]:
+        """
+        Instances per state across every region.
+        """
+        totals: Dict[str, int] = {}
+        for states in self.regions.values():
+            for state, count in states.items():
+                totals[state] = totals.get(state, 0) + count
+        return totals
+
+
 class IaasParam(BaseModel):
     key: str
     label: str
@@ -0,0 +1,225 @@
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from collections import deque
+import asyncio
+
+from httpx import Response
+
+from .decoding import decode
+from . import exc
+
+# Pages in flight at once when the total is known up front
+FANOUT = 8
+
+Request = Callable[..., Awaitable[Response]]
+# Pulls the items out of a decoded page
+Items = Callable[[Any], List[Any]]
+# Query params for the page at an offset, of a size
+PageParams = Callable[[int, int], Dict[str, Any]]
+
+
+def check_status(r: Response) -> None:
+    if r.status_code == 401:
+        raise exc.AuthorizationError(f"{r.url.path} unauthorized: {r.text}")
+    if not r.is_success:
+        raise exc.UnknownError(f"{r.url.path} failed: {r.text}")
+
+
+def offset_limit(offset: int, limit: int) -> Dict[str, Any]:
+    return {"offset": offset, "limit": limit}
+
+
+def page_number(page: str = "page", per_page: str = "per_page") -> PageParams:
+    """
+    Page params for APIs that count pages from 1 rather than items from 0.
+    """
+
+    def params(offset: int, limit: int) -> Dict[str, Any]:
+        return {page: offset // limit + 1, per_page: limit}
+
+    return params
+
+
+class Paginator:
+    """
+    Walks a list endpoint, an async iterator over the items on every page.
+    Pages are thrown away as soon as their items have been handed out, so
+    summing or counting doesn't hold the whole listing.
+
+    request is a provider's request method, check raises for a response that
+    isn't a page and items pulls the list out of a decoded page.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        items: Items = lambda js: js,
+        check: Callable[[Response], None] = check_status,
+    ):
+        self.request = request
+        self.url = url
+        self.params = params or {}
+        self.items = items
+        self.check = check
+
+    async def _get(self, url: str, **kwargs: Any) -> Tuple[Response, Any]:
+        r = await self.request("GET", url, **kwargs)
+        self.check(r)
+        return r, decode(r)
+
+    def pages(self) -> AsyncIterator[List[Any]]:
+        raise NotImplementedError
+
+    async def _items(self) -> AsyncIterator[Any]:
+        async for page in self.pages():
+            for item in page:
+                yield item
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._items()
+
+    async def all(self) -> List[Any]:
+        return [item async for item in self]
+
+    async def count(self) -> int:
+        count = 0
+        async for page in self.pages():
+            count += len(page)
+        return count
+
+
+class LinkPaginator(Paginator):
+    """
+    Each page links to the next, so they can only be fetched one after
+    another. next gets the link from a page, relative or absolute.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        items: Items = lambda js: js,
+        check: Callable[[Response], None] = check_status,
+        next: Callable[[Any], Optional[str]] = lambda js: js.get("nextLink"),
+    ):
+        super().__init__(request, url, params, items, check)
+        self.next = next
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        _, js = await self._get(self.url, params=self.params)
+        yield self.items(js)
+        # The link carries the query along
+        while url := self.next(js):
+            _, js = await self._get(url)
+            yield self.items(js)
+
+
+class OffsetPaginator(Paginator):
+    """
+    Pages picked by offset and size, page_params turning those into the
+    endpoint's query params. When the first page says how many items there
+    are the rest are fetched fanout at a time, otherwise one after another
+    until a page comes back short.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        items: Items = lambda js: js,
+        check: Callable[[Response], None] = check_status,
+        total: Callable[[Response, Any], Optional[int]] = lambda r, js: None,
+        page_size: int = 100,
+        page_params: PageParams = offset_limit,
+        fanout: int = FANOUT,
+    ):
+        super().__init__(request, url, params, items, check)
+        self.total = total
+        self.page_size = page_size
+        self.page_params = page_params
+        self.fanout = fanout
+
+    async def _page(self, offset: int, size: int) -> Tuple[Response, Any]:
+        return await self._get(
+            self.url, params={**self.params, **self.page_params(offset, size)}
+        )
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        r, js = await self._page(0, self.page_size)
+        page = self.items(js)
+        yield page
+        total = self.total(r, js)
+        if total is None:
+            offset = len(page)
+            while len(page) == self.page_size:
+                _, js = await self._page(offset, self.page_size)
+                page = self.items(js)
+                offset += len(page)
+                yield page
+            return
+        if not page:
+            return
+
+        # A short first page with more to come means the endpoint caps the
+        # page size below ours, go by its size so nothing is skipped
+        size = min(len(page), self.page_size)
+        offsets = iter(range(size, total, size))
+        # Keep fanout pages coming, handed out in order
+        pending: Deque[asyncio.Task] = deque()
+        try:
+            for offset in offsets:
+                pending.append(asyncio.create_task(self._page(offset, size)))
+                if len(pending) == self.fanout:
+                    break
+            while pending:
+                _, js = await pending.popleft()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(asyncio.create_task(self._page(offset, size)))
+                yield self.items(js)
+        finally:
+            # An error or a caller that stopped early
+            for task in pending:
+                task.cancel()
+
+
+class RangePaginator(Paginator):
+    """
+    Pages picked with a Range header, the next range coming back in the
+    Next-Range header of a 206 Partial Content, like Heroku's
+    https://devcenter.heroku.com/articles/platform-api-reference#ranges
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        items: Items = lambda js: js,
+        check: Callable[[Response], None] = check_status,
+        range: str = "id ..; max=1000",
+    ):
+        super().__init__(request, url, params, items, check)
+        self.range = range
+
+    async def pages(self) -> AsyncIterator[List[Any]]:
+        range: Optional[str] = self.range
+        while range:
+            r, js = await self._get(
+                self.url, params=self.params, headers={"Range": range}
+            )
+            yield self.items(js)
+            range = r.headers.get("Next-Range") if r.status_code == 206 else None
@@ -0,0 +1,199 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import time
+
+from httpx import URL, Response
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Assumed wait after a 429 that doesn't say how long to back off
+DEFAULT_RETRY_AFTER = 1.0
+# X-RateLimit-Reset is either seconds from now or a unix timestamp,
+# anything bigger than this is taken as a timestamp
+RESET_EPOCH = 10**9
+
+# Token bucket as a GCRA: tat is the time the bucket would be full again.
+# A request may go at tat - tolerance and pushes tat on by one interval.
+# Waits are reserved up front, so callers just sleep for what they're given.
+ACQUIRE = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1])) or now, now)
+local expire = math.ceil((tat + interval - now) * 1000) + 1000
+redis.call("SET", KEYS[1], tostring(tat + interval), "PX", expire)
+return tostring(math.max(0, tat - tolerance - now))
+"""
+
+BLOCK = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local tat = now + tonumber(ARGV[2]) + tonumber(ARGV[3])
+if tat > (tonumber(redis.call("GET", KEYS[1])) or 0) then
+    local expire = math.ceil((tat - now) * 1000) + 1000
+    redis.call("SET", KEYS[1], tostring(tat), "PX", expire)
+end
+return 0
+"""
+
+
+class Limit(BaseModel):
+    # Requests per second
+    rate: float
+    # Requests that can go at once after a quiet spell
+    burst: int = 1
+
+    @property
+    def interval(self) -> float:
+        return 1 / self.rate
+
+    @property
+    def tolerance(self) -> float:
+        return (self.burst - 1) * self.interval
+
+
+# Only slowed down by what responses say
+UNLIMITED = Limit(rate=float("inf"))
+
+
+class Bucket:
+    """
+    In process bucket, and the fallback when redis can't be reached.
+    """
+
+    def __init__(self, limit: Limit):
+        self.limit = limit
+        self.tat = 0.0
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        tat = max(self.tat, now)
+        self.tat = tat + self.limit.interval
+        return max(0.0, tat - self.limit.tolerance - now)
+
+    def block(self, delay: float) -> None:
+        self.tat = max(self.tat, time.monotonic() + delay + self.limit.tolerance)
+
+
+def rate_key(provider: str, url: Any) -> str:
+    return f"{provider}:{URL(str(url)).host}"
+
+
+def retry_after(resp: Response) -> Optional[float]:
+    """
+    Seconds the response asks us to hold off for, if it says.
+    Understands Retry-After and the X-RateLimit-Remaining/Reset family.
+    """
+    value = resp.headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    for prefix in ("X-RateLimit-", "RateLimit-"):
+        remaining = resp.headers.get(prefix + "Remaining")
+        reset = resp.headers.get(prefix + "Reset")
+        if remaining is None or reset is None:
+            continue
+        try:
+            if float(remaining) > 0:
+                return None
+            reset_at = float(reset)
+        except ValueError:
+            continue
+        if reset_at > RESET_EPOCH:
+            reset_at -= time.time()
+        return max(0.0, reset_at)
+    return None
+
+
+class RateLimiter:
+    """
+    Paces requests per provider and host so collections stay under the
+    providers' limits instead of running into 429s and retrying later.
+
+    With redis set every worker draws from the same buckets, otherwise each
+    process keeps its own. Like the token cache, redis errors are logged and
+    the in process bucket is used instead.
+    """
+
+    def __init__(self, redis: Any = None, prefix: str = "pycloud:rate:"):
+        self.redis = redis
+        self.prefix = prefix
+        self._buckets: Dict[str, Bucket] = {}
+        self._scripts: Dict[str, Any] = {}
+
+    def _bucket(self, key: str, limit: Limit) -> Bucket:
+        if key not in self._buckets:
+            self._buckets[key] = Bucket(limit)
+        return self._buckets[key]
+
+    async def acquire(self, key: str, limit: Optional[Limit]) -> None:
+        """
+        Waits until a request to key is allowed. Keys without a limit only
+        wait out what responses asked for, and don't go to redis for it.
+        """
+        wait = None
+        if limit is not None:
+            wait = await self._eval(ACQUIRE, key, limit.interval, limit.tolerance)
+        if wait is None:
+            wait = self._bucket(key, limit or UNLIMITED).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def block(self, key: str, limit: Optional[Limit], delay: float) -> None:
+        """
+        Holds off every request to key for delay seconds.
+        """
+        self._bucket(key, limit or UNLIMITED).block(delay)
+        if limit is not None:
+            await self._eval(BLOCK, key, limit.interval, limit.tolerance, delay)
+
+    async def observe(
+        self,
+        key: str,
+        limit: Optional[Limit],
+        resp: Response,
+        max_wait: float = float("inf"),
+    ) -> Optional[float]:
+        """
+        Adjusts to what a response says about the limits. Returns how long to
+        wait before trying again if it was rate limited, None otherwise.
+        Other requests are held back for max_wait at most.
+        """
+        delay = retry_after(resp)
+        if resp.status_code == 429 and delay is None:
+            delay = DEFAULT_RETRY_AFTER
+        if delay:
+            logger.info(f"Rate limited by {key}, holding off for {delay:.1f}s")
+            await self.block(key, limit, min(delay, max_wait))
+        return delay if resp.status_code == 429 else None
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    async def _eval(self, script: str, key: str, *args: Any) -> Optional[float]:
+        if self.redis is None:
+            return None
+        try:
+            if script not in self._scripts:
+                self._scripts[script] = self.redis.register_script(script)
+            return float(
+                await self._scripts[script](keys=[self.prefix + key], args=args)
+            )
+        except Exception as e:
+            logger.warning(f"Rate limiter redis call failed: {e!r}")
+            return None
+
+
+limiter = RateLimiter()
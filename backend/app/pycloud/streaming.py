@@ -0,0 +1,160 @@
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# What matters when looking for where an item ends, inside a string and out
+STRING_SPECIAL = re.compile(r'["\\]')
+STRUCTURE = re.compile(r'[][{}"]')
+# Numbers, true, false and null run until one of these
+SCALAR_END = re.compile(r"[,\] \t\n\r]")
+
+
+class ArrayParser:
+    """
+    Incrementally parses a top level JSON array, fed the body a piece at a
+    time and handing back each item as soon as it's complete. Only the item
+    being parsed is buffered, never the whole body.
+
+    An item is only decoded once it has all arrived. Until then each chunk
+    is scanned for the item's end, picking up where the last chunk left off,
+    so an item split over many chunks costs one pass rather than a failed
+    decode from its start every time.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._done = False
+        self._items = 0
+        # How far into the buffer the current item has been scanned, and
+        # where it was in its nesting and strings by then
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+        self._end: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += self._utf8.decode(chunk)
+        return self._parse(final=False)
+
+    def close(self) -> List[Any]:
+        """
+        Parses whatever is left once the body has ended, raises ValueError if
+        it wasn't a whole array.
+        """
+        self._buffer += self._utf8.decode(b"", final=True)
+        items = self._parse(final=True)
+        if not self._done:
+            raise ValueError("JSON array ended early")
+        return items
+
+    def _parse(self, final: bool) -> List[Any]:
+        items: List[Any] = []
+        buffer, pos = self._buffer, 0
+        if not self._started:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                self._buffer = ""
+                return items
+            if buffer[pos] != "[":
+                raise ValueError(f"Expected a JSON array, got {buffer[pos:][:20]!r}")
+            pos += 1
+            self._started = True
+
+        while not self._done:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]" and not self._items:
+                self._done = True
+                break
+            value_end = self._item_end(buffer, pos)
+            if value_end is None:
+                if final:
+                    raise ValueError("JSON array ended early")
+                break
+            end = WHITESPACE.match(buffer, value_end).end()
+            # Only take an item once what follows it has arrived
+            if end == len(buffer):
+                if final:
+                    raise ValueError("JSON array ended early")
+                break
+            if buffer[end] not in ",]":
+                raise ValueError(f"Expected , or ] in JSON array at {end}")
+            item, decoded_end = self._decoder.raw_decode(buffer, pos)
+            if decoded_end != value_end:
+                raise ValueError(f"Unexpected data in JSON array at {decoded_end}")
+            items.append(item)
+            self._items += 1
+            self._scanned, self._end = 0, None
+            self._done = buffer[end] == "]"
+            pos = end + 1
+
+        self._buffer = buffer[pos:]
+        self._scanned = max(0, self._scanned - pos)
+        if self._end is not None:
+            self._end -= pos
+        return items
+
+    def _item_end(self, buffer: str, start: int) -> Optional[int]:
+        """
+        Where the item starting at start ends, or None if it hasn't all
+        arrived yet.
+        """
+        if self._end is not None:
+            return self._end
+        pos = max(start, self._scanned)
+        if buffer[start] not in '[{"':
+            match = SCALAR_END.search(buffer, pos)
+            if match is None:
+                self._scanned = len(buffer)
+                return None
+            self._end = match.start()
+            return self._end
+        while True:
+            if self._in_string:
+                match = STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    # Skip whatever is escaped, once it's here
+                    if match.end() == len(buffer):
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+            else:
+                match = STRUCTURE.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                pos = match.end()
+                if match.group() == '"':
+                    self._in_string = True
+                    continue
+                self._depth += 1 if match.group() in "[{" else -1
+            if self._depth == 0 and not self._in_string:
+                self._end = pos
+                return pos
+        self._scanned = pos
+        return None
+
+
+async def iter_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the items of the JSON array in chunks as they arrive, e.g. from
+    httpx's Response.aiter_bytes().
+    """
+    parser = ArrayParser()
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
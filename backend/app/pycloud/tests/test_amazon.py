@@ -1,6 +1,15 @@
+import threading
+import time
+from typing import Any, Dict, List
+
+import boto3
 import pytest
+from botocore.stub import Stubber
 
+import pycloud.controllers.amazon as amazon
 from pycloud import CloudFactory
+from pycloud.controllers.amazon import ClientCache
+from pycloud.locations import LocationIndex
 from pycloud.utils import current_month_date_range
 from pycloud.exc import AuthorizationError
 
@@ -46,3 +55,295 @@ async def test_get_instances() -> None:
     )
     instances = await client.get_instances()
     assert instances
+
+
+REGIONS = ["us-east-1", "us-west-1", "us-west-2", "eu-west-1", "eu-central-1"]
+
+
+def test_client_reused() -> None:
+    cache = ClientCache()
+
+    client = cache.client("key", "secret", "ec2", "us-east-1")
+
+    assert cache.client("key", "secret", "ec2", "us-east-1") is client
+    assert cache.client("key", "secret", "ec2", "us-west-1") is not client
+    assert cache.client("key", "rotated", "ec2", "us-east-1") is not client
+    assert client.meta.config.max_pool_connections == 20
+
+
+def test_least_recently_used_dropped() -> None:
+    cache = ClientCache(size=2)
+    first = cache.client("key", "secret", "ec2", "us-east-1")
+    second = cache.client("key", "secret", "ec2", "us-west-1")
+
+    # Using the first makes the second the oldest
+    cache.client("key", "secret", "ec2", "us-east-1")
+    cache.client("key", "secret", "ec2", "us-west-2")
+
+    assert cache.client("key", "secret", "ec2", "us-east-1") is first
+    assert cache.client("key", "secret", "ec2", "us-west-1") is not second
+
+
+def test_one_client_between_threads() -> None:
+    cache = ClientCache()
+    made = []
+
+    def make() -> None:
+        made.append(cache.client("key", "secret", "ec2", "us-east-1"))
+
+    threads = [threading.Thread(target=make) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in made}) == 1
+
+
+def test_resource_per_call() -> None:
+    cache = ClientCache()
+
+    first = cache.resource("key", "secret", "ec2", "us-east-1")
+    second = cache.resource("key", "secret", "ec2", "us-east-1")
+
+    # Resources aren't thread safe so each call gets its own, on the same client
+    assert first is not second
+    assert first.meta.client is second.meta.client
+    assert first.meta.client is cache.client("key", "secret", "ec2", "us-east-1")
+    assert first.meta.client.meta.region_name == "us-east-1"
+
+
+def test_client_made_once_per_region(monkeypatch) -> None:
+    made = []
+    make = boto3.session.Session.client
+
+    def client(self, *args, **kwargs):
+        made.append(kwargs["region_name"])
+        return make(self, *args, **kwargs)
+
+    monkeypatch.setattr(boto3.session.Session, "client", client)
+    cache = ClientCache()
+
+    # Three polls of every region
+    for _ in range(3):
+        for region in REGIONS:
+            cache.client("key", "secret", "ec2", region)
+
+    assert made == REGIONS
+
+
+@pytest.mark.benchmark
+def test_client_cache_benchmark() -> None:
+    cache = ClientCache()
+    for region in REGIONS:
+        cache.client("key", "secret", "ec2", region)
+
+    # Old behaviour, a new client for every region on every poll
+    start = time.monotonic()
+    for region in REGIONS:
+        boto3.client(
+            "ec2",
+            aws_access_key_id="key",
+            aws_secret_access_key="secret",
+            region_name=region,
+        )
+    fresh = time.monotonic() - start
+
+    start = time.monotonic()
+    for region in REGIONS:
+        cache.client("key", "secret", "ec2", region)
+    cached = time.monotonic() - start
+
+    assert (
+        cached * 100 < fresh
+    ), f"{len(REGIONS)} regions: new clients {fresh:.3f}s, cached {cached:.6f}s"
+
+
+AMAZON = {"access_key": "key", "secret_key": "secret"}
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    """
+    Stubs the EC2 clients the controller will get for REGIONS, describe_regions
+    answered once from us-east-1.
+    """
+    cache = ClientCache()
+    monkeypatch.setattr("pycloud.controllers.amazon.clients", cache)
+    monkeypatch.setattr("pycloud.controllers.amazon.regions", {})
+    monkeypatch.setattr("pycloud.controllers.amazon.locations", LocationIndex())
+    stubs = {}
+    for region in REGIONS:
+        stubs[region] = Stubber(cache.client("key", "secret", "ec2", region))
+        stubs[region].activate()
+    stubs["us-east-1"].add_response(
+        "describe_regions", {"Regions": [{"RegionName": r} for r in REGIONS]}
+    )
+    yield stubs
+    for stub in stubs.values():
+        stub.deactivate()
+
+
+def add_instances(stub: Stubber, region: str, states: List[str], page: int) -> None:
+    """
+    Queues describe_instances pages for states, page instances per page.
+    """
+    for offset in range(0, len(states), page):
+        instances = [
+            {
+                "InstanceId": f"i-{region}-{offset + i}",
+                "InstanceType": "t3.micro",
+                "State": {"Name": state, "Code": 16},
+                "PublicIpAddress": "10.0.0.1",
+                "Placement": {"AvailabilityZone": f"{region}a"},
+                "Tags": [{"Key": "Name", "Value": "worker"}],
+            }
+            for i, state in enumerate(states[offset : offset + page])
+        ]
+        response: Dict[str, Any] = {
+            "Reservations": [{"ReservationId": "r-1", "Instances": instances}]
+        }
+        if offset + page < len(states):
+            response["NextToken"] = str(offset + page)
+        stub.add_response("describe_instances", response)
+
+
+@pytest.mark.asyncio
+async def test_instance_breakdown(stubbed) -> None:
+    for i, region in enumerate(REGIONS):
+        add_instances(stubbed[region], region, ["running"] * i + ["stopped"], page=2)
+    client = CloudFactory.get_client("Amazon", AMAZON)
+
+    breakdown = await client.get_instance_breakdown()
+
+    assert breakdown.regions["us-east-1"] == {"stopped": 1}
+    assert breakdown.regions["eu-central-1"] == {"running": 4, "stopped": 1}
+    assert breakdown.states() == {"running": 10, "stopped": 5}
+    assert breakdown.total == 15
+
+    # The regions are remembered, describe_regions isn't stubbed a second time
+    for region in REGIONS:
+        add_instances(stubbed[region], region, ["running"], page=2)
+    assert await client.get_instance_count() == 5
+    for stub in stubbed.values():
+        stub.assert_no_pending_responses()
+
+
+@pytest.mark.asyncio
+async def test_instance_count_builds_nothing(stubbed, monkeypatch) -> None:
+    per_region = 2000
+    states = ["running", "stopped"] * (per_region // 2)
+    for region in REGIONS:
+        add_instances(stubbed[region], region, states, page=1000)
+
+    def resource(*args, **kwargs):
+        raise AssertionError("counting shouldn't build resources")
+
+    monkeypatch.setattr(amazon.clients, "resource", resource)
+    client = CloudFactory.get_client("Amazon", AMAZON)
+
+    breakdown = await client.get_instance_breakdown()
+
+    assert breakdown.total == per_region * len(REGIONS)
+    assert breakdown.states() == {
+        "running": per_region // 2 * len(REGIONS),
+        "stopped": per_region // 2 * len(REGIONS),
+    }
+    # describe_regions and two pages a region, nothing more
+    for stub in stubbed.values():
+        stub.assert_no_pending_responses()
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_instance_count_benchmark(stubbed) -> None:
+    per_region = 2000
+    states = ["running", "stopped"] * (per_region // 2)
+    # Once for each way of counting
+    for _ in range(2):
+        for region in REGIONS:
+            add_instances(stubbed[region], region, states, page=1000)
+    client = CloudFactory.get_client("Amazon", AMAZON)
+    await client.get_regions()
+
+    # Old behaviour, every instance built as a resource and a VirtualMachine
+    start = time.monotonic()
+    assert len(await client.get_instances()) == per_region * len(REGIONS)
+    materialised = time.monotonic() - start
+
+    start = time.monotonic()
+    assert await client.get_instance_count() == per_region * len(REGIONS)
+    counted = time.monotonic() - start
+
+    # Around 12x here, with room for a noisy machine
+    assert counted * 5 < materialised, (
+        f"{per_region * len(REGIONS)} instances: get_instances "
+        f"{materialised:.2f}s, count {counted:.3f}s"
+    )
+
+
+def add_instance(stub: Stubber, region: str, id: str, found: bool = True) -> None:
+    instances = [{"InstanceId": id, "State": {"Name": "running", "Code": 16}}]
+    stub.add_response(
+        "describe_instances",
+        {"Reservations": [{"Instances": instances}] if found else []},
+    )
+
+
+@pytest.mark.asyncio
+async def test_instance_found_where_last_seen(stubbed) -> None:
+    for region in REGIONS:
+        add_instances(stubbed[region], region, ["running"] * 2, page=2)
+    client = CloudFactory.get_client("Amazon", AMAZON)
+    await client.get_instance_count()
+
+    # Only eu-west-1 is stubbed, asking any other region would fail
+    add_instance(stubbed["eu-west-1"], "eu-west-1", "i-eu-west-1-1")
+    instance = await client.get_instance("i-eu-west-1-1")
+
+    assert instance and instance.id == "i-eu-west-1-1"
+    for stub in stubbed.values():
+        stub.assert_no_pending_responses()
+
+
+@pytest.mark.asyncio
+async def test_instance_never_seen(stubbed) -> None:
+    for region in REGIONS:
+        add_instance(stubbed[region], region, "i-new", found=region == "us-west-2")
+    client = CloudFactory.get_client("Amazon", AMAZON)
+
+    assert await client.get_instance("i-new")
+
+    # Found by the scan, from now on it's one call
+    add_instance(stubbed["us-west-2"], "us-west-2", "i-new")
+    assert await client.get_instance("i-new")
+    for stub in stubbed.values():
+        stub.assert_no_pending_responses()
+
+
+@pytest.mark.asyncio
+async def test_instance_moved_on(stubbed) -> None:
+    client = CloudFactory.get_client("Amazon", AMAZON)
+    await client.get_regions()
+    await amazon.locations.put(client.token_key(), {"i-gone": "us-east-1"})
+    # Not where it was and nowhere else either
+    add_instance(stubbed["us-east-1"], "us-east-1", "i-gone", found=False)
+    for region in REGIONS:
+        add_instance(stubbed[region], region, "i-gone", found=False)
+
+    assert await client.get_instance("i-gone") is None
+    assert await amazon.locations.get(client.token_key(), "i-gone") is None
+    for stub in stubbed.values():
+        stub.assert_no_pending_responses()
+
+
+@pytest.mark.asyncio
+async def test_locations_shared_between_processes() -> None:
+    fakeredis = pytest.importorskip("fakeredis.aioredis")
+    redis = fakeredis.FakeRedis(decode_responses=True)
+
+    await LocationIndex(redis=redis).put("account", {"i-1": "eu-west-1"})
+
+    assert await LocationIndex(redis=redis).get("account", "i-1") == "eu-west-1"
+    assert await LocationIndex(redis=redis).get("account", "i-2") is None
+    assert await LocationIndex(redis=redis).get("other", "i-1") is None
@@ -0,0 +1,214 @@
+import json
+from typing import Any, Dict, List
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.cache import tokens
+from pycloud.exc import AuthorizationError
+
+AZURE = {
+    "subscription_id": "sub",
+    "tenant_id": "tenant",
+    "client_id": "client",
+    "client_secret": "secret",
+}
+
+ROWS = [
+    {"type": "microsoft.compute/virtualmachines", "location": "eastus", "count_": 3},
+    {
+        "type": "microsoft.compute/virtualmachinescalesets/virtualmachines",
+        "location": "eastus",
+        "count_": 10,
+    },
+    {"type": "microsoft.web/sites", "location": "eastus", "count_": 2},
+    {"type": "microsoft.web/sites", "location": "westeurope", "count_": 4},
+    {"type": "microsoft.app/containerapps", "location": "westeurope", "count_": 1},
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_tokens():
+    tokens.clear()
+    yield
+    tokens.clear()
+
+
+def graph(pages: List[Dict[str, Any]], queries: List[Dict[str, Any]]):
+    def handler(request: Request) -> Response:
+        if request.url.path.endswith("/oauth2/token"):
+            return Response(200, json={"access_token": "token", "expires_in": 3600})
+        assert request.method == "POST"
+        assert request.url.path == "/providers/Microsoft.ResourceGraph/resources"
+        queries.append(json.loads(request.content))
+        return Response(200, json=pages[len(queries) - 1])
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_instance_breakdown(monkeypatch) -> None:
+    queries: List[Dict[str, Any]] = []
+    handler = graph([{"totalRecords": 5, "count": 5, "data": ROWS}], queries)
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    breakdown = await client.get_instance_breakdown()
+
+    assert breakdown.regions == {
+        "eastus": {"vm": 3, "vmss": 10, "app_service": 2},
+        "westeurope": {"app_service": 4, "container_app": 1},
+    }
+    assert breakdown.states() == {
+        "vm": 3,
+        "vmss": 10,
+        "app_service": 6,
+        "container_app": 1,
+    }
+    # One query for the whole subscription
+    assert len(queries) == 1
+    assert queries[0]["subscriptions"] == ["sub"]
+    assert "summarize count()" in queries[0]["query"]
+
+
+@pytest.mark.asyncio
+async def test_instance_breakdown_skip_token(monkeypatch) -> None:
+    queries: List[Dict[str, Any]] = []
+    pages = [
+        {"data": ROWS[:2], "$skipToken": "next"},
+        {"data": ROWS[2:]},
+    ]
+    monkeypatch.setattr(
+        "pycloud.base.session",
+        AsyncClient(transport=MockTransport(graph(pages, queries))),
+    )
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    # The virtual machines, not the App Service and container apps
+    assert await client.get_instance_count() == 13
+    assert "$skipToken" not in queries[0]["options"]
+    assert queries[1]["options"]["$skipToken"] == "next"
+
+
+@pytest.mark.asyncio
+async def test_instance_breakdown_forbidden(monkeypatch) -> None:
+    def handler(request: Request) -> Response:
+        if request.url.path.endswith("/oauth2/token"):
+            return Response(200, json={"access_token": "token", "expires_in": 3600})
+        return Response(403, json={"error": {"code": "AuthorizationFailed"}})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    with pytest.raises(AuthorizationError):
+        await client.get_instance_count()
+
+
+def costs(rows: List[List[Any]], requests: List[Request], columns: List[str]):
+    def handler(request: Request) -> Response:
+        if request.url.path.endswith("/oauth2/token"):
+            return Response(200, json={"access_token": "token", "expires_in": 3600})
+        requests.append(request)
+        if request.url.path.endswith("/usageDetails"):
+            return Response(
+                200,
+                json={
+                    "value": [
+                        {
+                            "properties": {
+                                "paygCostInUSD": 1.5,
+                                "servicePeriodStartDate": "2022-03-01T00:00:00Z",
+                                "servicePeriodEndDate": "2022-03-31T00:00:00Z",
+                            }
+                        }
+                    ]
+                    * 3
+                },
+            )
+        assert request.url.path.endswith("/Microsoft.CostManagement/query")
+        return Response(
+            200,
+            json={
+                "properties": {
+                    "columns": [{"name": name} for name in columns],
+                    "rows": rows,
+                }
+            },
+        )
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_current_invoiced_one_query(monkeypatch) -> None:
+    requests: List[Request] = []
+    handler = costs([[1234.567, "USD"]], requests, ["PreTaxCostUSD", "Currency"])
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    bill = await client.get_current_invoiced()
+
+    assert bill.total == 1234.57
+    assert bill.start_date.day == 1
+    # Summed by Azure, not downloaded and summed here
+    assert len(requests) == 1
+    body = json.loads(requests[0].content)
+    assert body["timeframe"] == "MonthToDate"
+    assert body["dataset"]["granularity"] == "None"
+
+
+@pytest.mark.asyncio
+async def test_current_invoiced_in_usd(monkeypatch) -> None:
+    requests: List[Request] = []
+    # Billed in euros, the USD cost is what's summed
+    handler = costs([[1100.0, "EUR"]], requests, ["PreTaxCostUSD", "Currency"])
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    bill = await client.get_current_invoiced()
+
+    assert client.currency() == "USD"
+    assert bill.total == 1100.0
+    aggregation = json.loads(requests[0].content)["dataset"]["aggregation"]
+    assert aggregation == {"totalCost": {"name": "PreTaxCostUSD", "function": "Sum"}}
+
+
+@pytest.mark.asyncio
+async def test_daily_costs(monkeypatch) -> None:
+    requests: List[Request] = []
+    rows = [[2.5, 20220302, "USD"], [1.0, 20220301, "USD"]]
+    handler = costs(rows, requests, ["totalCost", "UsageDate", "Currency"])
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    days = await client.get_daily_costs()
+
+    assert [(day.date.day, day.total) for day in days] == [(1, 1.0), (2, 2.5)]
+    assert json.loads(requests[0].content)["dataset"]["granularity"] == "Daily"
+
+
+@pytest.mark.asyncio
+async def test_itemized_usage(monkeypatch) -> None:
+    requests: List[Request] = []
+    monkeypatch.setattr(
+        "pycloud.base.session",
+        AsyncClient(transport=MockTransport(costs([], requests, []))),
+    )
+    monkeypatch.setattr("pycloud.controllers.Azure.itemized_usage", True)
+    client = CloudFactory.get_client("Azure", AZURE)
+
+    bill = await client.get_current_invoiced()
+
+    assert bill.total == 4.5
+    assert [r.url.path.split("/")[-1] for r in requests] == ["usageDetails"]
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.cache import REFRESH_MARGIN, Token, TokenCache, tokens
+
+AZURE = {
+    "subscription_id": "sub",
+    "tenant_id": "tenant",
+    "client_id": "client",
+    "client_secret": "secret",
+}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: str, ex: int = None) -> None:
+        self.data[key] = value
+
+    async def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+
+class Logins:
+    def __init__(self, expires_in: float = 3600):
+        self.count = 0
+        self.expires_in = expires_in
+
+    async def __call__(self) -> Token:
+        self.count += 1
+        await asyncio.sleep(0.01)
+        return Token.expiring(f"token-{self.count}", self.expires_in)
+
+
+@pytest.fixture(autouse=True)
+def clear_tokens():
+    tokens.clear()
+    yield
+    tokens.clear()
+
+
+@pytest.mark.asyncio
+async def test_single_flight() -> None:
+    cache = TokenCache()
+    login = Logins()
+
+    got = await asyncio.gather(*[cache.get("key", login) for _ in range(20)])
+
+    assert login.count == 1
+    assert {token.value for token in got} == {"token-1"}
+    # Done with, the lock isn't kept around
+    assert not cache._locks
+
+
+@pytest.mark.asyncio
+async def test_refresh_before_expiry() -> None:
+    cache = TokenCache()
+    # Expires within the margin, so it's never good enough to hand out
+    login = Logins(expires_in=REFRESH_MARGIN / 2)
+
+    first = await cache.get("key", login)
+    second = await cache.get("key", login)
+
+    assert first.expires_at > time.time()
+    assert (first.value, second.value) == ("token-1", "token-2")
+
+
+@pytest.mark.asyncio
+async def test_shared_between_processes() -> None:
+    redis = FakeRedis()
+    login = Logins()
+
+    first = await TokenCache(redis=redis).get("key", login)
+    second = await TokenCache(redis=redis).get("key", login)
+
+    assert login.count == 1
+    assert second == first
+
+
+@pytest.mark.asyncio
+async def test_invalidate_once() -> None:
+    redis = FakeRedis()
+    cache = TokenCache(redis=redis)
+    login = Logins()
+    stale = await cache.get("key", login)
+
+    await cache.invalidate("key", stale)
+    fresh = await cache.get("key", login)
+    # A late 401 for the old token leaves the new one alone
+    await cache.invalidate("key", stale)
+
+    assert login.count == 2
+    assert await cache.get("key", login) == fresh
+    assert redis.data
+
+
+@pytest.mark.asyncio
+async def test_azure_logs_in_once(monkeypatch) -> None:
+    requests: List[str] = []
+
+    def handler(request: Request) -> Response:
+        requests.append(request.url.path)
+        if request.url.path.endswith("/oauth2/token"):
+            return Response(200, json={"access_token": "token", "expires_in": 3600})
+        return Response(200, json={"value": []})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+
+    await asyncio.gather(
+        *[CloudFactory.get_client("Azure", AZURE).authenticate() for _ in range(10)]
+    )
+    await CloudFactory.get_client("Azure", AZURE).authenticate()
+
+    assert len([p for p in requests if p.endswith("/oauth2/token")]) == 1
+
+
+@pytest.mark.asyncio
+async def test_azure_reauth_on_401(monkeypatch) -> None:
+    logins = 0
+
+    def handler(request: Request) -> Response:
+        nonlocal logins
+        if request.url.path.endswith("/oauth2/token"):
+            logins += 1
+            return Response(
+                200, json={"access_token": f"token-{logins}", "expires_in": 3600}
+            )
+        # The first token gets revoked
+        if request.headers["Authorization"] == "Bearer token-1":
+            return Response(401, json={})
+        return Response(200, json={"value": []})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    clients = [CloudFactory.get_client("Azure", AZURE) for _ in range(10)]
+    for client in clients:
+        await client.authenticate()
+
+    resps = await asyncio.gather(
+        *[client.request("GET", "/subscriptions") for client in clients]
+    )
+
+    assert [r.status_code for r in resps] == [200] * len(clients)
+    assert logins == 2
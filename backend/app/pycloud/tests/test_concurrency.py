@@ -0,0 +1,204 @@
+import asyncio
+import base64
+import random
+from typing import Dict, List
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory, controllers
+from pycloud.utils import current_month_date_range
+
+ACCOUNTS = 50
+START, END = current_month_date_range()
+
+
+def credentials(i: int) -> str:
+    return f"acct-{i}"
+
+
+def identity(request: Request) -> int:
+    """
+    Works out which fake account sent the request from whatever credentials it carried.
+    """
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        value = auth[len("Bearer ") :]
+    elif auth.startswith("Basic "):
+        value = base64.b64decode(auth[len("Basic ") :]).decode().split(":")[0]
+    elif "X-Auth-Token" in request.headers:
+        value = request.headers["X-Auth-Token"]
+    elif "client_secret=" in request.content.decode():
+        value = request.content.decode().split("client_secret=")[1].split("&")[0]
+    elif b"apiKey" in request.content:
+        value = request.content.decode().split('"apiKey": "')[1].split('"')[0]
+    else:
+        value = request.url.params.get("session") or request.url.params["api_key"]
+    return int(value.rsplit("-", 1)[1])
+
+
+def route(request: Request, i: int) -> Response:
+    path = request.url.path
+    # DigitalOcean
+    if path == "/v2/customers/my/balance":
+        return Response(200, json={"month_to_date_usage": i})
+    # Heroku
+    if path == "/account/invoices":
+        return Response(
+            200,
+            json=[{"period_start": START.strftime("%Y-%m-%d"), "total": i * 100}],
+        )
+    # Rackspace
+    if path == "/v2.0/tokens":
+        return Response(
+            200,
+            json={"access": {"token": {"id": f"token-{i}"}, "serviceCatalog": []}},
+        )
+    if path.endswith("/estimated_charges"):
+        return Response(
+            200,
+            json={
+                "estimatedCharges": {
+                    "chargeTotal": i,
+                    "currentBillingPeriodStartDate": START.isoformat(),
+                    "currentBillingPeriodEndDate": END.isoformat(),
+                }
+            },
+        )
+    # Azure
+    if path.endswith("/oauth2/token"):
+        return Response(200, json={"access_token": f"token-{i}"})
+    if path.endswith("/Microsoft.CostManagement/query"):
+        return Response(
+            200,
+            json={
+                "properties": {
+                    "columns": [
+                        {"name": "PreTaxCostUSD", "type": "Number"},
+                        {"name": "Currency", "type": "String"},
+                    ],
+                    "rows": [[i, "USD"]],
+                }
+            },
+        )
+    if path.endswith("/usageDetails"):
+        return Response(
+            200,
+            json={
+                "value": [
+                    {
+                        "properties": {
+                            "paygCostInUSD": i,
+                            "servicePeriodStartDate": START.isoformat(),
+                            "servicePeriodEndDate": END.isoformat(),
+                        }
+                    }
+                ]
+            },
+        )
+    # Softlayer
+    if path.endswith("getLatestRecurringInvoice.json"):
+        return Response(200, json={"id": i, "createDate": END.isoformat()})
+    if path.endswith("getInvoiceTopLevelItems.json"):
+        assert path.split("/")[-2] == str(i)
+        return Response(
+            200, json=[{"id": i, "categoryCode": "server", "recurringFee": i}]
+        )
+    if path.endswith("getNonZeroAssociatedChildren.json"):
+        assert path.split("/")[-2] == str(i)
+        return Response(200, json=[])
+    # CloudSigma
+    if path == "/api/2.0/balance":
+        return Response(200, json={"balance": i})
+    if path == "/api/2.0/ledger":
+        return Response(
+            200, json={"meta": {"total_count": 1}, "objects": [{"amount": i}]}
+        )
+    # Jelastic
+    if path.endswith("getaccountbillinghistorybyperiod"):
+        return Response(200, json={"result": 0, "array": [{"cost": i}]})
+    if path.endswith("getaccount"):
+        return Response(200, json={"result": 0, "balance": i})
+    # Nexmo
+    if path == "/account/get-balance":
+        return Response(200, json={"value": i})
+    return Response(404, json={})
+
+
+async def handler(request: Request) -> Response:
+    i = identity(request)
+    # Shuffle the order requests complete in so accounts interleave
+    await asyncio.sleep(random.random() / 100)
+    return route(request, i)
+
+
+PROVIDERS: Dict[str, List[Dict[str, str]]] = {
+    "DigitalOcean": [{"api_key": credentials(i)} for i in range(ACCOUNTS)],
+    "Heroku": [{"api_key": credentials(i)} for i in range(ACCOUNTS)],
+    "Rackspace": [
+        {"username": "user", "api_key": credentials(i), "ran": str(i)}
+        for i in range(ACCOUNTS)
+    ],
+    "Azure": [
+        {
+            "subscription_id": str(i),
+            "tenant_id": str(i),
+            "client_id": "client",
+            "client_secret": credentials(i),
+        }
+        for i in range(ACCOUNTS)
+    ],
+    "Softlayer": [
+        {"account_name": credentials(i), "token": "token"} for i in range(ACCOUNTS)
+    ],
+    "CloudSigma": [
+        {"username": credentials(i), "password": "password", "endpoint": "zrh"}
+        for i in range(ACCOUNTS)
+    ],
+    "Jelastic": [
+        {"endpoint": "Eapps", "api_key": credentials(i)} for i in range(ACCOUNTS)
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    # Every fake account shares one host, pacing them would only slow this down
+    for name in PROVIDERS:
+        monkeypatch.setattr(getattr(controllers, name), "rate_limit", None)
+
+
+@pytest.mark.asyncio
+async def test_many_accounts_one_loop(monkeypatch) -> None:
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    clients = [
+        (i, CloudFactory.get_client(name, data))
+        for name, accounts in PROVIDERS.items()
+        for i, data in enumerate(accounts)
+    ]
+
+    bills = await asyncio.gather(
+        *[client.get_current_invoiced() for _, client in clients]
+    )
+
+    for (i, client), bill in zip(clients, bills):
+        assert bill.total == i, f"{type(client).__name__} account {i} got {bill.total}"
+
+
+@pytest.mark.asyncio
+async def test_sip_accounts_one_loop(monkeypatch) -> None:
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    clients = [
+        CloudFactory.get_client(
+            "Nexmo", {"api_key": credentials(i), "api_secret": "secret"}
+        )
+        for i in range(ACCOUNTS)
+    ]
+
+    bills = await asyncio.gather(*[client.get_current_invoiced() for client in clients])
+
+    assert [bill.balance for bill in bills] == list(range(ACCOUNTS))
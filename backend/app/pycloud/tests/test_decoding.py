@@ -0,0 +1,254 @@
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from httpx import Response
+import pytest
+from pydantic import BaseModel, Field, validator
+
+from pycloud.controllers.ibm.cf.organization import ListOrganiztionsResp
+from pycloud.controllers.ibm.cf.space import ListSpacesResp, SummaryResp
+from pycloud.decoding import construct, decode, loads
+
+# One collection of a Bluemix account: a page of organizations, a page of
+# their spaces and the summary of every space
+SPACES = 20
+APPS = 50
+CYCLES = 5
+
+
+def metadata(kind: str, i: int) -> Dict[str, Any]:
+    return {
+        "guid": f"{kind}-{i:08d}-5b2c-4f3e-9d7a-1c2b3a4d5e6f",
+        "url": f"/v2/{kind}s/{kind}-{i:08d}-5b2c-4f3e-9d7a-1c2b3a4d5e6f",
+        "created_at": "2021-06-14T09:12:45Z",
+        "updated_at": "2022-03-02T17:40:03Z",
+        "updated_by": None,
+    }
+
+
+def organizations() -> Dict[str, Any]:
+    urls = [
+        "quota_definition_url",
+        "spaces_url",
+        "domains_url",
+        "private_domains_url",
+        "users_url",
+        "managers_url",
+        "billing_managers_url",
+        "auditors_url",
+        "app_events_url",
+        "space_quota_definitions_url",
+    ]
+    return {
+        "total_results": 1,
+        "total_pages": 1,
+        "prev_url": None,
+        "next_url": None,
+        "resources": [
+            {
+                "metadata": metadata("organization", 0),
+                "entity": {
+                    "name": "production",
+                    "billing_enabled": True,
+                    "quota_definition_guid": "quota-0",
+                    "status": "active",
+                    "default_isolation_segment_guid": None,
+                    **{url: f"/v2/organizations/0/{url[:-4]}" for url in urls},
+                },
+            }
+        ],
+    }
+
+
+def spaces() -> Dict[str, Any]:
+    urls = [
+        "organization_url",
+        "developers_url",
+        "managers_url",
+        "auditors_url",
+        "apps_url",
+        "routes_url",
+        "domains_url",
+        "service_instances_url",
+        "app_events_url",
+        "events_url",
+        "security_groups_url",
+        "staging_security_groups_url",
+    ]
+    return {
+        "total_results": SPACES,
+        "total_pages": 1,
+        "prev_url": None,
+        "next_url": None,
+        "resources": [
+            {
+                "metadata": metadata("space", i),
+                "entity": {
+                    "name": f"space-{i}",
+                    "organization_guid": "organization-0",
+                    "space_quota_definition_guid": None,
+                    "isolation_segment_guid": None,
+                    "allow_ssh": True,
+                    **{url: f"/v2/spaces/{i}/{url[:-4]}" for url in urls},
+                },
+            }
+            for i in range(SPACES)
+        ],
+    }
+
+
+def app(i: int) -> Dict[str, Any]:
+    return {
+        "guid": f"app-{i:08d}-5b2c-4f3e-9d7a-1c2b3a4d5e6f",
+        "urls": [f"app-{i}.mybluemix.net", f"app-{i}.eu-gb.mybluemix.net"],
+        "routes": [
+            {
+                "guid": f"route-{i}-{r}",
+                "host": f"app-{i}",
+                "port": None,
+                "path": "",
+                "domain": {"guid": f"domain-{r}", "name": "mybluemix.net"},
+            }
+            for r in range(2)
+        ],
+        "service_count": 2,
+        "service_names": ["cloudant", "redis"],
+        "running_instances": 2,
+        "name": f"app-{i}",
+        "production": False,
+        "space_guid": "space-0",
+        "stack_guid": "stack-0",
+        "buildpack": "sdk-for-nodejs",
+        "detected_buildpack": "",
+        "detected_buildpack_guid": "buildpack-0",
+        "environment_json": {"NODE_ENV": "production", "PORT": "8080"},
+        "memory": 256,
+        "instances": 2,
+        "disk_quota": 1024,
+        "state": "STARTED",
+        "version": f"version-{i}",
+        "command": None,
+        "console": False,
+        "debug": None,
+        "staging_task_id": f"task-{i}",
+        "package_state": "STAGED",
+        "health_check_type": "port",
+        "health_check_timeout": None,
+        "health_check_http_endpoint": "",
+        "staging_failed_reason": None,
+        "staging_failed_description": None,
+        "diego": True,
+        "docker_image": None,
+        "package_updated_at": "2022-02-27T12:01:33Z",
+        "detected_start_command": "npm start",
+        "enable_ssh": True,
+        "ports": [8080],
+    }
+
+
+def summary() -> Dict[str, Any]:
+    return {
+        "guid": "space-0",
+        "name": "space-0",
+        "apps": [app(i) for i in range(APPS)],
+        "services": [{"guid": f"service-{i}", "name": "cloudant"} for i in range(2)],
+    }
+
+
+PAYLOADS = [
+    (ListOrganiztionsResp, json.dumps(organizations()).encode()),
+    (ListSpacesResp, json.dumps(spaces()).encode()),
+] + [(SummaryResp, json.dumps(summary()).encode())] * SPACES
+
+
+def collect(parse: Callable[[Response, Any], Any]) -> float:
+    start = time.process_time()
+    for _ in range(CYCLES):
+        for model, body in PAYLOADS:
+            parse(Response(200, content=body), model)
+    return (time.process_time() - start) / CYCLES
+
+
+def test_loads() -> None:
+    assert loads(b'{"a": [1, 2.5, null]}') == {"a": [1, 2.5, None]}
+    assert loads('"ü"') == "ü"
+    with pytest.raises(json.JSONDecodeError):
+        loads(b"[NaN]")
+    assert decode(Response(200, content=b'{"id": 1}')) == {"id": 1}
+
+
+validated: List[int] = []
+
+
+class Child(BaseModel):
+    value: int
+
+    @validator("value")
+    def counted(cls, value: int) -> int:
+        validated.append(value)
+        return value
+
+
+class Parent(BaseModel):
+    name: str = Field(alias="Name")
+    child: Optional[Child]
+    children: List[Child] = []
+    labels: Dict[str, str] = {}
+
+
+def test_construct() -> None:
+    validated.clear()
+    parent = construct(
+        Parent,
+        {"Name": "x", "child": {"value": 1}, "children": [{"value": 2}], "extra": 1},
+    )
+
+    assert validated == []
+    assert parent.name == "x"
+    assert parent.child == Child(value=1)
+    assert parent.children == [Child(value=2)]
+    assert parent.labels == {}
+    assert not hasattr(parent, "extra")
+    assert construct(Parent, {"name": "y", "child": None}).child is None
+
+
+def test_construct_matches_validation() -> None:
+    js = summary()
+
+    fast = construct(SummaryResp, js)
+
+    # Nothing is coerced, so only the datetimes differ
+    exclude = {"apps": {i: {"package_updated_at"} for i in range(APPS)}}
+    assert fast.dict(exclude=exclude) == SummaryResp(**js).dict(exclude=exclude)
+    assert fast.apps[3].routes[1].domain.name == "mybluemix.net"
+
+
+def test_collection_read_as_bytes(monkeypatch) -> None:
+    def text(self, **kwargs: Any) -> Any:
+        raise AssertionError("body decoded to a str")
+
+    # r.json() decodes the body to a str first, one way or another
+    monkeypatch.setattr(Response, "text", property(text))
+    monkeypatch.setattr(Response, "json", text)
+
+    parsed = [
+        construct(model, decode(Response(200, content=body)))
+        for model, body in PAYLOADS
+    ]
+
+    assert [type(p) for p in parsed] == [model for model, _ in PAYLOADS]
+    assert len(parsed[1].resources) == SPACES
+    assert all(len(summary.apps) == APPS for summary in parsed[2:])
+
+
+@pytest.mark.benchmark
+def test_collection_cpu() -> None:
+    before = collect(lambda r, model: model(**r.json()))
+    after = collect(lambda r, model: construct(model, decode(r)))
+
+    size = sum(len(body) for _, body in PAYLOADS) >> 10
+    assert after * 3 < before, (
+        f"{size}KiB a collection: r.json() and validating {before * 1000:.1f}ms, "
+        f"decode() and construct() {after * 1000:.1f}ms"
+    )
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable
+
+import pytest
+from asgiref.sync import sync_to_async
+
+from pycloud import CloudFactory
+from pycloud.executor import ProviderExecutor, configure_executor
+
+REGIONS = [f"region-{i}" for i in range(17)]
+SDK_DELAY = 0.1
+
+
+class Collection:
+    """
+    ec2.instances of every region, each all() call blocking in wait.
+    """
+
+    def __init__(self, wait: Callable[[], None]):
+        self.wait = wait
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def filter(self, **kwargs):
+        return self
+
+    def all(self):
+        with self._lock:
+            self.calls += 1
+        self.wait()
+        return []
+
+
+class RegionsClient:
+    def describe_regions(self):
+        return {"Regions": [{"RegionName": r} for r in REGIONS]}
+
+
+def amazon(monkeypatch, collection: Collection):
+    clients = SimpleNamespace(
+        client=lambda *args, **kwargs: RegionsClient(),
+        resource=lambda *args, **kwargs: SimpleNamespace(instances=collection),
+    )
+    monkeypatch.setattr("pycloud.controllers.amazon.clients", clients)
+    monkeypatch.setattr("pycloud.controllers.amazon.regions", {})
+    configure_executor("Amazon", 20)
+    return CloudFactory.get_client(
+        "Amazon",
+        {
+            "access_key": "asdf",
+            "secret_key": "asdf",
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_region_scan_overlaps(monkeypatch) -> None:
+    # Every region waits for all the others, so this only returns if the
+    # calls run at the same time
+    regions = threading.Barrier(len(REGIONS), timeout=5)
+    collection = Collection(regions.wait)
+    client = amazon(monkeypatch, collection)
+
+    assert await client.get_instances() == []
+    assert collection.calls == len(REGIONS)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_region_scan_benchmark(monkeypatch) -> None:
+    collection = Collection(lambda: time.sleep(SDK_DELAY))
+    client = amazon(monkeypatch, collection)
+
+    # Old behaviour, thread sensitive sync_to_async runs every region one after another
+    start = time.monotonic()
+    await asyncio.gather(*[sync_to_async(collection.all)() for _ in REGIONS])
+    sequential = time.monotonic() - start
+
+    start = time.monotonic()
+    assert await client.get_instances() == []
+    pooled = time.monotonic() - start
+
+    assert pooled * 4 < sequential, (
+        f"{len(REGIONS)} regions: sync_to_async {sequential:.2f}s, "
+        f"executor {pooled:.2f}s"
+    )
+
+
+@pytest.mark.asyncio
+async def test_executor_stats() -> None:
+    executor = ProviderExecutor("test", max_workers=2)
+    await asyncio.gather(*[executor.run(time.sleep, SDK_DELAY) for _ in range(6)])
+
+    stats = executor.stats()
+    assert stats.submitted == 6
+    assert stats.queued == 0
+    assert stats.running == 0
+    # Only two threads so the last calls had to wait for two rounds
+    assert stats.wait_max >= SDK_DELAY * 2 * 0.9
+    assert stats.wait_avg > 0
+    executor.shutdown()
@@ -1,8 +1,13 @@
-import itertools
 import asyncio
+import time
+from typing import Any, Dict, List
 
 import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
 
+from pycloud import CloudFactory
+from pycloud.cache import tokens
+from pycloud.controllers import Bluemix
 from pycloud.controllers.ibm import IBMApi
 
 IBM_API_KEY = ""
@@ -75,4 +80,183 @@ async def test_get_apps():
     assert len(organizations) > 0
     spaces = await organizations[0].get_spaces()
     assert len(spaces) > 0
-    apps = (await spaces[0].get_info()).apps
+    assert isinstance((await spaces[0].get_info()).apps, list)
+
+
+def region(name: str) -> Dict[str, Any]:
+    description = {"name": name, "display_name": name}
+    return {
+        "id": f"ibm:yp:{name}",
+        "domain": f"{name}.cf.appdomain.cloud",
+        "name": f"ibm:yp:{name}",
+        "region": name,
+        "display_name": name,
+        "customer": description,
+        "deployment": description,
+        "geo": description,
+        "public_regions_by_proximity": [],
+        "console_url": "https://cloud.ibm.com",
+        "cf_api": f"https://api.{name}.cf.cloud.ibm.com",
+        "mccp_api": f"https://mccp.{name}.cf.cloud.ibm.com",
+        "type": "public",
+        "home": name == "us-south",
+        "aliases": [],
+        "settings": {"devops": {"enabled": False}},
+    }
+
+
+REGIONS = ["us-south", "us-east", "eu-gb", "eu-de", "jp-tok", "au-syd"]
+# No Cloud Foundry in this one
+NO_CF = "au-syd"
+SERVICES = [
+    ("cloudantnosqldb", "us-south"),
+    ("cloudantnosqldb", "eu-gb"),
+    ("codeengine", "us-south"),
+    ("databases-for-redis", "us-south"),
+    ("cloud-object-storage", "global"),
+]
+INSTANCES = 250
+
+
+def instance(i: int) -> Dict[str, Any]:
+    service, location = SERVICES[i % len(SERVICES)]
+    return {
+        "id": f"crn:v1:bluemix:public:{service}:{location}:a/account:{i}::",
+        "guid": str(i),
+        "crn": f"crn:v1:bluemix:public:{service}:{location}:a/account:{i}::",
+        "name": f"instance-{i}",
+        "region_id": location,
+        "resource_id": service,
+        "type": "service_instance",
+        "state": "active",
+    }
+
+
+class FakeIBM:
+    def __init__(self):
+        self.requests: List[Request] = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def __call__(self, request: Request) -> Response:
+        self.requests.append(request)
+        host, path = request.url.host, request.url.path
+        if host == "iam.cloud.ibm.com" and path == "/identity/token":
+            return Response(
+                200,
+                json={
+                    "access_token": "token",
+                    "refresh_token": "refresh",
+                    "ims_user_id": 1,
+                    "token_type": "Bearer",
+                    "expires_in": 3600,
+                    "expiration": int(time.time()) + 3600,
+                    "scope": "ibm openid",
+                },
+            )
+        if path.startswith("/cloudfoundry/login/"):
+            if path.split("/")[3] == NO_CF:
+                return Response(400, json={"errorCode": "BXNIM0207E"})
+            return Response(
+                200,
+                json={
+                    "access_token": "cf",
+                    "refresh_token": "refresh",
+                    "token_type": "bearer",
+                    "id_token": "id",
+                    "expires_in": 3600,
+                    "scope": "cloud_controller.read",
+                    "jti": "jti",
+                },
+            )
+        if path == "/v2/regions":
+            return Response(200, json=[region(name) for name in REGIONS])
+        if path == "/v3/apps":
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            apps = REGIONS.index(host.split(".")[1]) + 1
+            return Response(200, json={"pagination": {"total_results": apps}})
+        if path == "/v2/resource_instances":
+            start = int(request.url.params.get("start", 0))
+            limit = int(request.url.params["limit"])
+            end = min(start + limit, INSTANCES)
+            next = f"/v2/resource_instances?limit={limit}&start={end}"
+            return Response(
+                200,
+                json={
+                    "rows_count": end - start,
+                    "next_url": next if end < INSTANCES else None,
+                    "resources": [instance(i) for i in range(start, end)],
+                },
+            )
+        return Response(404, json={})
+
+
+@pytest.fixture
+def fake_ibm(monkeypatch) -> FakeIBM:
+    server = FakeIBM()
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(server))
+    )
+    monkeypatch.setattr(Bluemix, "region_fanout", 2)
+    tokens.clear()
+    yield server
+    tokens.clear()
+
+
+@pytest.mark.asyncio
+async def test_bluemix_breakdown(fake_ibm: FakeIBM) -> None:
+    client = CloudFactory.get_client(
+        "Bluemix", {"account_name": "account", "sl_apikey": "sl", "ibm_apikey": "ibm"}
+    )
+
+    breakdown = await client.get_instance_breakdown()
+
+    assert breakdown.regions == {
+        "us-south": {
+            "cloudantnosqldb": 50,
+            "codeengine": 50,
+            "databases-for-redis": 50,
+            "cf_app": 1,
+        },
+        "eu-gb": {"cloudantnosqldb": 50, "cf_app": 3},
+        "global": {"cloud-object-storage": 50},
+        "us-east": {"cf_app": 2},
+        "eu-de": {"cf_app": 4},
+        "jp-tok": {"cf_app": 5},
+    }
+    assert breakdown.total == INSTANCES + 15
+    # No org, space or summary walk: a listing page per 100 instances and
+    # an app count per region
+    paths = [r.url.path for r in fake_ibm.requests]
+    assert paths.count("/v2/resource_instances") == 3
+    assert paths.count("/v3/apps") == len(REGIONS) - 1
+    assert not [p for p in paths if "/summary" in p or "/v2/organizations" in p]
+    assert fake_ibm.most_in_flight <= 2
+
+
+@pytest.mark.asyncio
+async def test_login_cached(fake_ibm: FakeIBM) -> None:
+    def client() -> AsyncClient:
+        return AsyncClient(transport=MockTransport(fake_ibm))
+
+    api = IBMApi("ibm", client())
+    await api.login()
+    assert api.token.access_token == "token"
+    assert api.token.expires_in == 3600
+    assert api.headers == {"Authorization": "Bearer token"}
+
+    cf = await (await api.get_regions())[0].cf()
+    assert cf.token.id_token == "id"
+    assert cf.headers == {"Authorization": "Bearer cf"}
+
+    # Another client for the same key logs in from the cache
+    again = IBMApi("ibm", client())
+    await again.login()
+    assert again.token == api.token
+    assert (await (await again.get_regions())[0].cf()).token == cf.token
+    paths = [r.url.path for r in fake_ibm.requests]
+    assert paths.count("/identity/token") == 1
+    assert paths.count("/cloudfoundry/login/us-south/oauth/token") == 1
@@ -0,0 +1,85 @@
+from typing import Any, Dict
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.invoices import FinalizedInvoices, InvoiceBackend, invoices
+from pycloud.utils import current_month_date_range
+
+
+class BrokenBackend(InvoiceBackend):
+    async def get(self, *args: Any) -> Dict[str, Any]:
+        raise ConnectionError("database is down")
+
+    async def put(self, *args: Any) -> None:
+        raise ConnectionError("database is down")
+
+
+@pytest.fixture(autouse=True)
+def clear_invoices(monkeypatch):
+    monkeypatch.setattr(invoices, "backend", InvoiceBackend())
+
+
+@pytest.mark.asyncio
+async def test_digitalocean_paid_invoice_stored(monkeypatch) -> None:
+    month = current_month_date_range()[1].strftime("%Y-%m")
+    calls = 0
+
+    def handler(request: Request) -> Response:
+        nonlocal calls
+        calls += 1
+        return Response(
+            200,
+            json={
+                "invoices": [{"status": "paid", "date": {"month": month}, "total": 12}]
+            },
+        )
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("DigitalOcean", {"api_key": "key"})
+
+    bills = [await client._get_current_invoiced() for _ in range(3)]
+
+    assert [bill.total for bill in bills] == [12, 12, 12]
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_heroku_open_invoice_refetched(monkeypatch) -> None:
+    start = current_month_date_range()[0].strftime("%Y-%m-%d")
+    state = 0
+    calls = 0
+
+    def handler(request: Request) -> Response:
+        nonlocal calls
+        calls += 1
+        return Response(
+            200, json=[{"period_start": start, "total": 100 * calls, "state": state}]
+        )
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Heroku", {"api_key": "key"})
+
+    # Pending, so it's asked for every time until it's paid
+    assert (await client.get_current_invoiced()).total == 1
+    state = 1
+    assert (await client.get_current_invoiced()).total == 2
+    assert (await client.get_current_invoiced()).total == 2
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_backend_errors_ignored() -> None:
+    store = FinalizedInvoices(BrokenBackend())
+
+    async def fetch(id: str) -> Dict[str, Any]:
+        return {"id": id}
+
+    found = await store.fetch("Provider", "account", ["1", "2"], fetch, bool)
+
+    assert found == {"1": {"id": "1"}, "2": {"id": "2"}}
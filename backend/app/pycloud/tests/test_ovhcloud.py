@@ -1,6 +1,16 @@
+import asyncio
+import hashlib
+import time
+from typing import List
+
 import pytest
+from dateutil.relativedelta import relativedelta
+from httpx import AsyncClient, MockTransport, Request, Response
 
 from pycloud import CloudFactory
+from pycloud.controllers import OVHCloud
+from pycloud.controllers.ovhcloud import time_deltas
+from pycloud.invoices import InvoiceBackend, invoices
 from pycloud.utils import current_month_date_range
 from pycloud.exc import AuthorizationError
 
@@ -37,3 +47,154 @@ async def test_wrong_cred() -> None:
 
     with pytest.raises(AuthorizationError):
         await client.get_current_billing()
+
+
+OVH = {
+    "endpoint": "ovh-eu",
+    "app_key": "key",
+    "app_secret": "secret",
+    "consumer_key": "consumer",
+    "project_id": "project",
+}
+# The fake API's clock runs a minute ahead of ours
+SKEW = 60
+
+
+class FakeOvh:
+    """
+    The bill endpoints, checking every request is signed like the ovh SDK
+    would sign it. There's a bill on the first of every month, FR0 this
+    month's, each for 100 plus its number.
+    """
+
+    def __init__(self, months: int, latency: float = 0.01):
+        self.latency = latency
+        first = current_month_date_range()[0]
+        self.bills = {f"FR{i}": first - relativedelta(months=i) for i in range(months)}
+        self.requests: List[str] = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def __call__(self, request: Request) -> Response:
+        path = request.url.path.replace("/1.0", "", 1)
+        if path == "/auth/time":
+            return Response(200, json=int(time.time()) + SKEW)
+        self.requests.append(path)
+        if request.headers["X-Ovh-Consumer"] != "consumer":
+            return Response(403, json={"errorCode": "INVALID_CREDENTIAL"})
+
+        timestamp = request.headers["X-Ovh-Timestamp"]
+        expected = hashlib.sha1(
+            f"secret+consumer+{request.method}+{request.url}++{timestamp}".encode()
+        ).hexdigest()
+        if request.headers["X-Ovh-Signature"] != f"$1${expected}":
+            return Response(400, json={"message": "Invalid signature"})
+        if abs(int(timestamp) - time.time() - SKEW) > 2:
+            return Response(400, json={"message": "Query out of time"})
+
+        if path == "/me/bill":
+            since = request.url.params.get("date.from")
+            return Response(
+                200,
+                json=[
+                    id
+                    for id, date in self.bills.items()
+                    if since is None or date.strftime("%Y-%m-%d") >= since
+                ],
+            )
+        if path.startswith("/me/bill/"):
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+            await asyncio.sleep(self.latency)
+            self.in_flight -= 1
+            id = path.rsplit("/", 1)[1]
+            return Response(
+                200,
+                json={
+                    "date": self.bills[id].isoformat(),
+                    "priceWithTax": {"value": 100 + int(id[2:])},
+                },
+            )
+        return Response(404, json={"message": "Not found"})
+
+
+@pytest.fixture(autouse=True)
+def clear_state(monkeypatch):
+    monkeypatch.setattr(invoices, "backend", InvoiceBackend())
+    time_deltas.clear()
+    yield
+    time_deltas.clear()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def install(months: int) -> FakeOvh:
+        server = FakeOvh(months)
+        monkeypatch.setattr(
+            "pycloud.base.session", AsyncClient(transport=MockTransport(server))
+        )
+        return server
+
+    return install
+
+
+@pytest.mark.asyncio
+async def test_latest_bill_signed(fake) -> None:
+    server = fake(months=36)
+    client = CloudFactory.get_client("OVHCloud", OVH)
+
+    bill = await client.get_current_invoiced()
+
+    # This month's, found without listing or downloading the other 33
+    assert bill.total == 100
+    assert server.requests == [
+        "/me/bill",
+        "/me/bill/FR0",
+        "/me/bill/FR1",
+        "/me/bill/FR2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_details_in_parallel(fake, monkeypatch) -> None:
+    server = fake(months=36)
+    # Nothing in the last year, so every bill has to be looked at
+    server.bills = {
+        id: date - relativedelta(years=2) for id, date in server.bills.items()
+    }
+    monkeypatch.setattr(OVHCloud, "bill_fanout", 4)
+    client = CloudFactory.get_client("OVHCloud", OVH)
+
+    bill = await client.get_current_invoiced()
+
+    assert bill.total == 100
+    # Three tries at the list, then the details
+    assert len(server.requests) == 3 + 36
+    # 36 bills four at a time rather than one after another
+    assert server.most_in_flight == 4
+
+
+@pytest.mark.asyncio
+async def test_only_new_bills(fake) -> None:
+    server = fake(months=3)
+    await CloudFactory.get_client("OVHCloud", OVH).get_current_invoiced()
+
+    server.requests.clear()
+    server.bills["FR99"] = current_month_date_range()[0] + relativedelta(days=1)
+    bill = await CloudFactory.get_client("OVHCloud", OVH).get_current_invoiced()
+
+    # The list and the bill issued since
+    assert server.requests == ["/me/bill", "/me/bill/FR99"]
+    assert bill.total == 199
+
+
+@pytest.mark.asyncio
+async def test_errors(fake) -> None:
+    fake(months=1)
+    client = CloudFactory.get_client("OVHCloud", {**OVH, "consumer_key": "wrong"})
+    with pytest.raises(AuthorizationError, match="consumer key"):
+        await client.get_current_invoiced()
+
+    client = CloudFactory.get_client("OVHCloud", {**OVH, "app_secret": "wrong"})
+    with pytest.raises(AuthorizationError, match="application key"):
+        await client.get_current_invoiced()
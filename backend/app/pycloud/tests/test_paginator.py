@@ -0,0 +1,213 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.exc import AuthorizationError
+from pycloud.paginator import (
+    LinkPaginator,
+    OffsetPaginator,
+    RangePaginator,
+    page_number,
+)
+
+LATENCY = 0.01
+
+
+class FakeList:
+    """
+    A list endpoint over items that pages every way the paginators know,
+    never giving out more than cap at once.
+    """
+
+    def __init__(self, items: int, cap: int = 1000):
+        self.items = list(range(items))
+        self.cap = cap
+        self.requests: List[Request] = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        # Stands in for a provider's request method
+        self.request = AsyncClient(transport=MockTransport(self)).request
+
+    async def __call__(self, request: Request) -> Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        await asyncio.sleep(LATENCY)
+        self.in_flight -= 1
+
+        params = request.url.params
+        if "Range" in request.headers:
+            # "id ..; max=1000" to start with, then "id ]100..; max=100"
+            start = int(request.headers["Range"].split()[1].strip("].;") or 0)
+            page = self.items[start : start + 100]
+            headers = {}
+            if start + 100 < len(self.items):
+                headers["Next-Range"] = f"id ]{start + 100}..; max=100"
+            return Response(206 if headers else 200, json=page, headers=headers)
+        if "skip" in params:
+            start = int(params["skip"])
+            page = self.items[start : start + 100]
+            next: Optional[str] = None
+            if start + 100 < len(self.items):
+                next = f"https://list.example/items?skip={start + 100}"
+            return Response(200, json={"value": page, "nextLink": next})
+        if "page" in params:
+            limit = min(int(params["per_page"]), self.cap)
+            offset = (int(params["page"]) - 1) * limit
+        else:
+            limit = min(int(params["limit"]), self.cap)
+            offset = int(params["offset"])
+        return Response(
+            200,
+            json={
+                "objects": self.items[offset : offset + limit],
+                "meta": {"total_count": len(self.items)},
+            },
+        )
+
+
+def offsets(server: FakeList, **kwargs: Any) -> OffsetPaginator:
+    return OffsetPaginator(
+        server.request,
+        "https://list.example/items",
+        items=lambda js: js["objects"],
+        **kwargs,
+    )
+
+
+def total(r: Response, js: Dict[str, Any]) -> int:
+    return js["meta"]["total_count"]
+
+
+@pytest.mark.asyncio
+async def test_link() -> None:
+    server = FakeList(250)
+    pages = LinkPaginator(
+        server.request,
+        "https://list.example/items",
+        params={"skip": 0},
+        items=lambda js: js["value"],
+    )
+
+    assert await pages.all() == server.items
+    assert [r.url.params["skip"] for r in server.requests] == ["0", "100", "200"]
+
+
+@pytest.mark.asyncio
+async def test_offset_concurrent() -> None:
+    server = FakeList(1050)
+    serial = await offsets(server, total=total, fanout=1).all()
+    assert server.most_in_flight == 1
+    server.requests.clear()
+
+    items = await offsets(server, total=total, fanout=4).all()
+
+    # In order, nothing missed or repeated
+    assert items == serial == server.items
+    assert len(server.requests) == 11
+    assert server.most_in_flight == 4
+
+
+@pytest.mark.asyncio
+async def test_offset_capped() -> None:
+    server = FakeList(1050, cap=30)
+
+    items = await offsets(
+        server, total=total, page_size=100, page_params=page_number()
+    ).all()
+
+    assert items == server.items
+    # Every page after the first asked for what the server would give
+    assert {r.url.params["per_page"] for r in server.requests[1:]} == {"30"}
+
+
+@pytest.mark.asyncio
+async def test_offset_without_total() -> None:
+    server = FakeList(250)
+
+    assert await offsets(server).count() == 250
+    # Until a page came back short
+    assert len(server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_offset_stopped_early() -> None:
+    server = FakeList(1050)
+
+    async for item in offsets(server, total=total):
+        break
+    await asyncio.sleep(LATENCY * 2)
+
+    # The pages already on their way were called off
+    assert server.in_flight == 0
+    assert len(server.requests) <= 1 + 8
+
+
+@pytest.mark.asyncio
+async def test_range() -> None:
+    server = FakeList(250)
+
+    pages = RangePaginator(server.request, "https://list.example/items")
+
+    assert await pages.all() == server.items
+    assert [r.headers["Range"] for r in server.requests] == [
+        "id ..; max=1000",
+        "id ]100..; max=100",
+        "id ]200..; max=100",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_droplets_every_page(monkeypatch) -> None:
+    def handler(request: Request) -> Response:
+        page = int(request.url.params["page"])
+        per_page = int(request.url.params["per_page"])
+        ids = range((page - 1) * per_page, min(page * per_page, 450))
+        droplets = [
+            {
+                "id": i,
+                "name": f"droplet-{i}",
+                "status": "active",
+                "networks": {"v4": [{"ip_address": "10.0.0.1", "type": "public"}]},
+                "tags": [],
+            }
+            for i in ids
+        ]
+        return Response(200, json={"droplets": droplets, "meta": {"total": 450}})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("DigitalOcean", {"api_key": "key"})
+
+    droplets = await client.get_instances()
+
+    assert [d.id for d in droplets] == [str(i) for i in range(450)]
+    assert droplets[0].ip == "10.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_heroku_apps_every_range(monkeypatch) -> None:
+    def handler(request: Request) -> Response:
+        if request.headers["Range"] == "id ..; max=1000":
+            return Response(
+                206, json=[{}] * 1000, headers={"Next-Range": "id ]app-999..; max=1000"}
+            )
+        return Response(200, json=[{}] * 20)
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Heroku", {"api_key": "key"})
+    assert await client.get_instance_count() == 1020
+
+    monkeypatch.setattr(
+        "pycloud.base.session",
+        AsyncClient(transport=MockTransport(lambda request: Response(401))),
+    )
+    client = CloudFactory.get_client("Heroku", {"api_key": "key"})
+    with pytest.raises(AuthorizationError):
+        await client.get_instance_count()
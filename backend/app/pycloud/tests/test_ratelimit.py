@@ -0,0 +1,151 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.controllers import Softlayer
+from pycloud.exc import RateLimit
+from pycloud.ratelimit import Limit, RateLimiter, limiter, retry_after
+
+SOFTLAYER = {"account_name": "account", "token": "token"}
+BLUEMIX = {"account_name": "account", "sl_apikey": "key", "ibm_apikey": "key"}
+
+
+@pytest.fixture(autouse=True)
+def clear_buckets():
+    limiter.clear()
+    yield
+    limiter.clear()
+
+
+@pytest.mark.parametrize(
+    "headers,expected",
+    [
+        ({}, None),
+        ({"Retry-After": "12"}, 12),
+        ({"Retry-After": "{date}"}, 60),
+        ({"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": "30"}, None),
+        ({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "30"}, 30),
+        ({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "{epoch}"}, 30),
+        ({"RateLimit-Remaining": "0", "RateLimit-Reset": "5"}, 5),
+    ],
+)
+def test_retry_after(headers, expected) -> None:
+    now = time.time()
+    fill = {"date": formatdate(now + 60, usegmt=True), "epoch": str(now + 30)}
+    headers = {k: v.format(**fill) for k, v in headers.items()}
+
+    delay = retry_after(Response(200, headers=headers))
+
+    if expected is None:
+        assert delay is None
+    else:
+        # HTTP dates only have whole seconds
+        assert delay == pytest.approx(expected, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_bucket_paces() -> None:
+    limit = Limit(rate=100, burst=5)
+    start = time.monotonic()
+
+    await asyncio.gather(*[limiter.acquire("key", limit) for _ in range(15)])
+
+    # The burst goes straight away, the other ten wait their turn
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_shared_between_processes() -> None:
+    fakeredis = pytest.importorskip("fakeredis.aioredis")
+    redis = fakeredis.FakeRedis()
+    limit = Limit(rate=20, burst=2)
+    workers = [RateLimiter(redis=redis), RateLimiter(redis=redis)]
+    start = time.monotonic()
+
+    await asyncio.gather(*[workers[i % 2].acquire("key", limit) for i in range(6)])
+
+    # Each worker alone would fit its three in the burst and one interval
+    assert time.monotonic() - start >= 0.19
+
+
+@pytest.mark.asyncio
+async def test_waits_out_429(monkeypatch) -> None:
+    calls = 0
+
+    def handler(request: Request) -> Response:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return Response(429, headers={"Retry-After": "0.1"})
+        return Response(200, json={})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+    start = time.monotonic()
+
+    r = await client.request("GET", "/rest/v3.1/SoftLayer_Account.json")
+
+    assert r.status_code == 200
+    assert calls == 2
+    assert time.monotonic() - start >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_gives_up(monkeypatch) -> None:
+    def handler(request: Request) -> Response:
+        return Response(429, headers={"Retry-After": "0"})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+
+    with pytest.raises(RateLimit):
+        await client.request("GET", "/rest/v3.1/SoftLayer_Account.json")
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_fails_fast(monkeypatch) -> None:
+    def handler(request: Request) -> Response:
+        return Response(429, headers={"Retry-After": "3600"})
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    monkeypatch.setattr(Softlayer, "rate_limit_max_wait", 0.1)
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+
+    with pytest.raises(RateLimit):
+        await client.request("GET", "/rest/v3.1/SoftLayer_Account.json")
+    # Everyone else is only held back as long as we'd have waited
+    start = time.monotonic()
+    await limiter.acquire("Softlayer:api.softlayer.com", Softlayer.rate_limit)
+    assert time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_softlayer_and_bluemix_share_buckets(monkeypatch) -> None:
+    keys = []
+    acquire = limiter.acquire
+
+    async def recorded(key, limit) -> None:
+        keys.append(key)
+        await acquire(key, limit)
+
+    monkeypatch.setattr(limiter, "acquire", recorded)
+    monkeypatch.setattr(
+        "pycloud.base.session",
+        AsyncClient(transport=MockTransport(lambda request: Response(200, json={}))),
+    )
+
+    for name, data in (("Softlayer", SOFTLAYER), ("Bluemix", BLUEMIX)):
+        client = CloudFactory.get_client(name, data)
+        await client.request("GET", "/rest/v3.1/SoftLayer_Account.json")
+
+    assert keys == ["Softlayer:api.softlayer.com"] * 2
@@ -0,0 +1,234 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.controllers import Bluemix, Softlayer
+from pycloud.controllers.softlayer_billing import (
+    FANOUT,
+    InvoiceCache,
+    accounts,
+    invoices,
+    matches,
+)
+from pycloud.invoices import InvoiceBackend, invoices as finalized
+
+ITEMS = 500
+CHILDREN = 3
+LATENCY = 0.002
+# Every fifth item is a PaaS one, which Bluemix bills for
+PAAS = ITEMS // 5
+# Every item costs 1.00 and each of its children 0.10
+ITEM_TOTAL = 1 + CHILDREN * 0.1
+
+SOFTLAYER = {"account_name": "account", "token": "token"}
+BLUEMIX = {"account_name": "account", "sl_apikey": "key", "ibm_apikey": "key"}
+
+
+class FakeSoftlayer:
+    """
+    Just enough of the SoftLayer billing API, honouring object masks and
+    resultLimit, and optionally refusing the nested children masks.
+    """
+
+    def __init__(self, nested: bool = True):
+        self.nested = nested
+        self.requests: List[str] = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def item(self, i: int, mask: str, children: str) -> Dict[str, Any]:
+        item = {
+            "id": i,
+            "categoryCode": "paas_cf" if i % 5 == 0 else "server",
+            "recurringFee": "1.00",
+            "cycleStartDate": "2022-06-01T00:00:00-06:00",
+            "nextBillDate": "2022-07-01T00:00:00-06:00",
+        }
+        if children in mask:
+            item[children] = self.children()
+        return item
+
+    @staticmethod
+    def children() -> List[Dict[str, Any]]:
+        return [{"recurringFee": "0.10"} for _ in range(CHILDREN)]
+
+    async def __call__(self, request: Request) -> Response:
+        self.requests.append(request.url.path)
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        await asyncio.sleep(LATENCY)
+        self.in_flight -= 1
+        path = request.url.path
+        mask = request.url.params.get("objectMask", "")
+        if path.endswith("SoftLayer_Account/getObject.json"):
+            return Response(200, json={"id": 1234})
+        if path.endswith("getLatestRecurringInvoice.json"):
+            return Response(
+                200,
+                json={
+                    "id": 1,
+                    "accountId": 1234,
+                    "createDate": "2022-06-01T00:00:00-06:00",
+                },
+            )
+        if path.endswith("getInvoiceTopLevelItems.json"):
+            children = "nonZeroAssociatedChildren"
+        elif path.endswith("getNextInvoiceTopLevelBillingItems.json"):
+            children = "nonZeroNextInvoiceChildren"
+        elif path.endswith("Children.json"):
+            return self.page(request, self.children())
+        else:
+            return Response(404, json={})
+        if children in mask and not self.nested:
+            return Response(500, json={"error": "Internal Error"})
+        return self.page(request, [self.item(i, mask, children) for i in range(ITEMS)])
+
+    @staticmethod
+    def page(request: Request, results: List[Any]) -> Response:
+        offset, limit = map(int, request.url.params["resultLimit"].split(","))
+        return Response(
+            200,
+            json=results[offset : offset + limit],
+            headers={"SoftLayer-Total-Items": str(len(results))},
+        )
+
+
+@pytest.fixture(autouse=True)
+def clear_invoices(monkeypatch):
+    monkeypatch.setattr(finalized, "backend", InvoiceBackend())
+    invoices.clear()
+    accounts.clear()
+    yield
+    invoices.clear()
+    accounts.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    monkeypatch.setattr(Softlayer, "rate_limit", None)
+    monkeypatch.setattr(Bluemix, "rate_limit", None)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def install(nested: bool = True) -> FakeSoftlayer:
+        server = FakeSoftlayer(nested)
+        monkeypatch.setattr(
+            "pycloud.base.session", AsyncClient(transport=MockTransport(server))
+        )
+        return server
+
+    return install
+
+
+@pytest.mark.asyncio
+async def test_invoiced_nested(fake) -> None:
+    server = fake()
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+
+    bill = await client.get_current_invoiced()
+
+    assert bill.total == pytest.approx((ITEMS - PAAS) * ITEM_TOTAL)
+    # The invoice and five pages of items
+    assert len(server.requests) == 6
+    assert not [path for path in server.requests if path.endswith("Children.json")]
+
+
+@pytest.mark.asyncio
+async def test_invoiced_totalled_once(fake) -> None:
+    server = fake()
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+    first = await client.get_current_invoiced()
+    # Past the cycle, the items would be fetched again if it wasn't stored
+    invoices.clear()
+    server.requests.clear()
+
+    second = await client.get_current_invoiced()
+
+    assert second == first
+    assert server.requests == [
+        "/rest/v3.1/SoftLayer_Account/getLatestRecurringInvoice.json"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_usage_nested(fake) -> None:
+    server = fake()
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+
+    bill = await client.get_current_usage()
+
+    assert bill.total == pytest.approx((ITEMS - PAAS) * ITEM_TOTAL)
+    assert bill.start_date.month == 6
+    # The account id and five pages of items
+    assert len(server.requests) == 6
+
+
+@pytest.mark.asyncio
+async def test_invoiced_fallback(fake) -> None:
+    server = fake(nested=False)
+    client = CloudFactory.get_client("Softlayer", SOFTLAYER)
+
+    bill = await client.get_current_invoiced()
+
+    assert bill.total == pytest.approx((ITEMS - PAAS) * ITEM_TOTAL)
+    # The invoice, the refused mask, five pages of items and their children
+    assert len(server.requests) == 1 + 1 + 5 + ITEMS
+    # Ten at a time rather than one after another
+    assert server.most_in_flight == FANOUT
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["get_current_invoiced", "get_current_usage"])
+async def test_both_sides_share_fetch(fake, method: str) -> None:
+    server = fake()
+    softlayer = CloudFactory.get_client("Softlayer", SOFTLAYER)
+    bluemix = CloudFactory.get_client("Bluemix", BLUEMIX)
+
+    iaas, paas = await asyncio.gather(
+        getattr(softlayer, method)(), getattr(bluemix, method)()
+    )
+
+    assert iaas.total == pytest.approx((ITEMS - PAAS) * ITEM_TOTAL)
+    assert paas.total == pytest.approx(PAAS * ITEM_TOTAL)
+    # Each side asks which invoice or account it is, the items come once
+    items = [p for p in server.requests if "TopLevel" in p]
+    assert len(items) == 5
+
+
+@pytest.mark.asyncio
+async def test_invoice_cache_single_flight() -> None:
+    cache = InvoiceCache()
+    fetches = 0
+
+    async def fetch() -> List[Dict[str, Any]]:
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.01)
+        return [{"id": fetches}]
+
+    got = await asyncio.gather(*[cache.get("invoice", fetch) for _ in range(10)])
+
+    assert fetches == 1
+    assert got == [[{"id": 1}]] * 10
+    # Done with, the lock isn't kept around
+    assert not cache._locks
+
+
+@pytest.mark.parametrize(
+    "operation,value,expected",
+    [
+        ("^=paas", "paas_cf", True),
+        ("^=paas", "server", False),
+        ("!^=paas", "server", True),
+        ("!^=paas", "paas_cf", False),
+        ("*=cf", "paas_cf", True),
+        ("$=cf", "paas_cf", True),
+        ("server", "server", True),
+    ],
+)
+def test_matches(operation: str, value: str, expected: bool) -> None:
+    assert matches(operation, value) == expected
@@ -0,0 +1,168 @@
+import json
+import tracemalloc
+from typing import Any, AsyncIterator, List
+
+import pytest
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from pycloud import CloudFactory
+from pycloud.controllers import Softlayer
+from pycloud.exc import UnknownError
+from pycloud.streaming import ArrayParser, iter_array
+
+ENTRIES = 100_000
+CHUNK = 64 * 1024
+
+ITEMS = [
+    123,
+    4.5e3,
+    -7,
+    True,
+    None,
+    'ü€😀 " ] ,',
+    {"a": [1, {"b": "]"}]},
+    [],
+    {},
+]
+
+
+async def chunks(body: bytes, size: int) -> AsyncIterator[bytes]:
+    for i in range(0, len(body), size):
+        yield body[i : i + size]
+
+
+async def decode(body: bytes, size: int) -> List[Any]:
+    return [item async for item in iter_array(chunks(body, size))]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 4096])
+async def test_every_chunk_boundary(size: int) -> None:
+    for items in (ITEMS, [], [ITEMS]):
+        body = json.dumps(items, ensure_ascii=False, indent=1).encode()
+        assert await decode(body, size) == items
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [b'{"a": 1}', b"[1, 2", b"[1 2]", b"[1,]", b""])
+async def test_not_an_array(body: bytes) -> None:
+    with pytest.raises(ValueError):
+        await decode(body, 2)
+
+
+def test_big_item_decoded_once() -> None:
+    big = {"values": list(range(50_000)), "name": 'a "quoted" \\ ]'}
+    body = json.dumps([big, 1]).encode()
+    parser = ArrayParser()
+    decoded = []
+    raw_decode = parser._decoder.raw_decode
+
+    def counted(s: str, idx: int = 0) -> Any:
+        decoded.append(idx)
+        return raw_decode(s, idx)
+
+    parser._decoder.raw_decode = counted
+    items = []
+    for i in range(0, len(body), 100):
+        items.extend(parser.feed(body[i : i + 100]))
+    items.extend(parser.close())
+
+    assert items == [big, 1]
+    # Not once for every chunk it was split over
+    assert len(decoded) == 2
+
+
+def entry(i: int) -> bytes:
+    return json.dumps(
+        {"id": i, "time": "2022-03-01T00:00:00Z", "amount": "1.25"}
+    ).encode()
+
+
+async def ledger() -> AsyncIterator[bytes]:
+    """
+    A 100k entry ledger coming off the wire, never whole in memory.
+    """
+    chunk = b"["
+    for i in range(ENTRIES):
+        chunk += (b"," if i else b"") + entry(i)
+        if len(chunk) >= CHUNK:
+            yield chunk
+            chunk = b""
+    yield chunk + b"]"
+
+
+@pytest.mark.asyncio
+async def test_buffer_stays_small() -> None:
+    parser = ArrayParser()
+    total = 0.0
+    buffered = 0
+    async for chunk in ledger():
+        for item in parser.feed(chunk):
+            total += float(item["amount"])
+        buffered = max(buffered, len(parser._buffer))
+    for item in parser.close():
+        total += float(item["amount"])
+
+    assert total == ENTRIES * 1.25
+    # At most the last entry of a chunk is held over, never the ledger
+    assert buffered < len(entry(ENTRIES))
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_memory_stays_flat() -> None:
+    tracemalloc.start()
+    try:
+        total = 0.0
+        async for item in iter_array(ledger()):
+            total += float(item["amount"])
+        _, streamed = tracemalloc.get_traced_memory()
+
+        tracemalloc.reset_peak()
+        body = b"".join([chunk async for chunk in ledger()])
+        total_loaded = sum(float(item["amount"]) for item in json.loads(body))
+        del body
+        _, loaded = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert total == total_loaded == ENTRIES * 1.25
+    # Bounded by a chunk or so, not by the ledger
+    assert (
+        streamed < 16 * CHUNK and streamed * 20 < loaded
+    ), f"{ENTRIES} entries: streamed {streamed >> 10}KiB, loaded {loaded >> 10}KiB"
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    monkeypatch.setattr(Softlayer, "rate_limit", None)
+
+
+@pytest.mark.asyncio
+async def test_softlayer_count_streamed(monkeypatch) -> None:
+    masks: List[str] = []
+
+    def handler(request: Request) -> Response:
+        masks.append(request.url.params["objectMask"])
+        guests = (b'{"id": %d}' % i for i in range(2500))
+        return Response(200, content=chunks(b"[" + b",".join(guests) + b"]", 1000))
+
+    monkeypatch.setattr(
+        "pycloud.base.session", AsyncClient(transport=MockTransport(handler))
+    )
+    client = CloudFactory.get_client(
+        "Softlayer", {"account_name": "account", "token": "token"}
+    )
+
+    assert await client.get_instance_count() == 2500
+    assert masks == ["mask[id]"]
+
+    monkeypatch.setattr(
+        "pycloud.base.session",
+        AsyncClient(transport=MockTransport(lambda request: Response(500, text="no"))),
+    )
+    client = CloudFactory.get_client(
+        "Softlayer", {"account_name": "account", "token": "token"}
+    )
+    with pytest.raises(UnknownError, match="no"):
+        await client.get_instance_count()
@@ -2,7 +2,6 @@ from typing import Tuple
 import pytz
 from datetime import datetime
 
-from asgiref.sync import sync_to_async
 from dateutil.relativedelta import relativedelta
 
 
@@ -32,8 +31,9 @@ def current_month_date_range() -> Tuple[datetime, datetime]:
 
 
 # Pydantic hates sync_to_async as a decorator
+# Runs the wrapped provider method on that provider's bounded executor
 def as_async(func):
-    def wrapper(*args, **kwargs):
-        return sync_to_async(func)(*args, **kwargs)
+    def wrapper(self, *args, **kwargs):
+        return self.run_blocking(func, self, *args, **kwargs)
 
     return wrapper